@@ -1,154 +1,659 @@
 """
-Redis缓存管理模块
+缓存管理模块
 
-提供文件解析结果的缓存功能，通过MD5 hash识别文件
+提供文件解析结果的缓存功能，通过内容哈希（默认 xxh3_128）识别文件；
+同时提供按图片内容寻址的OCR/视觉识别结果缓存，以及按PDF页/工作表/幻灯片内容哈希寻址的分片缓存。
+存储后端（Redis或磁盘）见 app.cache_backends
 """
+import asyncio
 import hashlib
 import json
+import zlib
 import redis.asyncio as redis
-from typing import Optional, Dict, Any
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Callable, Tuple
 from loguru import logger
 import time
 
 from app.config import config
+from app.cache_backends import CacheBackend, RedisCacheBackend, open_disk_backend
+
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
+try:
+    import blake3
+    BLAKE3_AVAILABLE = True
+except ImportError:
+    BLAKE3_AVAILABLE = False
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# 文件缓存键格式版本，键格式变化时递增，旧格式的键不再被读取
+CACHE_KEY_VERSION = 3
+# 升级前的缓存键（file2md:cache:{文件MD5}，值为未压缩的JSON），开启 CACHE_LEGACY_LOOKUP 时作为回退读取
+LEGACY_CACHE_KEY_PREFIX = "file2md:cache:"
+# 开启旧缓存回退读取时记录的各解析器命名空间，命名空间变化后不再读取旧缓存
+LEGACY_NAMESPACE_KEY_PREFIX = "file2md:meta:legacy_namespace:"
+
+# 感知哈希分段倒排集合的成员上限，超过时随机淘汰，避免热点分段使 SUNION 退化为全量扫描
+PHASH_BAND_MAX_MEMBERS = 512
+
+# 写入感知哈希分段集合：达到上限时先随机淘汰，TTL 只在集合创建时设置（不随每次写入续期）
+# KEYS: 分段集合; ARGV: 条目, TTL, 成员上限
+_PHASH_ADD_SCRIPT = """
+local excess = redis.call('SCARD', KEYS[1]) - tonumber(ARGV[3]) + 1
+if excess > 0 and redis.call('SISMEMBER', KEYS[1], ARGV[1]) == 0 then
+    redis.call('SPOP', KEYS[1], excess)
+end
+redis.call('SADD', KEYS[1], ARGV[1])
+if redis.call('TTL', KEYS[1]) < 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 1
+"""
+
+# 分布式锁：仅当锁仍由本方持有（值等于令牌）时续期/释放
+_REFRESH_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def _hasher_factories() -> Dict[str, Callable[[], Any]]:
+    """可用的文件哈希算法（均支持 update/hexdigest 增量接口）"""
+    factories: Dict[str, Callable[[], Any]] = {
+        'blake2b': lambda: hashlib.blake2b(digest_size=16),
+        'md5': hashlib.md5,
+    }
+    if XXHASH_AVAILABLE:
+        factories['xxh3_128'] = xxhash.xxh3_128
+    if BLAKE3_AVAILABLE:
+        factories['blake3'] = blake3.blake3
+    return factories
+
+
+def resolve_hash_algorithm(name: str) -> str:
+    """
+    确定实际使用的文件哈希算法
+    
+    Args:
+        name: 配置的算法名称
+        
+    Returns:
+        可用的算法名称，所需的库未安装时回退到 blake2b
+    """
+    if name in _hasher_factories():
+        return name
+    logger.warning(f"缓存哈希算法 {name} 不可用（未安装对应的库），回退到 blake2b")
+    return 'blake2b'
+
+
+# 压缩缓存值的格式标记：首字节 0xFF 在UTF-8中不会出现，未带标记的值按原始UTF-8文本读取（兼容旧缓存）
+_COMPRESSED_MARKER = 0xFF
+_CODEC_ZSTD = 1
+_CODEC_ZSTD_DICT = 2
+_CODEC_ZLIB = 3
+
+
+def build_cache_namespace(name: str, version: int, settings: Dict[str, Any]) -> str:
+    """
+    生成缓存命名空间
+    
+    由解析器名称、输出格式版本和影响结果的配置共同决定，任一部分变化时缓存键随之变化，
+    无关配置的变化不影响其他解析器的缓存。
+    
+    Args:
+        name: 解析器或处理类型名称
+        version: 输出格式版本
+        settings: 影响结果的配置项
+        
+    Returns:
+        命名空间字符串，如 "pdfparser.v1.3f2a9c01b7de"
+    """
+    digest = hashlib.blake2b(
+        json.dumps(settings, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8'), digest_size=6
+    ).hexdigest()
+    return f"{name.lower()}.v{version}.{digest}"
+
+
+class CacheValueCodec:
+    """
+    缓存值编解码器
+    
+    超过阈值的缓存值压缩后写入Redis（优先 zstd，未安装时回退到 zlib），
+    压缩值以 0xFF + 编码类型 开头；可选加载离线训练的 zstd 字典，
+    提升表格HTML等重复标记较多的结果的压缩率。
+    """
+    
+    def __init__(self, algorithm: str, min_size: int, level: int, dict_path: str = ""):
+        self.min_size = min_size
+        self.level = level
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._zstd_dict = None
+        
+        if algorithm == "zstd" and not ZSTD_AVAILABLE:
+            logger.warning("zstandard 未安装，缓存压缩回退到 zlib")
+            algorithm = "zlib"
+        self.algorithm = algorithm
+        
+        if ZSTD_AVAILABLE and dict_path:
+            try:
+                with open(dict_path, 'rb') as dict_file:
+                    self._zstd_dict = zstandard.ZstdCompressionDict(dict_file.read())
+                logger.info(f"已加载缓存压缩字典: {dict_path}")
+            except Exception as e:
+                logger.error(f"加载缓存压缩字典失败 {dict_path}: {e}")
+        
+        if self.algorithm == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=level, dict_data=self._zstd_dict)
+            self._codec = _CODEC_ZSTD_DICT if self._zstd_dict is not None else _CODEC_ZSTD
+    
+    def encode(self, text: str) -> bytes:
+        """
+        编码缓存值，短于阈值或压缩无收益时保存原始UTF-8文本
+        
+        Args:
+            text: 缓存文本（JSON或识别结果）
+            
+        Returns:
+            写入Redis的字节
+        """
+        raw = text.encode('utf-8')
+        if self.algorithm == "none" or len(raw) < self.min_size:
+            return raw
+        
+        if self.algorithm == "zstd":
+            compressed = bytes((_COMPRESSED_MARKER, self._codec)) + self._compressor.compress(raw)
+        else:
+            compressed = bytes((_COMPRESSED_MARKER, _CODEC_ZLIB)) + zlib.compress(raw, min(self.level, 9))
+        
+        if len(compressed) >= len(raw):
+            return raw
+        self.bytes_in += len(raw)
+        self.bytes_out += len(compressed)
+        return compressed
+    
+    def decode(self, data: bytes) -> str:
+        """
+        解码缓存值，兼容未压缩的旧缓存
+        
+        Args:
+            data: 从Redis读取的字节
+            
+        Returns:
+            缓存文本
+            
+        Raises:
+            ValueError: 未知的压缩格式或缺少所需的库/字典
+        """
+        if not data or data[0] != _COMPRESSED_MARKER:
+            return data.decode('utf-8')
+        
+        codec, payload = data[1], data[2:]
+        if codec == _CODEC_ZLIB:
+            return zlib.decompress(payload).decode('utf-8')
+        if codec in (_CODEC_ZSTD, _CODEC_ZSTD_DICT):
+            if not ZSTD_AVAILABLE:
+                raise ValueError("缓存值使用 zstd 压缩，但 zstandard 未安装")
+            if codec == _CODEC_ZSTD_DICT and self._zstd_dict is None:
+                raise ValueError("缓存值使用字典压缩，但未加载压缩字典")
+            decompressor = zstandard.ZstdDecompressor(
+                dict_data=self._zstd_dict if codec == _CODEC_ZSTD_DICT else None
+            )
+            # 压缩帧头包含原始长度，按帧头解压
+            return decompressor.decompress(payload).decode('utf-8')
+        raise ValueError(f"未知的缓存压缩格式: {codec}")
+    
+    @property
+    def ratio(self) -> Optional[float]:
+        """本进程写入的压缩值的平均压缩率（压缩后/压缩前）"""
+        if not self.bytes_in:
+            return None
+        return round(self.bytes_out / self.bytes_in, 4)
+
+
+class LocalResultCache:
+    """
+    进程内一级缓存
+    
+    按缓存键保存已解码的解析结果，总容量按结果序列化后的字节数限制，
+    超出容量时淘汰最久未使用的条目。单个超过容量四分之一的结果不进入一级缓存，
+    避免一个超大文档冲掉所有热点条目。
+    """
+    
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.size = 0
+        # 缓存键 -> (过期时间, 字节数, 解析结果)
+        self._entries: "OrderedDict[str, Tuple[float, int, Dict[str, Any]]]" = OrderedDict()
+        self.evictions = 0
+    
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取结果，返回副本以免调用方修改缓存内容"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, entry_size, result = entry
+        if expires_at < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return dict(result)
+    
+    def put(self, key: str, result: Dict[str, Any], entry_size: int) -> None:
+        """写入结果，按最近最少使用淘汰超出容量的条目"""
+        if not self.enabled or entry_size > self.max_size // 4:
+            return
+        self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl, entry_size, dict(result))
+        self.size += entry_size
+        while self.size > self.max_size and self._entries:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.evictions += 1
+    
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+    
+    def clear(self) -> int:
+        """清空缓存，返回清除的条目数"""
+        count = len(self._entries)
+        self._entries.clear()
+        self.size = 0
+        return count
+
+
+def _md5_file(path: str) -> str:
+    """分块计算文件的MD5（同步，在线程中调用）"""
+    hasher = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
 
 
 class CacheManager:
-    """Redis缓存管理器"""
+    """缓存管理器（进程内一级缓存 + Redis/磁盘二级缓存）"""
     
     def __init__(self):
-        self.redis_client: Optional[redis.Redis] = None
+        # 当前使用的存储后端，Redis不可用时切换到磁盘后端
+        self.backend: Optional[CacheBackend] = None
+        self._disk_backend: Optional[CacheBackend] = None
+        self._reconnect_task: Optional[asyncio.Task] = None
+        self._refresh_lock_script = None
+        self._release_lock_script = None
+        self._phash_add_script = None
         self.enabled = config.REDIS_CACHE_ENABLED
+        self.hash_algorithm = resolve_hash_algorithm(config.CACHE_HASH_ALGORITHM)
+        self._new_hasher = _hasher_factories()[self.hash_algorithm]
+        # 进程内一级缓存与命中统计
+        self.local_cache = LocalResultCache(
+            config.CACHE_L1_MAX_SIZE if config.REDIS_CACHE_ENABLED else 0, config.CACHE_L1_TTL
+        )
+        self.stats = {"l1_hits": 0, "l2_hits": 0, "misses": 0}
+        self.codec = CacheValueCodec(
+            config.CACHE_COMPRESSION,
+            config.CACHE_COMPRESSION_MIN_SIZE,
+            config.CACHE_COMPRESSION_LEVEL,
+            config.CACHE_COMPRESSION_DICT
+        )
         
+    @property
+    def redis_client(self) -> Optional[redis.Redis]:
+        """当前的Redis客户端，使用磁盘后端时为None（感知哈希索引与分布式锁随之停用）"""
+        if isinstance(self.backend, RedisCacheBackend):
+            return self.backend.client
+        return None
+    
+    @property
+    def backend_name(self) -> Optional[str]:
+        """当前存储后端名称"""
+        return self.backend.name if self.backend else None
+    
+    @property
+    def degraded(self) -> bool:
+        """是否因Redis不可用而临时使用磁盘后端"""
+        return config.CACHE_BACKEND == "redis" and self.backend is not None and self.redis_client is None
+    
     async def initialize(self) -> bool:
         """
-        初始化Redis连接
+        初始化缓存后端
+        
+        CACHE_BACKEND 为 disk 时直接使用磁盘后端；为 redis 时连接失败则回退到磁盘后端，
+        并在后台定期重连，Redis恢复后切换回Redis。
         
         Returns:
-            是否成功初始化
+            是否有可用的缓存后端
         """
         if not self.enabled:
-            logger.info("Redis缓存已禁用")
+            logger.info("缓存已禁用")
             return False
-            
+        
+        if config.CACHE_BACKEND == "disk":
+            self.backend = self._open_disk_backend()
+            return self.backend is not None
+        
         try:
-            # 创建Redis连接池
-            self.redis_client = redis.Redis(
-                host=config.REDIS_HOST,
-                port=config.REDIS_PORT,
-                password=config.REDIS_PASSWORD,
-                db=config.REDIS_DB,
-                socket_connect_timeout=config.REDIS_CONNECTION_TIMEOUT,
-                socket_timeout=config.REDIS_CONNECTION_TIMEOUT,
-                max_connections=config.REDIS_MAX_CONNECTIONS,
-                decode_responses=True
-            )
-            
-            # 测试连接
-            await self.redis_client.ping()
+            self.backend = await self._connect_redis()
             logger.info(f"Redis缓存已启用，连接到 {config.REDIS_HOST}:{config.REDIS_PORT}")
             return True
-            
         except Exception as e:
             logger.error(f"Redis连接失败: {e}")
-            self.redis_client = None
-            self.enabled = False
-            return False
+            self._fall_back()
+            return self.backend is not None
+    
+    async def _connect_redis(self) -> RedisCacheBackend:
+        """
+        创建Redis连接并测试
+        
+        Raises:
+            Exception: 连接失败
+        """
+        # 创建Redis连接池
+        client = redis.Redis(
+            host=config.REDIS_HOST,
+            port=config.REDIS_PORT,
+            password=config.REDIS_PASSWORD,
+            db=config.REDIS_DB,
+            socket_connect_timeout=config.REDIS_CONNECTION_TIMEOUT,
+            socket_timeout=config.REDIS_CONNECTION_TIMEOUT,
+            max_connections=config.REDIS_MAX_CONNECTIONS
+        )
+        try:
+            # 测试连接
+            await client.ping()
+        except Exception:
+            await client.close()
+            raise
+        
+        self._refresh_lock_script = client.register_script(_REFRESH_LOCK_SCRIPT)
+        self._release_lock_script = client.register_script(_RELEASE_LOCK_SCRIPT)
+        self._phash_add_script = client.register_script(_PHASH_ADD_SCRIPT)
+        return RedisCacheBackend(client)
+    
+    def _open_disk_backend(self) -> Optional[CacheBackend]:
+        """打开（或复用已打开的）磁盘后端"""
+        if self._disk_backend is None:
+            self._disk_backend = open_disk_backend(config.CACHE_DISK_PATH, config.CACHE_DISK_MAX_SIZE)
+        return self._disk_backend
+    
+    def _fall_back(self) -> None:
+        """Redis不可用时切换到磁盘后端（如已启用）并启动后台重连"""
+        if config.CACHE_DISK_FALLBACK:
+            self.backend = self._open_disk_backend()
+            if self.backend is not None:
+                logger.warning("Redis不可用，缓存临时使用磁盘后端")
+        else:
+            self.backend = None
+        
+        if self._reconnect_task is None or self._reconnect_task.done():
+            self._reconnect_task = asyncio.create_task(self._reconnect_loop())
+    
+    async def _reconnect_loop(self) -> None:
+        """定期尝试重新连接Redis，恢复后切换回Redis后端"""
+        while True:
+            await asyncio.sleep(config.CACHE_RECONNECT_INTERVAL)
+            try:
+                backend = await self._connect_redis()
+            except Exception as e:
+                logger.debug(f"Redis重连失败: {e}")
+                continue
+            
+            self.backend = backend
+            logger.info(f"Redis已恢复，缓存切换回Redis: {config.REDIS_HOST}:{config.REDIS_PORT}")
+            return
+    
+    async def _handle_backend_error(self, error: Exception) -> None:
+        """Redis连接中断时切换到回退后端，其他错误只记录"""
+        backend = self.backend
+        if isinstance(backend, RedisCacheBackend) and isinstance(error, (redis.ConnectionError, redis.TimeoutError)):
+            logger.error(f"Redis连接中断: {error}")
+            self._fall_back()
+            try:
+                await backend.close()
+            except Exception:
+                pass
     
     async def close(self):
-        """关闭Redis连接"""
+        """关闭缓存后端"""
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        
         if self.redis_client:
-            await self.redis_client.close()
+            await self.backend.close()  # type: ignore
             logger.info("Redis连接已关闭")
+        if self._disk_backend is not None:
+            await self._disk_backend.close()
+            logger.info("磁盘缓存已关闭")
+        self.backend = None
+    
+    def new_file_hasher(self):
+        """
+        创建用于增量计算文件哈希的哈希对象
+        
+        上传文件落盘时逐块 update，得到的摘要与 calculate_file_hash 一致。
+        """
+        return self._new_hasher()
     
     def calculate_file_hash(self, file_content: bytes) -> str:
         """
-        计算文件内容的MD5哈希值
+        计算文件内容的哈希值
+        
+        上传接口在落盘时已增量计算哈希，此方法仅用于调用方只有内存内容的情况。
         
         Args:
             file_content: 文件内容字节
             
         Returns:
-            MD5哈希字符串
+            十六进制哈希字符串
         """
-        # 对于大文件，使用流式处理减少内存压力
-        if len(file_content) > 50 * 1024 * 1024:  # 50MB以上使用流式处理
-            hash_md5 = hashlib.md5()
-            chunk_size = 64 * 1024  # 64KB块
-            for i in range(0, len(file_content), chunk_size):
-                chunk = file_content[i:i + chunk_size]
-                hash_md5.update(chunk)
-            return hash_md5.hexdigest()
-        else:
-            return hashlib.md5(file_content).hexdigest()
+        hasher = self.new_file_hasher()
+        hasher.update(file_content)
+        return hasher.hexdigest()
+    
+    def _resolve_file_hash(self, file_content: Optional[bytes], file_hash: Optional[str]) -> str:
+        """优先使用调用方预先计算的哈希，避免对文件内容重复计算"""
+        if file_hash:
+            return file_hash
+        if file_content is None:
+            raise ValueError("file_content 与 file_hash 不能同时为空")
+        return self.calculate_file_hash(file_content)
     
-    def _get_cache_key(self, file_hash: str) -> str:
+    def _get_cache_key(self, file_hash: str, variant: str = "", namespace: str = "") -> str:
         """
         生成缓存键
         
+        键中包含格式版本、哈希算法和解析器命名空间，更换算法后不会与其他算法的摘要混用，
+        解析器版本或相关配置变化后不会读取到旧格式的结果。
+        
         Args:
-            file_hash: 文件MD5哈希
+            file_hash: 文件内容哈希
+            variant: 解析选项标识（如页码范围），同一文件的不同选择范围分别缓存
+            namespace: 缓存命名空间（见 build_cache_namespace）
             
         Returns:
             Redis缓存键
         """
-        return f"file2md:cache:{file_hash}"
+        key = f"file2md:cache:v{CACHE_KEY_VERSION}:{self.hash_algorithm}"
+        if namespace:
+            key = f"{key}:{namespace}"
+        key = f"{key}:{file_hash}"
+        if variant:
+            variant_hash = hashlib.md5(variant.encode('utf-8')).hexdigest()[:16]
+            return f"{key}:{variant_hash}"
+        return key
+    
+    async def _legacy_md5(self, file_content: Optional[bytes], file_hash: str,
+                          file_path: Optional[str]) -> Optional[str]:
+        """升级前的缓存键使用文件内容的MD5，当前算法不是MD5时按需重新计算"""
+        if self.hash_algorithm == 'md5':
+            return file_hash
+        if file_content is not None:
+            return hashlib.md5(file_content).hexdigest()
+        if file_path:
+            return await asyncio.to_thread(_md5_file, file_path)
+        return None
+    
+    async def _legacy_lookup_allowed(self, namespace: str) -> bool:
+        """
+        判断当前配置下是否可以读取升级前的旧缓存
+        
+        开启 CACHE_LEGACY_LOOKUP 后首次查询时记录各解析器当时的命名空间（视为旧缓存写入时的配置），
+        之后只在命名空间不变（解析器版本和相关配置均未修改）时读取旧缓存；
+        记录在一个缓存有效期后过期，届时旧缓存也已全部过期。
+        """
+        key = f"{LEGACY_NAMESPACE_KEY_PREFIX}{namespace.split('.', 1)[0]}"
+        recorded = await self.backend.get(key)  # type: ignore
+        if recorded is None:
+            await self.backend.set(key, namespace.encode('utf-8'), config.REDIS_CACHE_TTL)  # type: ignore
+            return True
+        return recorded.decode('utf-8') == namespace
+    
+    async def _migrate_legacy_result(self, legacy_hash: str, namespace: str, cache_key: str) -> Optional[bytes]:
+        """
+        读取升级前的缓存，命中时以剩余有效期复制到新键
+        
+        旧条目不删除，滚动部署期间旧版本副本仍可使用。
+        
+        Returns:
+            旧条目的缓存值，不存在或配置已变化时返回None
+        """
+        if not await self._legacy_lookup_allowed(namespace):
+            return None
+        cached_data, ttl = await self.backend.get_with_ttl(f"{LEGACY_CACHE_KEY_PREFIX}{legacy_hash}")  # type: ignore
+        if not cached_data or ttl <= 0:
+            return None
+        
+        await self.backend.set(cache_key, cached_data, ttl, indexed=True)  # type: ignore
+        logger.info(f"旧版缓存已迁移: {legacy_hash[:8]}... -> {namespace}")
+        return cached_data
     
-    async def get_cached_result(self, file_content: bytes) -> Optional[Dict[str, Any]]:
+    async def get_cached_result(self, file_content: Optional[bytes] = None, variant: str = "",
+                                file_hash: Optional[str] = None, namespace: str = "",
+                                file_path: Optional[str] = None, legacy_lookup: bool = True,
+                                count_stats: bool = True) -> Optional[Dict[str, Any]]:
         """
         从缓存获取解析结果
         
+        开启 CACHE_LEGACY_LOOKUP 时，默认选项的请求在新键未命中后回退读取升级前的旧键并迁移到新键，
+        解析器命名空间与开启时记录的不同（相关配置已修改）时不读取。
+        
         Args:
-            file_content: 文件内容字节
+            file_content: 文件内容字节（已提供 file_hash 时可省略）
+            variant: 解析选项标识，默认选项为空字符串
+            file_hash: 上传时增量计算的文件哈希
+            namespace: 缓存命名空间
+            file_path: 文件路径，读取旧缓存需要重新计算MD5时使用
+            legacy_lookup: 是否允许回退读取旧缓存（旧键不区分接口，/ocr 与 /convert 的结果无法区分）
+            count_stats: 是否计入命中统计，等待其他请求结果时的轮询查询传 False
             
         Returns:
             缓存的解析结果，如果不存在则返回None
         """
-        if not self.enabled or not self.redis_client:
+        if not self.local_cache.enabled and self.backend is None:
             return None
             
         try:
-            file_hash = self.calculate_file_hash(file_content)
-            cache_key = self._get_cache_key(file_hash)
+            file_hash = self._resolve_file_hash(file_content, file_hash)
+            cache_key = self._get_cache_key(file_hash, variant, namespace)
+            
+            # 一级缓存：进程内内存
+            result = self.local_cache.get(cache_key)
+            if result is not None:
+                if count_stats:
+                    self.stats["l1_hits"] += 1
+                result['from_cache'] = True
+                result['cache_hit_time'] = int(time.time() * 1000)
+                logger.info(f"缓存命中(内存): {file_hash[:8]}...")
+                return result
             
-            cached_data = await self.redis_client.get(cache_key)
+            # 二级缓存：Redis或磁盘
+            if self.backend is None:
+                if count_stats:
+                    self.stats["misses"] += 1
+                return None
+            
+            cached_data = await self.backend.get(cache_key)
+            if not cached_data and namespace and not variant and legacy_lookup and config.CACHE_LEGACY_LOOKUP:
+                legacy_hash = await self._legacy_md5(file_content, file_hash, file_path)
+                if legacy_hash:
+                    cached_data = await self._migrate_legacy_result(legacy_hash, namespace, cache_key)
             if cached_data:
-                result = json.loads(cached_data)
+                cached_text = self.codec.decode(cached_data)
+                result = json.loads(cached_text)
+                self.local_cache.put(cache_key, result, len(cached_text))
+                if count_stats:
+                    self.stats["l2_hits"] += 1
                 result['from_cache'] = True
                 result['cache_hit_time'] = int(time.time() * 1000)
                 
                 logger.info(f"缓存命中: {file_hash[:8]}...")
                 return result
             
+            if count_stats:
+                self.stats["misses"] += 1
             logger.debug(f"缓存未命中: {file_hash[:8]}...")
             return None
             
         except Exception as e:
             logger.error(f"读取缓存失败: {e}")
+            await self._handle_backend_error(e)
             return None
     
-    async def cache_result(self, file_content: bytes, filename: str, markdown_content: str, 
-                          file_size: int, duration_ms: int, content_type: str | None = None) -> bool:
+    async def cache_result(self, file_content: Optional[bytes], filename: str, markdown_content: str, 
+                          file_size: int, duration_ms: int, content_type: str | None = None,
+                          variant: str = "", file_hash: Optional[str] = None, namespace: str = "") -> bool:
         """
         缓存解析结果
         
         Args:
-            file_content: 文件内容字节
+            file_content: 文件内容字节（已提供 file_hash 时可为None）
             filename: 文件名
             markdown_content: 解析后的Markdown内容
             file_size: 文件大小
             duration_ms: 解析耗时（毫秒）
             content_type: 文件类型
+            variant: 解析选项标识，默认选项为空字符串
+            file_hash: 上传时增量计算的文件哈希
+            namespace: 缓存命名空间
             
         Returns:
             是否成功缓存
         """
-        if not self.enabled or not self.redis_client:
+        if not self.local_cache.enabled and self.backend is None:
             return False
             
         try:
-            file_hash = self.calculate_file_hash(file_content)
-            cache_key = self._get_cache_key(file_hash)
+            file_hash = self._resolve_file_hash(file_content, file_hash)
+            cache_key = self._get_cache_key(file_hash, variant, namespace)
             
             cache_data = {
                 'filename': filename,
@@ -157,22 +662,310 @@ class CacheManager:
                 'content_type': content_type or 'application/octet-stream',
                 'duration_ms': duration_ms,
                 'cached_time': int(time.time() * 1000),
-                'file_hash': file_hash
+                'file_hash': file_hash,
+                'hash_algorithm': self.hash_algorithm
             }
+            if variant:
+                cache_data['options'] = variant
+            if namespace:
+                cache_data['namespace'] = namespace
             
-            # 缓存数据，设置TTL
-            await self.redis_client.setex(
-                cache_key,
-                config.REDIS_CACHE_TTL,
-                json.dumps(cache_data, ensure_ascii=False)
-            )
+            serialized = json.dumps(cache_data, ensure_ascii=False)
+            self.local_cache.put(cache_key, cache_data, len(serialized))
+            if self.backend is None:
+                return True
+            
+            # 缓存数据，设置TTL，同时计入缓存统计
+            await self.backend.set(cache_key, self.codec.encode(serialized), config.REDIS_CACHE_TTL, indexed=True)
             
             logger.info(f"缓存已保存: {file_hash[:8]}... -> {filename}")
             return True
             
         except Exception as e:
             logger.error(f"保存缓存失败: {e}")
+            await self._handle_backend_error(e)
+            return False
+    
+    def calculate_image_hash(self, image_data: bytes) -> str:
+        """
+        计算图片内容的SHA-256哈希值
+        
+        Args:
+            image_data: 图片字节
+            
+        Returns:
+            SHA-256哈希字符串
+        """
+        return hashlib.sha256(image_data).hexdigest()
+    
+    def _get_image_cache_key(self, kind: str, identity: str, image_hash: str) -> str:
+        """
+        生成图片识别结果的缓存键
+        
+        Args:
+            kind: 结果类型（ocr / vision）
+            identity: 模型与提示词标识，模型或提示词变化时自动失效
+            image_hash: 图片内容哈希
+            
+        Returns:
+            Redis缓存键
+        """
+        return f"file2md:img:{kind}:{identity}:{image_hash}"
+    
+    async def get_image_result(self, kind: str, identity: str, image_hash: str) -> Optional[str]:
+        """
+        获取图片的OCR/视觉识别缓存结果
+        
+        Args:
+            kind: 结果类型（ocr / vision）
+            identity: 模型与提示词标识
+            image_hash: 图片内容哈希
+            
+        Returns:
+            缓存的识别文本，如果不存在则返回None
+        """
+        if self.backend is None or not config.IMAGE_CACHE_ENABLED:
+            return None
+        
+        try:
+            cached_data = await self.backend.get(self._get_image_cache_key(kind, identity, image_hash))
+            if cached_data is None:
+                return None
+            logger.debug(f"图片{kind}缓存命中: {image_hash[:8]}...")
+            return self.codec.decode(cached_data)
+        except Exception as e:
+            logger.error(f"读取图片缓存失败: {e}")
+            await self._handle_backend_error(e)
+            return None
+    
+    async def cache_image_result(self, kind: str, identity: str, image_hash: str, text: str) -> bool:
+        """
+        缓存图片的OCR/视觉识别结果
+        
+        Args:
+            kind: 结果类型（ocr / vision）
+            identity: 模型与提示词标识
+            image_hash: 图片内容哈希
+            text: 识别文本
+            
+        Returns:
+            是否成功缓存
+        """
+        if self.backend is None or not config.IMAGE_CACHE_ENABLED:
+            return False
+        
+        try:
+            await self.backend.set(
+                self._get_image_cache_key(kind, identity, image_hash),
+                self.codec.encode(text),
+                config.IMAGE_CACHE_TTL
+            )
+            return True
+        except Exception as e:
+            logger.error(f"保存图片缓存失败: {e}")
+            await self._handle_backend_error(e)
+            return False
+    
+    @property
+    def unit_cache_enabled(self) -> bool:
+        """文档分片缓存是否可用"""
+        return self.backend is not None and config.UNIT_CACHE_ENABLED
+    
+    def new_unit_hasher(self):
+        """创建用于计算分片（页/工作表/幻灯片）内容哈希的哈希对象，与文件哈希使用相同算法"""
+        return self._new_hasher()
+    
+    def _get_unit_cache_key(self, namespace: str, kind: str, unit_hash: str) -> str:
+        """
+        生成文档分片转换结果的缓存键
+        
+        Args:
+            namespace: 解析器缓存命名空间（见 build_cache_namespace）
+            kind: 分片类型（page / sheet / slide）
+            unit_hash: 分片内容哈希
+            
+        Returns:
+            Redis缓存键
+        """
+        return f"file2md:unit:{self.hash_algorithm}:{namespace}:{kind}:{unit_hash}"
+    
+    async def get_unit_results(self, namespace: str, kind: str, unit_hashes: List[str]) -> Dict[str, str]:
+        """
+        批量获取文档分片的缓存结果
+        
+        Args:
+            namespace: 解析器缓存命名空间
+            kind: 分片类型（page / sheet / slide）
+            unit_hashes: 分片内容哈希列表
+            
+        Returns:
+            命中的 {分片哈希: Markdown内容}
+        """
+        if not self.unit_cache_enabled or not unit_hashes:
+            return {}
+        
+        unique_hashes = list(dict.fromkeys(unit_hashes))
+        try:
+            values = await self.backend.get_many(  # type: ignore
+                [self._get_unit_cache_key(namespace, kind, unit_hash) for unit_hash in unique_hashes]
+            )
+            results = {}
+            for unit_hash, value in zip(unique_hashes, values):
+                if value is None:
+                    continue
+                try:
+                    results[unit_hash] = self.codec.decode(value)
+                except Exception as decode_error:
+                    logger.warning(f"分片缓存数据无法解码，按未命中处理: {decode_error}")
+            if results:
+                logger.info(f"分片缓存命中 {len(results)}/{len(unique_hashes)} 个{kind}")
+            return results
+        except Exception as e:
+            logger.error(f"读取分片缓存失败: {e}")
+            await self._handle_backend_error(e)
+            return {}
+    
+    async def cache_unit_results(self, namespace: str, kind: str, results: Dict[str, str]) -> bool:
+        """
+        批量缓存文档分片的转换结果
+        
+        Args:
+            namespace: 解析器缓存命名空间
+            kind: 分片类型（page / sheet / slide）
+            results: {分片哈希: Markdown内容}
+            
+        Returns:
+            是否成功缓存
+        """
+        if not self.unit_cache_enabled or not results:
+            return False
+        
+        try:
+            await self.backend.set_many(  # type: ignore
+                {
+                    self._get_unit_cache_key(namespace, kind, unit_hash): self.codec.encode(text)
+                    for unit_hash, text in results.items()
+                },
+                config.UNIT_CACHE_TTL
+            )
+            return True
+        except Exception as e:
+            logger.error(f"保存分片缓存失败: {e}")
+            await self._handle_backend_error(e)
+            return False
+    
+    def _get_phash_band_key(self, aspect_bucket: int, band_idx: int, band_value: str) -> str:
+        """生成感知哈希分段倒排集合的键"""
+        return f"file2md:phash:{aspect_bucket}:{band_idx}:{band_value}"
+    
+    async def find_phash_candidates(self, aspect_bucket: int, bands: List[Optional[str]]) -> List[str]:
+        """
+        按指纹分段查找近似图片候选
+        
+        Args:
+            aspect_bucket: 宽高比分桶
+            bands: 指纹分段（None 表示不参与索引的退化分段）
+            
+        Returns:
+            候选条目列表（"{指纹}:{图片内容哈希}"）
+        """
+        if not self.redis_client or not config.IMAGE_PHASH_ENABLED:
+            return []
+        
+        try:
+            keys = [
+                self._get_phash_band_key(aspect_bucket, i, band) for i, band in enumerate(bands) if band is not None
+            ]
+            if not keys:
+                return []
+            return [entry.decode('utf-8') for entry in await self.redis_client.sunion(keys)]
+        except Exception as e:
+            logger.error(f"查询感知哈希索引失败: {e}")
+            return []
+    
+    async def add_phash_entry(self, aspect_bucket: int, bands: List[Optional[str]], entry: str) -> bool:
+        """
+        将图片指纹写入分段倒排集合（每个集合最多保留 PHASH_BAND_MAX_MEMBERS 个条目）
+        
+        Args:
+            aspect_bucket: 宽高比分桶
+            bands: 指纹分段（None 表示不参与索引的退化分段）
+            entry: 索引条目（"{指纹}:{图片内容哈希}"）
+            
+        Returns:
+            是否成功写入
+        """
+        if not self.redis_client or not config.IMAGE_PHASH_ENABLED:
             return False
+        
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for i, band in enumerate(bands):
+                    if band is None:
+                        continue
+                    await self._phash_add_script(
+                        keys=[self._get_phash_band_key(aspect_bucket, i, band)],
+                        args=[entry, config.IMAGE_CACHE_TTL, PHASH_BAND_MAX_MEMBERS],
+                        client=pipe
+                    )
+                await pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"写入感知哈希索引失败: {e}")
+            return False
+    
+    def _get_lock_key(self, name: str) -> str:
+        """生成分布式锁的键"""
+        return f"file2md:lock:{name}"
+    
+    async def acquire_lock(self, name: str, token: str, ttl: int) -> bool:
+        """
+        获取跨副本的分布式锁（SET NX）
+        
+        Redis不可用（或使用磁盘后端）时视为获取成功，由调用方在本进程内执行。
+        
+        Args:
+            name: 锁名称
+            token: 持有者令牌，续期和释放时校验
+            ttl: 锁的过期时间（秒）
+            
+        Returns:
+            是否获得锁
+        """
+        if not self.redis_client:
+            return True
+        
+        try:
+            return bool(await self.redis_client.set(self._get_lock_key(name), token, nx=True, ex=ttl))
+        except Exception as e:
+            logger.error(f"获取分布式锁失败 {name}: {e}")
+            return True
+    
+    async def refresh_lock(self, name: str, token: str, ttl: int) -> bool:
+        """
+        为仍由本方持有的锁续期
+        
+        Returns:
+            是否续期成功（锁已过期或被他人持有时返回False）
+        """
+        if not self.redis_client:
+            return True
+        
+        try:
+            return bool(await self._refresh_lock_script(keys=[self._get_lock_key(name)], args=[token, ttl]))
+        except Exception as e:
+            logger.error(f"分布式锁续期失败 {name}: {e}")
+            return False
+    
+    async def release_lock(self, name: str, token: str) -> None:
+        """释放仍由本方持有的锁"""
+        if not self.redis_client:
+            return
+        
+        try:
+            await self._release_lock_script(keys=[self._get_lock_key(name)], args=[token])
+        except Exception as e:
+            logger.error(f"释放分布式锁失败 {name}: {e}")
     
     async def clear_cache(self, pattern: str = "file2md:cache:*") -> int:
         """
@@ -184,21 +977,47 @@ class CacheManager:
         Returns:
             清除的缓存条目数量
         """
-        if not self.enabled or not self.redis_client:
+        if pattern.startswith("file2md:cache"):
+            self.local_cache.clear()
+        
+        backends = [backend for backend in (self.backend, self._disk_backend) if backend is not None]
+        if not backends:
             return 0
             
         try:
-            keys = await self.redis_client.keys(pattern)
-            if keys:
-                deleted = await self.redis_client.delete(*keys)
-                logger.info(f"清除了 {deleted} 条缓存记录")
-                return deleted
-            return 0
+            deleted = 0
+            # 磁盘后端作为回退时也可能保存了旧结果，一并清除
+            for backend in dict.fromkeys(backends):
+                deleted += await backend.clear(pattern)
+            
+            logger.info(f"清除了 {deleted} 条缓存记录")
+            return deleted
             
         except Exception as e:
             logger.error(f"清除缓存失败: {e}")
+            await self._handle_backend_error(e)
             return 0
     
+    def get_hit_stats(self) -> Dict[str, Any]:
+        """
+        获取本进程的一级/二级缓存命中统计
+        
+        Returns:
+            命中次数、命中率及一级缓存占用
+        """
+        lookups = self.stats["l1_hits"] + self.stats["l2_hits"] + self.stats["misses"]
+        return {
+            "l1_hits": self.stats["l1_hits"],
+            "l2_hits": self.stats["l2_hits"],
+            "misses": self.stats["misses"],
+            "l1_hit_ratio": round(self.stats["l1_hits"] / lookups, 4) if lookups else None,
+            "l2_hit_ratio": round(self.stats["l2_hits"] / lookups, 4) if lookups else None,
+            "l1_entries": len(self.local_cache),
+            "l1_size_bytes": self.local_cache.size,
+            "l1_max_size_bytes": self.local_cache.max_size,
+            "l1_evictions": self.local_cache.evictions
+        }
+    
     async def get_cache_stats(self) -> Dict[str, Any]:
         """
         获取缓存统计信息
@@ -206,29 +1025,27 @@ class CacheManager:
         Returns:
             缓存统计数据
         """
-        if not self.enabled or not self.redis_client:
+        if self.backend is None:
+            if self.local_cache.enabled:
+                return {"enabled": False, **self.get_hit_stats()}
             return {"enabled": False}
             
         try:
-            # 获取匹配的键数量
-            keys = await self.redis_client.keys("file2md:cache:*")
-            cache_count = len(keys)
-            
-            # 获取Redis信息
-            info = await self.redis_client.info()
-            
+            backend_stats = await self.backend.stats()
             return {
                 "enabled": True,
-                "cache_count": cache_count,
-                "redis_version": info.get("redis_version"),
-                "used_memory_human": info.get("used_memory_human"),
-                "connected_clients": info.get("connected_clients"),
-                "total_commands_processed": info.get("total_commands_processed"),
+                "backend": self.backend.name,
+                "degraded": self.degraded,
+                **backend_stats,
+                **self.get_hit_stats(),
+                "compression": self.codec.algorithm,
+                "compression_ratio": self.codec.ratio,
                 "cache_ttl_hours": config.REDIS_CACHE_TTL // 3600
             }
             
         except Exception as e:
             logger.error(f"获取缓存统计失败: {e}")
+            await self._handle_backend_error(e)
             return {"enabled": True, "error": str(e)}
 
 
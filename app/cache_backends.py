@@ -0,0 +1,459 @@
+"""
+缓存存储后端
+
+CacheManager 通过 CacheBackend 接口读写编码后的缓存值，具体存储可替换：
+- RedisCacheBackend：多副本共享的Redis存储，维护文件缓存索引以支持 O(1) 统计
+- SQLiteCacheBackend：嵌入式磁盘存储，按容量淘汰最久未访问的条目，
+  用于单节点部署或Redis不可用时的回退
+"""
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+import redis.asyncio as redis
+from loguru import logger
+
+# 文件缓存索引：按过期时间排序的键集合、各键写入的字节数、字节总数
+# 统计信息直接读取索引，避免使用 KEYS 扫描整个键空间
+CACHE_INDEX_KEY = "file2md:meta:cache_index"
+CACHE_SIZES_KEY = "file2md:meta:cache_sizes"
+CACHE_BYTES_KEY = "file2md:meta:cache_bytes"
+# 每批 SCAN/UNLINK 以及清理过期索引项的键数量
+CACHE_SCAN_BATCH = 1000
+# 每次写入时顺带清理的过期索引项数量上限，使索引规模跟随写入量收敛
+CACHE_STORE_PRUNE_BATCH = 100
+
+# 写入缓存并更新索引（覆盖同一键时先扣除原有字节数），同时清理一小批已过期的索引项
+# KEYS: 索引, 字节数哈希, 字节总数, 缓存键; ARGV: 缓存值, TTL, 过期时间, 字节数, 当前时间, 清理数量上限
+_STORE_SCRIPT = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[5], 'LIMIT', 0, ARGV[6])
+for _, member in ipairs(expired) do
+    local size = redis.call('HGET', KEYS[2], member)
+    if size then
+        redis.call('DECRBY', KEYS[3], size)
+        redis.call('HDEL', KEYS[2], member)
+    end
+    redis.call('ZREM', KEYS[1], member)
+end
+local previous = redis.call('HGET', KEYS[2], KEYS[4])
+if previous then
+    redis.call('DECRBY', KEYS[3], previous)
+end
+redis.call('SET', KEYS[4], ARGV[1], 'EX', ARGV[2])
+redis.call('ZADD', KEYS[1], ARGV[3], KEYS[4])
+redis.call('HSET', KEYS[2], KEYS[4], ARGV[4])
+redis.call('INCRBY', KEYS[3], ARGV[4])
+return 1
+"""
+
+# 从索引中移除一批缓存键，UNLINK 为真时同时删除缓存值
+# KEYS: 索引, 字节数哈希, 字节总数; ARGV: 是否删除, 缓存键...
+_FORGET_SCRIPT = """
+local removed = 0
+for i = 2, #ARGV do
+    local size = redis.call('HGET', KEYS[2], ARGV[i])
+    if size then
+        redis.call('DECRBY', KEYS[3], size)
+        redis.call('HDEL', KEYS[2], ARGV[i])
+    end
+    redis.call('ZREM', KEYS[1], ARGV[i])
+    if ARGV[1] == '1' then
+        removed = removed + redis.call('UNLINK', ARGV[i])
+    end
+end
+return removed
+"""
+
+
+class CacheBackend(ABC):
+    """
+    缓存存储后端接口
+
+    值为编码（可能已压缩）后的字节；indexed 为真的键计入缓存数量与字节统计（文件解析结果），
+    图片识别结果等辅助条目不计入。
+    """
+
+    # 后端名称，用于统计与健康检查
+    name: str = ""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[bytes]:
+        """读取缓存值，不存在或已过期时返回None"""
+
+    @abstractmethod
+    async def get_with_ttl(self, key: str) -> Tuple[Optional[bytes], int]:
+        """读取缓存值及剩余有效期（秒）"""
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, ttl: int, indexed: bool = False) -> None:
+        """写入缓存值"""
+
+    async def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        """批量读取缓存值，结果与 keys 一一对应"""
+        return [await self.get(key) for key in keys]
+
+    async def set_many(self, items: Dict[str, bytes], ttl: int) -> None:
+        """批量写入不计入统计的缓存值"""
+        for key, value in items.items():
+            await self.set(key, value, ttl)
+
+    @abstractmethod
+    async def clear(self, pattern: str) -> int:
+        """
+        清除匹配模式（前缀 + "*"）的缓存
+
+        Returns:
+            清除的条目数量
+        """
+
+    @abstractmethod
+    async def stats(self) -> Dict[str, Any]:
+        """
+        获取统计信息
+
+        Returns:
+            至少包含 cache_count 与 cache_bytes
+        """
+
+    @abstractmethod
+    async def ping(self) -> None:
+        """检查后端可用，不可用时抛出异常"""
+
+    async def close(self) -> None:
+        """释放连接等资源"""
+
+
+class RedisCacheBackend(CacheBackend):
+    """Redis存储后端"""
+
+    name = "redis"
+
+    def __init__(self, client: redis.Redis):
+        self.client = client
+        self._store_script = client.register_script(_STORE_SCRIPT)
+        self._forget_script = client.register_script(_FORGET_SCRIPT)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(key)
+
+    async def get_with_ttl(self, key: str) -> Tuple[Optional[bytes], int]:
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.get(key)
+            pipe.ttl(key)
+            value, ttl = await pipe.execute()
+        return value, ttl
+
+    async def set(self, key: str, value: bytes, ttl: int, indexed: bool = False) -> None:
+        if not indexed:
+            await self.client.setex(key, ttl, value)
+            return
+        # 缓存数据，设置TTL，同时更新索引并清理一批过期索引项
+        now = time.time()
+        await self._store_script(
+            keys=[CACHE_INDEX_KEY, CACHE_SIZES_KEY, CACHE_BYTES_KEY, key],
+            args=[value, ttl, now + ttl, len(value), now, CACHE_STORE_PRUNE_BATCH]
+        )
+
+    async def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        if not keys:
+            return []
+        return await self.client.mget(keys)
+
+    async def set_many(self, items: Dict[str, bytes], ttl: int) -> None:
+        async with self.client.pipeline(transaction=False) as pipe:
+            for key, value in items.items():
+                pipe.setex(key, ttl, value)
+            await pipe.execute()
+
+    async def clear(self, pattern: str) -> int:
+        deleted = 0
+        indexed = pattern.startswith("file2md:cache:")
+        # 按游标分批扫描并异步删除，不阻塞Redis
+        batch: List[bytes] = []
+        async for key in self.client.scan_iter(match=pattern, count=CACHE_SCAN_BATCH):
+            batch.append(key)
+            if len(batch) >= CACHE_SCAN_BATCH:
+                deleted += await self._unlink_batch(batch, indexed)
+                batch = []
+        if batch:
+            deleted += await self._unlink_batch(batch, indexed)
+
+        if indexed:
+            # 已过期的键不会被扫描到，其残留索引项单独清理
+            await self._prune_expired_index()
+        return deleted
+
+    async def _unlink_batch(self, keys: List[bytes], indexed: bool) -> int:
+        """
+        删除一批缓存键
+
+        Args:
+            keys: 缓存键
+            indexed: 是否为带索引的文件缓存键（需要同步更新索引）
+
+        Returns:
+            实际删除的键数量
+        """
+        if indexed:
+            return await self._forget_script(
+                keys=[CACHE_INDEX_KEY, CACHE_SIZES_KEY, CACHE_BYTES_KEY], args=[1, *keys]
+            )
+        async with self.client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.unlink(key)
+            return sum(await pipe.execute())
+
+    async def _prune_expired_index(self) -> None:
+        """
+        从索引中分批移除已过期的缓存键
+
+        写入时已顺带清理，这里只处理写入较少时剩余的过期项，开销与剩余数量成正比。
+        """
+        now = time.time()
+        while True:
+            expired = await self.client.zrangebyscore(
+                CACHE_INDEX_KEY, "-inf", now, start=0, num=CACHE_SCAN_BATCH
+            )
+            if not expired:
+                return
+            await self._forget_script(
+                keys=[CACHE_INDEX_KEY, CACHE_SIZES_KEY, CACHE_BYTES_KEY], args=[0, *expired]
+            )
+            if len(expired) < CACHE_SCAN_BATCH:
+                return
+
+    async def stats(self) -> Dict[str, Any]:
+        # 读取索引获取缓存数量和字节总数
+        await self._prune_expired_index()
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.zcard(CACHE_INDEX_KEY)
+            pipe.get(CACHE_BYTES_KEY)
+            cache_count, cache_bytes = await pipe.execute()
+
+        # 获取Redis信息
+        info = await self.client.info()
+
+        return {
+            "cache_count": cache_count,
+            "cache_bytes": int(cache_bytes or 0),
+            "redis_version": info.get("redis_version"),
+            "used_memory_human": info.get("used_memory_human"),
+            "connected_clients": info.get("connected_clients"),
+            "total_commands_processed": info.get("total_commands_processed")
+        }
+
+    async def ping(self) -> None:
+        await self.client.ping()
+
+    async def close(self) -> None:
+        await self.client.close()
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    SQLite磁盘存储后端
+
+    数据库文件位于 TEMP_DIR 下，同一主机上的多个工作进程可共享（WAL模式）。
+    总字节数超过上限时先删除过期条目，再按最近访问时间淘汰，直到降到上限的90%。
+    总字节数与缓存数量由触发器维护在单行的 totals 表中，多个进程写入时也保持一致，统计无需扫描。
+    数据库调用在线程中执行，不阻塞事件循环。
+    """
+
+    name = "disk"
+
+    def __init__(self, path: str, max_size: int):
+        self.path = path
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+            "indexed INTEGER NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS entries_expires ON entries (expires_at)")
+        self._create_totals()
+        logger.info(f"磁盘缓存已打开: {path} ({self._total_size()} bytes)")
+
+    def _create_totals(self) -> None:
+        """创建统计表及维护它的触发器，已有数据库首次打开时按现有条目初始化"""
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY CHECK (id = 0), "
+                "size INTEGER NOT NULL, indexed_count INTEGER NOT NULL, indexed_size INTEGER NOT NULL)"
+            )
+            self._connection.execute(
+                "INSERT OR IGNORE INTO totals SELECT 0, COALESCE(SUM(size), 0), "
+                "COALESCE(SUM(indexed), 0), COALESCE(SUM(size * indexed), 0) FROM entries"
+            )
+            self._connection.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN "
+                "UPDATE totals SET size = size + NEW.size, indexed_count = indexed_count + NEW.indexed, "
+                "indexed_size = indexed_size + NEW.size * NEW.indexed WHERE id = 0; END"
+            )
+            self._connection.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN "
+                "UPDATE totals SET size = size - OLD.size, indexed_count = indexed_count - OLD.indexed, "
+                "indexed_size = indexed_size - OLD.size * OLD.indexed WHERE id = 0; END"
+            )
+            self._connection.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_update AFTER UPDATE OF size, indexed ON entries BEGIN "
+                "UPDATE totals SET size = size - OLD.size + NEW.size, "
+                "indexed_count = indexed_count - OLD.indexed + NEW.indexed, "
+                "indexed_size = indexed_size - OLD.size * OLD.indexed + NEW.size * NEW.indexed WHERE id = 0; END"
+            )
+            self._connection.execute("COMMIT")
+        except Exception:
+            self._connection.execute("ROLLBACK")
+            raise
+
+    def _total_size(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT size FROM totals WHERE id = 0").fetchone()[0]
+
+    async def _run(self, func, *args):
+        return await asyncio.to_thread(func, *args)
+
+    def _get_sync(self, key: str) -> Tuple[Optional[bytes], int]:
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value, expires_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None, -2
+            value, expires_at = row
+            if expires_at <= now:
+                self._connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+                return None, -2
+            self._connection.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+        return value, int(expires_at - now)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        value, _ = await self._run(self._get_sync, key)
+        return value
+
+    async def get_with_ttl(self, key: str) -> Tuple[Optional[bytes], int]:
+        return await self._run(self._get_sync, key)
+
+    def _get_many_sync(self, keys: List[str]) -> List[Optional[bytes]]:
+        return [self._get_sync(key)[0] for key in keys]
+
+    async def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        return await self._run(self._get_many_sync, keys)
+
+    def _set_sync(self, key: str, value: bytes, ttl: int, indexed: bool) -> None:
+        now = time.time()
+        with self._lock:
+            # 覆盖已有键时走 UPDATE 触发器，统计中先扣除原有字节数
+            self._connection.execute(
+                "INSERT INTO entries (key, value, size, indexed, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value, "
+                "size = excluded.size, indexed = excluded.indexed, expires_at = excluded.expires_at, "
+                "accessed_at = excluded.accessed_at",
+                (key, value, len(value), int(indexed), now + ttl, now)
+            )
+            total = self._connection.execute("SELECT size FROM totals WHERE id = 0").fetchone()[0]
+        if total > self.max_size:
+            self._evict_sync()
+
+    def _evict_sync(self) -> None:
+        """删除过期条目，仍超过上限时按最近访问时间淘汰"""
+        target = int(self.max_size * 0.9)
+        with self._lock:
+            self._connection.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+            total = self._connection.execute("SELECT size FROM totals WHERE id = 0").fetchone()[0]
+            evicted = 0
+            while total > target:
+                rows = self._connection.execute(
+                    "SELECT key, size FROM entries ORDER BY accessed_at LIMIT ?", (CACHE_SCAN_BATCH,)
+                ).fetchall()
+                if not rows:
+                    break
+                batch = []
+                for key, size in rows:
+                    batch.append((key,))
+                    total -= size
+                    if total <= target:
+                        break
+                self._connection.executemany("DELETE FROM entries WHERE key = ?", batch)
+                evicted += len(batch)
+        if evicted:
+            logger.info(f"磁盘缓存超过容量上限，淘汰了 {evicted} 条最久未访问的记录")
+
+    async def set(self, key: str, value: bytes, ttl: int, indexed: bool = False) -> None:
+        await self._run(self._set_sync, key, value, ttl, indexed)
+
+    def _set_many_sync(self, items: Dict[str, bytes], ttl: int) -> None:
+        for key, value in items.items():
+            self._set_sync(key, value, ttl, False)
+
+    async def set_many(self, items: Dict[str, bytes], ttl: int) -> None:
+        await self._run(self._set_many_sync, items, ttl)
+
+    def _clear_sync(self, pattern: str) -> int:
+        prefix = pattern.rstrip("*")
+        # 前缀匹配：key 介于前缀与前缀后第一个不可能出现的字符之间
+        with self._lock:
+            cursor = self._connection.execute(
+                "DELETE FROM entries WHERE key >= ? AND key < ?", (prefix, prefix + "\U0010ffff")
+            )
+        return cursor.rowcount
+
+    async def clear(self, pattern: str) -> int:
+        return await self._run(self._clear_sync, pattern)
+
+    def _stats_sync(self) -> Dict[str, Any]:
+        with self._lock:
+            # 每次最多清理一批已过期条目，保持统计接近实际且不阻塞
+            self._connection.execute(
+                "DELETE FROM entries WHERE key IN (SELECT key FROM entries WHERE expires_at <= ? LIMIT ?)",
+                (time.time(), CACHE_SCAN_BATCH)
+            )
+            cache_count, cache_bytes = self._connection.execute(
+                "SELECT indexed_count, indexed_size FROM totals WHERE id = 0"
+            ).fetchone()
+        return {
+            "cache_count": cache_count,
+            "cache_bytes": cache_bytes,
+            "disk_path": self.path,
+            "disk_max_size_bytes": self.max_size
+        }
+
+    async def stats(self) -> Dict[str, Any]:
+        return await self._run(self._stats_sync)
+
+    async def ping(self) -> None:
+        return None
+
+    async def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+def open_disk_backend(path: str, max_size: int) -> Optional[SQLiteCacheBackend]:
+    """
+    打开磁盘缓存后端
+
+    Args:
+        path: 数据库文件路径
+        max_size: 容量上限（字节）
+
+    Returns:
+        磁盘缓存后端，打开失败时返回None
+    """
+    try:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return SQLiteCacheBackend(path, max_size)
+    except Exception as e:
+        logger.error(f"打开磁盘缓存失败 {path}: {e}")
+        return None
@@ -60,6 +60,28 @@ class Config:
     VISION_MAX_RETRIES: int = int(os.getenv("VISION_MAX_RETRIES", "3"))
     VISION_RETRY_DELAY: float = float(os.getenv("VISION_RETRY_DELAY", "1.0"))
     VISION_BACKOFF_FACTOR: float = float(os.getenv("VISION_BACKOFF_FACTOR", "2.0"))
+    VISION_TIMEOUT: float = float(os.getenv("VISION_TIMEOUT", "60.0"))
+    # 视觉API连接池配置（单一API主机的连接上限）
+    VISION_MAX_CONNECTIONS: int = int(os.getenv("VISION_MAX_CONNECTIONS", "20"))
+    VISION_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("VISION_MAX_KEEPALIVE_CONNECTIONS", "10"))
+    VISION_KEEPALIVE_EXPIRY: float = float(os.getenv("VISION_KEEPALIVE_EXPIRY", "30.0"))
+    VISION_HTTP2: bool = os.getenv("VISION_HTTP2", "true").lower() == "true"
+    # 视觉API全局并发与限速（所有并发转换共享）
+    VISION_MAX_INFLIGHT: int = int(os.getenv("VISION_MAX_INFLIGHT", "8"))
+    VISION_RATE_LIMIT: float = float(os.getenv("VISION_RATE_LIMIT", "0"))  # 每秒请求数，0 表示不限速
+    VISION_RATE_BURST: int = int(os.getenv("VISION_RATE_BURST", "8"))
+    # 视觉模型上传前的图片预处理：按长边缩小并重新编码
+    VISION_IMAGE_OPTIMIZE: bool = os.getenv("VISION_IMAGE_OPTIMIZE", "true").lower() == "true"
+    VISION_IMAGE_MAX_SIDE: int = int(os.getenv("VISION_IMAGE_MAX_SIDE", "2048"))
+    VISION_IMAGE_FORMAT: str = os.getenv("VISION_IMAGE_FORMAT", "jpeg").lower()
+    VISION_IMAGE_QUALITY: int = int(os.getenv("VISION_IMAGE_QUALITY", "85"))
+    
+    # OCR配置
+    # OCR工作进程数，每个进程持有独立的PaddleOCR实例；0 表示在进程内单线程执行
+    OCR_WORKERS: int = int(os.getenv("OCR_WORKERS", "2"))
+    # 批量OCR：每个OCR任务包含的图片数，以及文字识别阶段的批大小
+    OCR_BATCH_SIZE: int = int(os.getenv("OCR_BATCH_SIZE", "8"))
+    OCR_REC_BATCH_SIZE: int = int(os.getenv("OCR_REC_BATCH_SIZE", "16"))
     
     # API安全配置
     API_KEY: Optional[str] = os.getenv("API_KEY")
@@ -71,6 +93,22 @@ class Config:
     MAX_IMAGES_PER_DOC: int = int(os.getenv("MAX_IMAGES_PER_DOC", "5"))
     TEMP_DIR: str = os.getenv("TEMP_DIR", "/tmp")
     
+    # PDF 页面处理策略：auto（按页面分类）、text（仅文本层）、ocr（整页OCR）、images（文本层+OCR内嵌图片）
+    PDF_OCR_STRATEGY: str = os.getenv("PDF_OCR_STRATEGY", "auto").lower()
+    PDF_TEXT_MIN_CHARS: int = int(os.getenv("PDF_TEXT_MIN_CHARS", "50"))  # 文本层可用的最少字形数
+    PDF_SCAN_COVERAGE: float = float(os.getenv("PDF_SCAN_COVERAGE", "0.8"))  # 图片覆盖比例达到该值视为扫描页
+    PDF_FIGURE_COVERAGE: float = float(os.getenv("PDF_FIGURE_COVERAGE", "0.2"))  # 图片覆盖比例达到该值时OCR内嵌图片
+    PDF_OCR_RESOLUTION: int = int(os.getenv("PDF_OCR_RESOLUTION", "200"))  # 扫描页光栅化DPI
+    # PDF 内嵌图片提取方式：xobject（直接读取图片数据流，必要时回退渲染）、render（渲染页面区域）
+    PDF_IMAGE_EXTRACTION: str = os.getenv("PDF_IMAGE_EXTRACTION", "xobject").lower()
+    # PDF 分片并行提取：工作进程数（0 表示在服务进程内逐页提取）、每片页数、启用并行的最少页数
+    PDF_PARALLEL_WORKERS: int = int(os.getenv("PDF_PARALLEL_WORKERS", "2"))
+    PDF_PAGES_PER_CHUNK: int = int(os.getenv("PDF_PAGES_PER_CHUNK", "25"))
+    PDF_PARALLEL_MIN_PAGES: int = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "50"))
+    # PDF 流式处理：每个窗口的页数，以及同时进行OCR的窗口数上限
+    PDF_PAGE_WINDOW: int = int(os.getenv("PDF_PAGE_WINDOW", "16"))
+    PDF_OCR_INFLIGHT_WINDOWS: int = int(os.getenv("PDF_OCR_INFLIGHT_WINDOWS", "2"))
+    
     # Redis缓存配置
     REDIS_HOST: str = os.getenv("REDIS_HOST", "localhost")
     REDIS_PORT: int = int(os.getenv("REDIS_PORT", "6379"))
@@ -80,6 +118,41 @@ class Config:
     REDIS_CACHE_TTL: int = int(os.getenv("REDIS_CACHE_TTL", "86400"))  # 默认1天
     REDIS_CONNECTION_TIMEOUT: float = float(os.getenv("REDIS_CONNECTION_TIMEOUT", "5.0"))
     REDIS_MAX_CONNECTIONS: int = int(os.getenv("REDIS_MAX_CONNECTIONS", "20"))
+    # 文件缓存键使用的内容哈希算法：xxh3_128（需安装 xxhash）、blake3（需安装 blake3）、blake2b、md5
+    CACHE_HASH_ALGORITHM: str = os.getenv("CACHE_HASH_ALGORITHM", "xxh3_128").lower()
+    # 缓存存储后端：redis（多副本共享）或 disk（TEMP_DIR 下的SQLite文件，适合单节点部署）
+    CACHE_BACKEND: str = os.getenv("CACHE_BACKEND", "redis").lower()
+    # Redis不可用时是否临时使用磁盘后端，并按间隔（秒）后台重连
+    CACHE_DISK_FALLBACK: bool = os.getenv("CACHE_DISK_FALLBACK", "true").lower() == "true"
+    CACHE_RECONNECT_INTERVAL: int = int(os.getenv("CACHE_RECONNECT_INTERVAL", "30"))
+    CACHE_DISK_PATH: str = os.getenv("CACHE_DISK_PATH") or os.path.join(TEMP_DIR, "file2md_cache.sqlite3")
+    CACHE_DISK_MAX_SIZE: int = int(os.getenv("CACHE_DISK_MAX_SIZE", "1024")) * 1024 * 1024  # MB to bytes
+    # 缓存键包含解析器版本与相关配置；开启后新键未命中时读取升级前的旧键（file2md:cache:{MD5}）并迁移
+    # 只在开启时记录的解析器命名空间不变时读取；升级的同时修改了影响解析结果的配置时不要开启
+    CACHE_LEGACY_LOOKUP: bool = os.getenv("CACHE_LEGACY_LOOKUP", "false").lower() == "true"
+    # 进程内一级缓存（位于Redis之前，按结果大小限制总容量，0 表示禁用）
+    CACHE_L1_MAX_SIZE: int = int(os.getenv("CACHE_L1_MAX_SIZE", "64")) * 1024 * 1024  # MB to bytes
+    CACHE_L1_TTL: int = int(os.getenv("CACHE_L1_TTL", "600"))  # 秒
+    # 缓存值压缩：zstd（需安装 zstandard，未安装时回退到 zlib）、zlib、none
+    CACHE_COMPRESSION: str = os.getenv("CACHE_COMPRESSION", "zstd").lower()
+    CACHE_COMPRESSION_MIN_SIZE: int = int(os.getenv("CACHE_COMPRESSION_MIN_SIZE", "1024"))  # 字节
+    CACHE_COMPRESSION_LEVEL: int = int(os.getenv("CACHE_COMPRESSION_LEVEL", "3"))
+    # 可选的 zstd 训练字典路径（zstd --train 生成）
+    CACHE_COMPRESSION_DICT: str = os.getenv("CACHE_COMPRESSION_DICT", "")
+    # 相同文件并发请求合并：执行者持有的分布式锁过期时间（秒，处理期间自动续期）及等待者的最长等待时间（秒）
+    SINGLEFLIGHT_LOCK_TTL: int = int(os.getenv("SINGLEFLIGHT_LOCK_TTL", "60"))
+    SINGLEFLIGHT_WAIT_TIMEOUT: int = int(os.getenv("SINGLEFLIGHT_WAIT_TIMEOUT", "600"))
+    # 图片识别结果缓存（按图片内容哈希缓存OCR/视觉结果，跨文档复用）
+    IMAGE_CACHE_ENABLED: bool = os.getenv("IMAGE_CACHE_ENABLED", "true").lower() == "true"
+    IMAGE_CACHE_TTL: int = int(os.getenv("IMAGE_CACHE_TTL", "604800"))  # 默认7天
+    # 文档分片缓存（按PDF页/Excel工作表/PPTX幻灯片的内容哈希缓存转换结果，修改后的文档只重新处理变化的部分）
+    UNIT_CACHE_ENABLED: bool = os.getenv("UNIT_CACHE_ENABLED", "true").lower() == "true"
+    UNIT_CACHE_TTL: int = int(os.getenv("UNIT_CACHE_TTL", "604800"))  # 默认7天
+    # 感知哈希近似重复检测（重新编码/缩放后的相同图片复用识别结果）
+    IMAGE_PHASH_ENABLED: bool = os.getenv("IMAGE_PHASH_ENABLED", "true").lower() == "true"
+    IMAGE_PHASH_SIZE: int = int(os.getenv("IMAGE_PHASH_SIZE", "16"))  # 指纹位数为 SIZE * SIZE
+    IMAGE_PHASH_MAX_DISTANCE: int = int(os.getenv("IMAGE_PHASH_MAX_DISTANCE", "6"))  # 最大汉明距离
+    IMAGE_PHASH_LOCAL_SIZE: int = int(os.getenv("IMAGE_PHASH_LOCAL_SIZE", "4096"))  # 进程内索引容量
     
     # 文本文件处理配置
     MAX_TEXT_LINES: int = int(os.getenv("MAX_TEXT_LINES", "50000"))  # 最大行数
@@ -143,8 +216,99 @@ class Config:
             
             if cls.REDIS_MAX_CONNECTIONS < 1:
                 errors.append(f"Redis最大连接数无效: {cls.REDIS_MAX_CONNECTIONS}")
+            
+            if cls.IMAGE_CACHE_TTL < 60:
+                errors.append(f"图片缓存TTL无效: {cls.IMAGE_CACHE_TTL}")
+            
+            if cls.UNIT_CACHE_TTL < 60:
+                errors.append(f"分片缓存TTL无效: {cls.UNIT_CACHE_TTL}")
+            
+            if cls.CACHE_HASH_ALGORITHM not in ("xxh3_128", "blake3", "blake2b", "md5"):
+                errors.append(f"缓存哈希算法无效: {cls.CACHE_HASH_ALGORITHM}")
+            
+            if cls.CACHE_BACKEND not in ("redis", "disk"):
+                errors.append(f"缓存后端无效: {cls.CACHE_BACKEND}")
+            
+            if cls.CACHE_DISK_MAX_SIZE < 1024 * 1024 or cls.CACHE_RECONNECT_INTERVAL < 1:
+                errors.append(f"磁盘缓存配置无效: {cls.CACHE_DISK_MAX_SIZE} bytes, 重连间隔 {cls.CACHE_RECONNECT_INTERVAL}")
+            
+            if cls.CACHE_L1_MAX_SIZE < 0 or cls.CACHE_L1_TTL < 1:
+                errors.append(f"进程内缓存配置无效: {cls.CACHE_L1_MAX_SIZE} bytes, TTL {cls.CACHE_L1_TTL}")
+            
+            if cls.SINGLEFLIGHT_LOCK_TTL < 3 or cls.SINGLEFLIGHT_WAIT_TIMEOUT < 0:
+                errors.append(f"请求合并配置无效: 锁TTL {cls.SINGLEFLIGHT_LOCK_TTL}, 等待超时 {cls.SINGLEFLIGHT_WAIT_TIMEOUT}")
+            
+            if cls.CACHE_COMPRESSION not in ("zstd", "zlib", "none"):
+                errors.append(f"缓存压缩算法无效: {cls.CACHE_COMPRESSION}")
+            
+            if cls.CACHE_COMPRESSION_MIN_SIZE < 0 or not 1 <= cls.CACHE_COMPRESSION_LEVEL <= 22:
+                errors.append(f"缓存压缩配置无效: 阈值 {cls.CACHE_COMPRESSION_MIN_SIZE}, 级别 {cls.CACHE_COMPRESSION_LEVEL}")
+            
+            if cls.CACHE_COMPRESSION_DICT and not os.path.isfile(cls.CACHE_COMPRESSION_DICT):
+                errors.append(f"缓存压缩字典不存在: {cls.CACHE_COMPRESSION_DICT}")
+        
+        if cls.VISION_MAX_CONNECTIONS < 1:
+            errors.append(f"视觉API最大连接数无效: {cls.VISION_MAX_CONNECTIONS}")
+        
+        if cls.VISION_MAX_KEEPALIVE_CONNECTIONS < 0 or cls.VISION_MAX_KEEPALIVE_CONNECTIONS > cls.VISION_MAX_CONNECTIONS:
+            errors.append(f"视觉API保活连接数无效: {cls.VISION_MAX_KEEPALIVE_CONNECTIONS}")
+        
+        if cls.VISION_MAX_INFLIGHT < 1:
+            errors.append(f"视觉API最大在途请求数无效: {cls.VISION_MAX_INFLIGHT}")
+        
+        if cls.VISION_RATE_LIMIT < 0 or cls.VISION_RATE_BURST < 1:
+            errors.append(f"视觉API限速配置无效: {cls.VISION_RATE_LIMIT}/s, 突发 {cls.VISION_RATE_BURST}")
+        
+        if cls.VISION_IMAGE_MAX_SIDE < 64:
+            errors.append(f"视觉图片最长边无效: {cls.VISION_IMAGE_MAX_SIDE}")
+        
+        if cls.VISION_IMAGE_FORMAT not in ("jpeg", "webp", "png"):
+            errors.append(f"视觉图片编码格式无效: {cls.VISION_IMAGE_FORMAT}")
+        
+        if cls.VISION_IMAGE_QUALITY < 1 or cls.VISION_IMAGE_QUALITY > 100:
+            errors.append(f"视觉图片编码质量无效: {cls.VISION_IMAGE_QUALITY}")
+        
+        if cls.VISION_TIMEOUT <= 0:
+            errors.append(f"视觉API超时无效: {cls.VISION_TIMEOUT}")
+        
+        if cls.IMAGE_PHASH_SIZE < 4 or cls.IMAGE_PHASH_SIZE % 4 != 0:
+            errors.append(f"感知哈希尺寸无效（需为4的倍数）: {cls.IMAGE_PHASH_SIZE}")
+        
+        # 分段数（最大距离 + 1）不能超过指纹位数，否则无法保证至少一段相同
+        if cls.IMAGE_PHASH_MAX_DISTANCE < 0 or cls.IMAGE_PHASH_MAX_DISTANCE + 1 > cls.IMAGE_PHASH_SIZE * cls.IMAGE_PHASH_SIZE:
+            errors.append(f"感知哈希最大汉明距离无效: {cls.IMAGE_PHASH_MAX_DISTANCE}")
+        
+        if cls.IMAGE_PHASH_LOCAL_SIZE < 1:
+            errors.append(f"感知哈希进程内索引容量无效: {cls.IMAGE_PHASH_LOCAL_SIZE}")
+        
+        if cls.OCR_WORKERS < 0:
+            errors.append(f"OCR工作进程数无效: {cls.OCR_WORKERS}")
+        
+        if cls.OCR_BATCH_SIZE < 1 or cls.OCR_REC_BATCH_SIZE < 1:
+            errors.append(f"OCR批大小无效: {cls.OCR_BATCH_SIZE}/{cls.OCR_REC_BATCH_SIZE}")
         
         # 图片数量限制校验
+        if cls.PDF_OCR_STRATEGY not in ("auto", "text", "ocr", "images"):
+            errors.append(f"PDF页面处理策略无效: {cls.PDF_OCR_STRATEGY}")
+        
+        if cls.PDF_IMAGE_EXTRACTION not in ("xobject", "render"):
+            errors.append(f"PDF图片提取方式无效: {cls.PDF_IMAGE_EXTRACTION}")
+        
+        if cls.PDF_PARALLEL_WORKERS < 0 or cls.PDF_PAGES_PER_CHUNK < 1 or cls.PDF_PARALLEL_MIN_PAGES < 1:
+            errors.append(
+                f"PDF并行提取配置无效: 工作进程 {cls.PDF_PARALLEL_WORKERS}, "
+                f"每片 {cls.PDF_PAGES_PER_CHUNK} 页, 最少 {cls.PDF_PARALLEL_MIN_PAGES} 页"
+            )
+        
+        if cls.PDF_PAGE_WINDOW < 1 or cls.PDF_OCR_INFLIGHT_WINDOWS < 1:
+            errors.append(f"PDF流式处理配置无效: 窗口 {cls.PDF_PAGE_WINDOW} 页, 在途 {cls.PDF_OCR_INFLIGHT_WINDOWS}")
+        
+        if not (0 <= cls.PDF_FIGURE_COVERAGE <= cls.PDF_SCAN_COVERAGE <= 1):
+            errors.append(f"PDF图片覆盖比例阈值无效: {cls.PDF_FIGURE_COVERAGE}/{cls.PDF_SCAN_COVERAGE}")
+        
+        if cls.PDF_TEXT_MIN_CHARS < 0 or cls.PDF_OCR_RESOLUTION < 72:
+            errors.append(f"PDF文本层阈值或OCR分辨率无效: {cls.PDF_TEXT_MIN_CHARS}/{cls.PDF_OCR_RESOLUTION}")
+        
         if cls.MAX_IMAGES_PER_DOC < -1:
             errors.append(f"最大图片数量无效: {cls.MAX_IMAGES_PER_DOC}")
         
@@ -171,11 +335,20 @@ class Config:
         logger.info(f"最大文本字符数: {cls.MAX_TEXT_CHARS}")
         logger.info(f"图片处理上限: {('不限制' if cls.MAX_IMAGES_PER_DOC == -1 else cls.MAX_IMAGES_PER_DOC)}")
         logger.info(f"视觉API: {'已启用' if cls.is_vision_enabled() else '未启用'}")
+        logger.info(f"OCR工作进程: {cls.OCR_WORKERS if cls.OCR_WORKERS > 0 else '进程内执行'}")
         logger.info(f"API密钥验证: {'必需' if cls.REQUIRE_API_KEY else '可选'}")
         logger.info(f"Redis缓存: {'已启用' if cls.REDIS_CACHE_ENABLED else '未启用'}")
         if cls.REDIS_CACHE_ENABLED:
             logger.info(f"Redis地址: {cls.REDIS_HOST}:{cls.REDIS_PORT}")
             logger.info(f"缓存TTL: {cls.REDIS_CACHE_TTL // 3600}小时")
+            logger.info(f"缓存后端: {cls.CACHE_BACKEND}")
+            if cls.CACHE_BACKEND == "disk" or cls.CACHE_DISK_FALLBACK:
+                logger.info(f"磁盘缓存: {cls.CACHE_DISK_PATH} ({cls.CACHE_DISK_MAX_SIZE // (1024*1024)}MB)")
+            logger.info(f"缓存哈希算法: {cls.CACHE_HASH_ALGORITHM}")
+            logger.info(f"旧版缓存回退读取: {'已启用' if cls.CACHE_LEGACY_LOOKUP else '未启用'}")
+            logger.info(f"进程内缓存: {cls.CACHE_L1_MAX_SIZE // (1024*1024)}MB, TTL {cls.CACHE_L1_TTL}秒")
+            logger.info(f"分片缓存: {'已启用' if cls.UNIT_CACHE_ENABLED else '未启用'}")
+            logger.info(f"缓存压缩: {cls.CACHE_COMPRESSION} (>= {cls.CACHE_COMPRESSION_MIN_SIZE}字节, 级别 {cls.CACHE_COMPRESSION_LEVEL})")
         logger.info("==================")
 
 
@@ -0,0 +1,226 @@
+"""
+图片内存处理模块
+
+文档内嵌图片、渲染结果和上传图片统一以内存对象在感知哈希、OCR、视觉识别之间传递，
+避免"写临时文件 -> 重新打开 -> 转换格式再写盘"的往返。
+图片只解码一次，解码结果由各处理环节共享。
+"""
+import base64
+import hashlib
+import io
+from dataclasses import dataclass
+from typing import Optional, Union
+import numpy as np
+from PIL import Image
+
+# 支持的图片输入：文件路径、编码后的字节、PIL图片、RGB数组
+ImageInput = Union[str, bytes, Image.Image, np.ndarray]
+
+
+def _flatten_image(image: Image.Image) -> Image.Image:
+    """转换为RGB：多帧图片取第一帧，透明区域合成到白色背景"""
+    if hasattr(image, 'n_frames') and image.n_frames > 1:  # type: ignore
+        image.seek(0)
+
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        rgba = image.convert('RGBA')
+        background = Image.new('RGB', rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.split()[-1])
+        return background
+    if image.mode != 'RGB':
+        return image.convert('RGB')
+    return image
+
+
+def load_image(image: ImageInput) -> Image.Image:
+    """
+    将任意图片输入解码为RGB格式的PIL图片
+
+    Args:
+        image: 文件路径、图片字节、PIL图片或RGB数组（灰度数组亦可）
+
+    Returns:
+        RGB模式的PIL图片
+    """
+    if isinstance(image, Image.Image):
+        return _flatten_image(image)
+    if isinstance(image, np.ndarray):
+        return _flatten_image(Image.fromarray(image))
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(image)
+    elif isinstance(image, str):
+        source = image
+    else:
+        raise TypeError(f"不支持的图片输入类型: {type(image).__name__}")
+
+    with Image.open(source) as opened:
+        flattened = _flatten_image(opened)
+        return flattened.copy() if flattened is opened else flattened
+
+
+def to_bgr_array(image: ImageInput) -> np.ndarray:
+    """转换为 PaddleOCR/OpenCV 使用的 BGR 数组"""
+    if isinstance(image, np.ndarray) and image.ndim == 3 and image.shape[2] == 3:
+        rgb = image
+    else:
+        rgb = np.asarray(load_image(image))
+    return np.ascontiguousarray(rgb[:, :, ::-1])
+
+
+def encode_png(image: Image.Image) -> bytes:
+    """将PIL图片编码为PNG字节"""
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class PreparedImage:
+    """
+    一次解码、多处共享的图片
+
+    保留原始编码字节（用于内容寻址和视觉模型上传），并按需解码为RGB图片，
+    解码结果在感知哈希、OCR、视觉预处理之间复用。
+    """
+
+    def __init__(self, source: ImageInput):
+        self._data: Optional[bytes] = None
+        self._image: Optional[Image.Image] = None
+        self._content_hash: Optional[str] = None
+
+        if isinstance(source, str):
+            with open(source, 'rb') as image_file:
+                self._data = image_file.read()
+        elif isinstance(source, (bytes, bytearray, memoryview)):
+            self._data = bytes(source)
+        elif isinstance(source, Image.Image):
+            self._image = _flatten_image(source)
+        elif isinstance(source, np.ndarray):
+            self._image = _flatten_image(Image.fromarray(source))
+        else:
+            raise TypeError(f"不支持的图片输入类型: {type(source).__name__}")
+        self._from_encoded = self._data is not None
+
+    @property
+    def content_hash(self) -> str:
+        """图片内容哈希：编码图片按字节计算，内存图片按像素计算"""
+        if self._content_hash is None:
+            if self._from_encoded:
+                self._content_hash = hashlib.sha256(self._data).hexdigest()  # type: ignore
+            else:
+                image = self.decode()
+                hasher = hashlib.sha256(f"{image.mode}:{image.width}x{image.height}:".encode('ascii'))
+                hasher.update(image.tobytes())
+                self._content_hash = hasher.hexdigest()
+        return self._content_hash
+
+    @property
+    def original_data(self) -> Optional[bytes]:
+        """原始编码字节，内存图片为None"""
+        return self._data if self._from_encoded else None
+
+    @property
+    def decoded(self) -> bool:
+        """是否已解码"""
+        return self._image is not None
+
+    def decode(self) -> Image.Image:
+        """解码为RGB图片（同步，CPU密集，应在线程中调用），结果会被缓存"""
+        if self._image is None:
+            self._image = load_image(self._data)  # type: ignore
+        return self._image
+
+    def to_array(self) -> np.ndarray:
+        """RGB数组，供OCR工作进程使用"""
+        return np.asarray(self.decode())
+
+    def encoded(self) -> bytes:
+        """编码后的图片字节：优先使用原始字节，内存图片编码为PNG"""
+        if self._data is None:
+            self._data = encode_png(self.decode())
+        return self._data
+
+    def to_base64(self) -> str:
+        """视觉模型使用的base64编码"""
+        return base64.b64encode(self.encoded()).decode('utf-8')
+
+
+# 视觉模型接受的图片编码格式
+VISION_IMAGE_FORMATS = {
+    'jpeg': ('JPEG', 'image/jpeg'),
+    'webp': ('WEBP', 'image/webp'),
+    'png': ('PNG', 'image/png'),
+}
+
+
+def detect_mime_type(data: bytes) -> Optional[str]:
+    """根据文件头识别常见图片格式的MIME类型"""
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if data.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    return None
+
+
+@dataclass
+class VisionPayload:
+    """发送给视觉模型的图片数据"""
+    data: bytes
+    mime_type: str
+    original_size: int
+
+    @property
+    def bytes_saved(self) -> int:
+        """相比原图节省的字节数"""
+        return max(self.original_size - len(self.data), 0)
+
+    def to_base64(self) -> str:
+        return base64.b64encode(self.data).decode('utf-8')
+
+
+def prepare_vision_payload(image: PreparedImage, max_side: int, image_format: str, quality: int) -> VisionPayload:
+    """
+    视觉模型上传前的预处理（同步，CPU密集，应在线程中调用）
+
+    超过模型有效分辨率的图片按长边缩小到 max_side，透明通道合成到白色背景后
+    以指定格式和质量重新编码；原图尺寸合适且编码结果更小时直接使用原图。
+
+    Args:
+        image: 待上传的图片
+        max_side: 最长边像素上限
+        image_format: 重新编码格式（jpeg/webp/png）
+        quality: JPEG/WEBP 编码质量（1-100）
+
+    Returns:
+        上传数据及其MIME类型
+    """
+    original = image.original_data
+    original_mime = detect_mime_type(original) if original else None
+
+    decoded = image.decode()
+    width, height = decoded.size
+    scale = min(1.0, max_side / max(width, height, 1))
+    if scale < 1.0:
+        decoded = decoded.resize(
+            (max(1, round(width * scale)), max(1, round(height * scale))), Image.Resampling.LANCZOS
+        )
+
+    pil_format, mime_type = VISION_IMAGE_FORMATS[image_format]
+    if pil_format == 'PNG':
+        save_options = {'optimize': True}
+    elif pil_format == 'JPEG':
+        save_options = {'quality': quality, 'optimize': True}
+    else:
+        save_options = {'quality': quality}
+    buffer = io.BytesIO()
+    decoded.save(buffer, format=pil_format, **save_options)
+    encoded = buffer.getvalue()
+
+    original_size = len(original) if original else len(encoded)
+    if (original and scale == 1.0 and original_mime in ('image/png', 'image/jpeg', 'image/webp')
+            and len(original) <= len(encoded)):
+        return VisionPayload(data=original, mime_type=original_mime, original_size=original_size)  # type: ignore
+    return VisionPayload(data=encoded, mime_type=mime_type, original_size=original_size)
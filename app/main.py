@@ -13,6 +13,8 @@ from app.config import config
 from app.routers import convert
 from app.queue_manager import ConversionQueueManager
 from app.cache import init_cache, close_cache
+from app.ocr_pool import init_ocr_pool, close_ocr_pool
+from app.parsers.pdf import close_pdf_pool
 
 # 配置日志
 logger.remove()
@@ -73,6 +75,9 @@ async def startup_event():
     # 初始化缓存管理器
     await init_cache()
     
+    # 启动OCR工作池
+    await init_ocr_pool()
+    
     # 启动队列管理器
     await queue_manager.start_worker()
     logger.info(f"队列管理器已启动，支持最多{config.MAX_CONCURRENT}个并发文档转换")
@@ -88,6 +93,16 @@ async def shutdown_event():
     # 关闭缓存管理器
     await close_cache()
     
+    # 关闭OCR工作池
+    await close_ocr_pool()
+    
+    # 关闭PDF工作进程池
+    await close_pdf_pool()
+    
+    # 关闭视觉API客户端连接池
+    from app.vision import close_vision_client
+    await close_vision_client()
+    
     # 清理过期任务
     cleaned_count = queue_manager.cleanup_old_tasks(max_age_hours=config.QUEUE_CLEANUP_HOURS)
     if cleaned_count > 0:
@@ -118,17 +133,25 @@ async def health_check(response: Response):
                 "info": queue_manager.get_queue_info()
             },
             "cache": {
-                "status": "UP" if cache_manager.enabled else "DISABLED",
-                "enabled": cache_manager.enabled
+                "status": (
+                    "DISABLED" if not cache_manager.enabled
+                    else "DOWN" if cache_manager.backend is None
+                    else "DEGRADED" if cache_manager.degraded
+                    else "UP"
+                ),
+                "enabled": cache_manager.enabled,
+                "backend": cache_manager.backend_name
             }
         }
     }
     
     # 检查视觉模型状态
     if vision_client is not None:
+        from app.vision import vision_service
         health_status["components"]["vision"] = {
             "status": "UP",
-            "configured": True
+            "configured": True,
+            "info": vision_service.get_stats()
         }
     elif config.is_vision_enabled():
         health_status["components"]["vision"] = {
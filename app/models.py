@@ -62,12 +62,28 @@ class QueueInfoResponse(BaseModel):
 class CacheStatsResponse(BaseModel):
     """缓存统计响应模型"""
     enabled: bool
+    backend: Optional[str] = None
+    degraded: Optional[bool] = None
     cache_count: Optional[int] = None
+    cache_bytes: Optional[int] = None
     redis_version: Optional[str] = None
     used_memory_human: Optional[str] = None
     connected_clients: Optional[int] = None
     total_commands_processed: Optional[int] = None
     cache_ttl_hours: Optional[int] = None
+    disk_path: Optional[str] = None
+    disk_max_size_bytes: Optional[int] = None
+    l1_hits: Optional[int] = None
+    l2_hits: Optional[int] = None
+    misses: Optional[int] = None
+    l1_hit_ratio: Optional[float] = None
+    l2_hit_ratio: Optional[float] = None
+    l1_entries: Optional[int] = None
+    l1_size_bytes: Optional[int] = None
+    l1_max_size_bytes: Optional[int] = None
+    l1_evictions: Optional[int] = None
+    compression: Optional[str] = None
+    compression_ratio: Optional[float] = None
     error: Optional[str] = None
 
 class OCRResponse(BaseModel):
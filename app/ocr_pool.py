@@ -0,0 +1,334 @@
+"""
+OCR执行模块
+
+PaddleOCR 推理是CPU密集型的同步调用，直接在协程中执行会阻塞整个事件循环。
+本模块维护一个有界的OCR工作进程池，每个工作进程持有独立的 PaddleOCR 实例，
+协程通过 OCRWorkerPool.run() 提交任务并等待结果。
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, List
+from loguru import logger
+import numpy as np
+
+from app.config import config
+from app.exceptions import OCRError
+from app.imaging import ImageInput, to_bgr_array
+
+# 当前进程内的 PaddleOCR 实例（工作进程各自持有一份）
+_ocr_engine = None
+
+# 置信度阈值，低于该值的识别结果将被丢弃
+OCR_CONFIDENCE_THRESHOLD = 0.5
+
+
+def _is_gpu_available() -> bool:
+    """检测系统是否存在可用 GPU 并且 PaddlePaddle 编译支持 CUDA"""
+    try:
+        import paddle
+        if paddle.device.is_compiled_with_cuda():
+            return paddle.device.cuda.device_count() > 0
+    except Exception as e:
+        # 捕获所有异常（包括未安装 paddle 的情况）
+        logger.debug(f"GPU 检测失败或不可用: {e}")
+    return False
+
+
+def init_paddle_ocr():
+    """初始化 PaddleOCR 引擎"""
+    global _ocr_engine
+    try:
+        from paddleocr import PaddleOCR
+
+        # 根据系统环境自动检测是否启用 GPU
+        gpu_available = _is_gpu_available()
+
+        try:
+            # 尝试新版本参数
+            _ocr_engine = PaddleOCR(
+                use_textline_orientation=True,  # 使用文本行方向检测 (新参数名)
+                lang='ch',  # 中文识别
+                use_gpu=gpu_available,  # 自动选择 GPU 或 CPU
+                rec_batch_num=config.OCR_REC_BATCH_SIZE  # 文字识别阶段的批大小
+            )
+            logger.info(
+                f"PaddleOCR ({'GPU' if gpu_available else 'CPU'}) 初始化成功 - 使用新版API (PID: {os.getpid()})"
+            )
+        except TypeError:
+            # 回退到旧版本参数（use_angle_cls）
+            logger.info("使用旧版本PaddleOCR API参数")
+            _ocr_engine = PaddleOCR(
+                use_angle_cls=True,  # 使用角度分类器 (旧参数名)
+                lang='ch',  # 中文识别
+                use_gpu=gpu_available,  # 自动选择 GPU 或 CPU
+                rec_batch_num=config.OCR_REC_BATCH_SIZE  # 文字识别阶段的批大小
+            )
+            logger.info(
+                f"PaddleOCR ({'GPU' if gpu_available else 'CPU'}) 初始化成功 - 使用旧版API (PID: {os.getpid()})"
+            )
+
+        return _ocr_engine
+
+    except ImportError:
+        logger.error("PaddleOCR 未安装，请运行: pip install paddleocr")
+        return None
+    except Exception as e:
+        logger.error(f"PaddleOCR 初始化失败: {e}")
+        return None
+
+
+def get_ocr_engine():
+    """获取当前进程的 OCR 引擎实例"""
+    global _ocr_engine
+    if _ocr_engine is None:
+        _ocr_engine = init_paddle_ocr()
+    return _ocr_engine
+
+
+def recognize_image(image: ImageInput) -> List[str]:
+    """
+    同步执行 PaddleOCR 识别（在OCR工作进程/线程中运行）
+
+    Args:
+        image: 文件路径、图片字节、PIL图片或RGB数组
+
+    Returns:
+        置信度高于阈值的文字行列表
+
+    Raises:
+        OCRError: OCR处理失败
+    """
+    ocr_engine = get_ocr_engine()
+    if ocr_engine is None:
+        raise OCRError("PaddleOCR 引擎未初始化")
+
+    # 图片预处理：统一转换为 PaddleOCR 兼容的 BGR 数组（透明背景转白色，多帧取第一帧）
+    try:
+        image_array = to_bgr_array(image)
+    except Exception as e:
+        raise OCRError(f"图片解码失败: {str(e)}")
+
+    # 使用 PaddleOCR 进行文字识别
+    try:
+        logger.debug(f"使用 PaddleOCR 处理图片: {image_array.shape[1]}x{image_array.shape[0]}")
+
+        # PaddleOCR 识别
+        result = ocr_engine.ocr(image_array, cls=True)
+
+        # 解析 PaddleOCR 结果
+        ocr_text_list = []
+        if result and result[0]:  # result是一个列表，包含每页的结果
+            for line in result[0]:  # 遍历每一行文字
+                if line and len(line) >= 2:
+                    text = line[1][0]  # 获取识别的文字
+                    confidence = line[1][1]  # 获取置信度
+                    # 只保留置信度较高的文字
+                    if confidence > OCR_CONFIDENCE_THRESHOLD:
+                        ocr_text_list.append(text)
+
+        return ocr_text_list
+
+    except Exception as ocr_error:
+        logger.error(f"PaddleOCR 处理失败: {ocr_error}")
+
+        # 检查是否是模型加载问题
+        if "No module named" in str(ocr_error) or "ImportError" in str(ocr_error):
+            raise OCRError(f"PaddleOCR 依赖缺失: {str(ocr_error)}")
+        elif "download" in str(ocr_error).lower():
+            raise OCRError(f"PaddleOCR 模型下载失败，请检查网络连接: {str(ocr_error)}")
+        else:
+            raise OCRError(f"PaddleOCR 识别失败: {str(ocr_error)}")
+
+
+def _sort_text_boxes(boxes: List[np.ndarray]) -> List[np.ndarray]:
+    """按阅读顺序（从上到下、从左到右）排序文字框，与 PaddleOCR 内部规则一致"""
+    boxes = sorted(boxes, key=lambda b: (b[0][1], b[0][0]))
+    for i in range(len(boxes) - 1):
+        for j in range(i, -1, -1):
+            if abs(boxes[j + 1][0][1] - boxes[j][0][1]) < 10 and boxes[j + 1][0][0] < boxes[j][0][0]:
+                boxes[j], boxes[j + 1] = boxes[j + 1], boxes[j]
+            else:
+                break
+    return boxes
+
+
+def _crop_text_region(image: np.ndarray, box: np.ndarray) -> np.ndarray:
+    """按文字框四点做透视变换裁剪，竖排文字旋转为横排"""
+    import cv2
+
+    points = box.astype(np.float32)
+    width = int(max(np.linalg.norm(points[0] - points[1]), np.linalg.norm(points[2] - points[3])))
+    height = int(max(np.linalg.norm(points[0] - points[3]), np.linalg.norm(points[1] - points[2])))
+    width, height = max(width, 1), max(height, 1)
+
+    target = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+    matrix = cv2.getPerspectiveTransform(points, target)
+    crop = cv2.warpPerspective(image, matrix, (width, height),
+                               borderMode=cv2.BORDER_REPLICATE, flags=cv2.INTER_CUBIC)
+    if height / width >= 1.5:
+        crop = np.rot90(crop)
+    return crop
+
+
+def recognize_images(images: List[ImageInput]) -> List[Optional[List[str]]]:
+    """
+    批量执行 PaddleOCR 识别（在OCR工作进程/线程中运行）
+
+    每张图片单独做文字检测，随后把所有图片的文字行裁剪合并为一页，
+    一次性送入识别模型按 rec_batch_num 分批推理，识别开销随批大小而非图片数量增长。
+    PaddleOCR 版本不支持分阶段调用（det/rec 参数）时回退到逐张识别。
+
+    Args:
+        images: 图片列表（文件路径、图片字节、PIL图片或RGB数组）
+
+    Returns:
+        与输入顺序一致的文字行列表，单张图片解码失败时对应位置为None
+
+    Raises:
+        OCRError: 检测或识别失败
+    """
+    ocr_engine = get_ocr_engine()
+    if ocr_engine is None:
+        raise OCRError("PaddleOCR 引擎未初始化")
+
+    results: List[Optional[List[str]]] = [[] for _ in images]
+    crops = []
+    crop_owners = []
+    rec_lines = []
+    try:
+        for image_idx, source in enumerate(images):
+            try:
+                image = to_bgr_array(source)
+            except Exception as e:
+                logger.warning(f"OCR识别失败 图片{image_idx + 1}: 图片解码失败: {e}")
+                results[image_idx] = None
+                continue
+            det_result = ocr_engine.ocr(image, det=True, rec=False, cls=False)
+            boxes = [np.array(box, dtype=np.float32) for box in (det_result[0] or [])] if det_result else []
+            for box in _sort_text_boxes(boxes):
+                crops.append(_crop_text_region(image, box))
+                crop_owners.append(image_idx)
+
+        if crops:
+            # 列表中的每个元素是一页，所有文字框作为同一页传入才会按 rec_batch_num 合批识别
+            rec_result = ocr_engine.ocr([crops], det=False, rec=True, cls=True)
+            rec_lines = rec_result[0] if rec_result and rec_result[0] else []
+    except TypeError as api_error:
+        logger.warning(f"PaddleOCR 不支持分阶段识别，回退到逐张识别: {api_error}")
+        return _recognize_each(images)
+    except Exception as e:
+        raise OCRError(f"PaddleOCR 批量识别失败: {str(e)}")
+
+    if len(rec_lines) != len(crops):
+        raise OCRError(f"识别结果数量与文字框数量不一致: {len(rec_lines)} != {len(crops)}")
+
+    for owner, (text, confidence) in zip(crop_owners, rec_lines):
+        if confidence > OCR_CONFIDENCE_THRESHOLD:
+            results[owner].append(text)  # type: ignore
+
+    logger.debug(f"PaddleOCR 批量识别完成: {len(images)} 张图片, {len(crops)} 个文字框")
+    return results
+
+
+def _recognize_each(images: List[ImageInput]) -> List[Optional[List[str]]]:
+    """逐张识别（检测与识别一次完成），单张图片失败时对应位置为None"""
+    results: List[Optional[List[str]]] = []
+    for idx, source in enumerate(images):
+        try:
+            results.append(recognize_image(source))
+        except OCRError as e:
+            logger.warning(f"OCR识别失败 图片{idx + 1}: {e}")
+            results.append(None)
+    return results
+
+
+def _init_worker():
+    """OCR工作进程初始化：每个工作进程加载独立的 PaddleOCR 实例"""
+    init_paddle_ocr()
+
+
+class OCRWorkerPool:
+    """
+    OCR工作池
+
+    OCR_WORKERS > 0 时使用独立的工作进程（spawn 方式启动，避免继承父进程的模型和锁），
+    OCR_WORKERS = 0 时退化为进程内单线程执行（PaddleOCR 实例非线程安全），
+    两种模式下推理都不会在事件循环线程中运行。
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._executor: Optional[Executor] = None
+
+    @property
+    def uses_processes(self) -> bool:
+        """是否使用独立工作进程"""
+        return self.max_workers > 0
+
+    def start(self) -> None:
+        """启动工作池（幂等）"""
+        if self._executor is not None:
+            return
+
+        if self.uses_processes:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker
+            )
+            logger.info(f"OCR工作进程池已启动，工作进程数: {self.max_workers}")
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ocr")
+            # 进程内模式下预先加载模型，避免首个请求承担初始化耗时
+            self._executor.submit(get_ocr_engine)
+            logger.info("OCR工作池以进程内单线程模式启动")
+
+    async def run(self, func, *args):
+        """
+        在OCR工作池中执行同步函数
+
+        Args:
+            func: 模块级同步函数（进程模式下需可被pickle）
+            *args: 函数参数
+
+        Returns:
+            函数返回值
+
+        Raises:
+            OCRError: 工作进程异常退出
+        """
+        self.start()
+        loop = asyncio.get_running_loop()
+
+        try:
+            return await loop.run_in_executor(self._executor, func, *args)
+        except BrokenProcessPool as e:
+            logger.error(f"OCR工作进程异常退出，正在重建进程池: {e}")
+            self.shutdown(wait=False)
+            raise OCRError("OCR工作进程异常退出，请重试")
+
+    def shutdown(self, wait: bool = True) -> None:
+        """关闭工作池"""
+        if self._executor is None:
+            return
+        executor = self._executor
+        self._executor = None
+        executor.shutdown(wait=wait, cancel_futures=True)
+        logger.info("OCR工作池已关闭")
+
+
+# 全局OCR工作池实例
+ocr_pool = OCRWorkerPool(max_workers=config.OCR_WORKERS)
+
+
+async def init_ocr_pool():
+    """初始化OCR工作池"""
+    ocr_pool.start()
+
+
+async def close_ocr_pool():
+    """关闭OCR工作池"""
+    ocr_pool.shutdown()
@@ -3,12 +3,12 @@ import asyncio
 import tempfile
 import subprocess
 import numpy as np
-from typing import List, Tuple, Optional
+from typing import List, Tuple, Optional, AsyncIterator, Dict, Any
 import httpx
 from loguru import logger
 from concurrent.futures import ThreadPoolExecutor
 
-from .base import BaseParser
+from .base import BaseParser, ParseChunk, ParseOptions
 from app.config import config
 
 try:
@@ -40,13 +40,18 @@ class AudioSegmentInfo:
 class AudioParser(BaseParser):
     """音频/视频文件解析器 - 支持分块处理和ASR转换"""
     
+    @classmethod
+    def cache_settings(cls) -> Dict[str, Any]:
+        """转录结果取决于ASR模型"""
+        return {**super().cache_settings(), 'asr_model': os.getenv("ASR_MODEL", "") or 'whisper-1'}
+    
     @classmethod
     def get_supported_extensions(cls) -> List[str]:
         return ['.wav', '.mp3', '.mp4', '.m4a', '.flac', '.ogg', '.wma', '.aac', 
                 '.avi', '.mov', '.wmv', '.mkv', '.webm', '.3gp']
     
-    def __init__(self):
-        super().__init__()
+    def __init__(self, options: Optional[ParseOptions] = None):
+        super().__init__(options)
         self.asr_model = os.getenv("ASR_MODEL", "")
         self.asr_api_base = os.getenv("ASR_API_BASE", "")
         self.asr_api_key = os.getenv("ASR_API_KEY", "")
@@ -56,20 +61,20 @@ class AudioParser(BaseParser):
         # 视频格式列表
         self.video_extensions = {'.mp4', '.avi', '.mov', '.wmv', '.mkv', '.webm', '.3gp'}
     
-    async def parse(self, file_path: str) -> str:
-        """解析音频/视频文件并转换为文本"""
+    async def iter_parse(self, file_path: str) -> AsyncIterator[ParseChunk]:
+        """解析音频/视频文件并转换为文本，按时间顺序逐个片段产出转录结果"""
+        # 检查文件类型
+        file_extension = os.path.splitext(file_path)[1].lower()
+        is_video = file_extension in self.video_extensions
+        media_name = '视频' if is_video else '音频'
+        # 音频输出转录文本，视频输出字幕，两者使用不同的代码块类型
+        self.block_type = "video" if is_video else "audio"
+        
         try:
             if not PYDUB_AVAILABLE:
                 raise Exception("音频处理需要安装pydub库: pip install pydub")
             
-            # 检查文件类型
-            file_extension = os.path.splitext(file_path)[1].lower()
-            is_video = file_extension in self.video_extensions
-            
-            if is_video:
-                logger.info(f"开始解析视频文件: {file_path}")
-            else:
-                logger.info(f"开始解析音频文件: {file_path}")
+            logger.info(f"开始解析{media_name}文件: {file_path}")
             
             # 1. 预处理音频（视频文件会自动提取音频轨道）
             audio = await self._preprocess_audio(file_path)
@@ -77,25 +82,22 @@ class AudioParser(BaseParser):
             # 2. 基于能量分析进行分块
             segments = await self._split_audio_by_energy(audio)
             
-            # 3. 并发ASR转换
-            transcriptions = await self._batch_transcribe_segments(segments)
+            # 3. 并发ASR转换，按片段顺序取得结果
+            transcriptions = self._iter_transcriptions(segments)
             
             # 4. 格式化输出（根据文件类型选择输出格式）
             if is_video:
-                formatted_content = await self._format_video_subtitle_output(
-                    file_path, audio, segments, transcriptions
-                )
+                chunks = self._format_video_subtitle_output(file_path, audio, segments, transcriptions)
             else:
-                formatted_content = await self._format_audio_output(
-                    file_path, audio, segments, transcriptions
-                )
+                chunks = self._format_audio_output(file_path, audio, segments, transcriptions)
+            async for chunk in chunks:
+                yield chunk
             
-            logger.info(f"成功解析{'视频' if is_video else '音频'}文件: {file_path}, 共{len(segments)}个片段")
-            return formatted_content
+            logger.info(f"成功解析{media_name}文件: {file_path}, 共{len(segments)}个片段")
             
         except Exception as e:
-            logger.error(f"解析{'视频' if is_video else '音频'}文件失败 {file_path}: {e}")
-            raise Exception(f"{'视频' if is_video else '音频'}文件解析错误: {str(e)}")
+            logger.error(f"解析{media_name}文件失败 {file_path}: {e}")
+            raise Exception(f"{media_name}文件解析错误: {str(e)}")
     
     async def _preprocess_audio(self, file_path: str):
         """音频预处理 - 统一采样率、转单声道、去直流偏移"""
@@ -305,59 +307,59 @@ class AudioParser(BaseParser):
         
         return segments
     
-    async def _batch_transcribe_segments(self, segments: List[AudioSegmentInfo]) -> List[str]:
-        """并发批量ASR转换"""
+    async def _transcribe_segment(self, segment: AudioSegmentInfo) -> str:
+        """转换单个音频片段"""
         try:
-            logger.info(f"开始并发ASR转换 {len(segments)} 个片段...")
-            
-            # 使用线程池并发处理
-            max_workers = min(len(segments), config.MAX_CONCURRENT)
-            
-            async def transcribe_single_segment(segment: AudioSegmentInfo) -> str:
-                try:
-                    # 保存片段到临时文件
-                    with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
-                        segment.segment.export(temp_file.name, format='wav')
-                        temp_path = temp_file.name
+            # 保存片段到临时文件
+            with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
+                segment.segment.export(temp_file.name, format='wav')
+                temp_path = temp_file.name
+            
+            try:
+                # 调用ASR API
+                transcription = await self._call_asr_api(temp_path)
+                
+                # 根据置信度调整输出
+                if segment.confidence < 0.3:
+                    transcription = f"[低质量音频] {transcription}"
+                
+                return transcription
+                
+            finally:
+                # 清理临时文件
+                if os.path.exists(temp_path):
+                    os.unlink(temp_path)
                     
-                    try:
-                        # 调用ASR API
-                        transcription = await self._call_asr_api(temp_path)
-                        
-                        # 根据置信度调整输出
-                        if segment.confidence < 0.3:
-                            transcription = f"[低质量音频] {transcription}"
-                        
-                        return transcription
-                        
-                    finally:
-                        # 清理临时文件
-                        if os.path.exists(temp_path):
-                            os.unlink(temp_path)
-                            
-                except Exception as e:
-                    logger.warning(f"片段转换失败: {e}")
-                    return f"[转换失败: {str(e)}]"
-            
-            # 并发执行转换
-            tasks = [transcribe_single_segment(seg) for seg in segments]
-            transcriptions = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            # 处理异常结果
-            results = []
-            for i, result in enumerate(transcriptions):
-                if isinstance(result, Exception):
-                    logger.error(f"片段 {i} 转换异常: {result}")
-                    results.append(f"[转换异常: {str(result)}]")
-                else:
-                    results.append(result)
-            
-            logger.info(f"ASR转换完成: {len(results)}个片段")
-            return results
-            
         except Exception as e:
-            logger.error(f"批量ASR转换失败: {e}")
-            return [f"[ASR转换失败: {str(e)}]"] * len(segments)
+            logger.warning(f"片段转换失败: {e}")
+            return f"[转换失败: {str(e)}]"
+    
+    async def _iter_transcriptions(self, segments: List[AudioSegmentInfo]) -> AsyncIterator[str]:
+        """并发ASR转换，按片段顺序逐个产出转录结果"""
+        logger.info(f"开始并发ASR转换 {len(segments)} 个片段...")
+        
+        # 最多 MAX_CONCURRENT 个片段同时转换，前面的片段完成即可产出，无需等待整个文件
+        semaphore = asyncio.Semaphore(config.MAX_CONCURRENT)
+        
+        async def transcribe(segment: AudioSegmentInfo) -> str:
+            async with semaphore:
+                return await self._transcribe_segment(segment)
+        
+        tasks = [asyncio.create_task(transcribe(seg)) for seg in segments]
+        try:
+            for i, task in enumerate(tasks):
+                try:
+                    transcription = await task
+                except Exception as e:
+                    logger.error(f"片段 {i} 转换异常: {e}")
+                    transcription = f"[转换异常: {str(e)}]"
+                yield transcription
+            
+            logger.info(f"ASR转换完成: {len(tasks)}个片段")
+        finally:
+            # 调用方提前停止消费时取消剩余的转换
+            for task in tasks:
+                task.cancel()
     
     async def _call_asr_api(self, audio_file_path: str) -> str:
         """调用ASR API进行语音识别"""
@@ -395,153 +397,134 @@ class AudioParser(BaseParser):
     
     async def _format_audio_output(self, file_path: str, audio, 
                                  segments: List[AudioSegmentInfo], 
-                                 transcriptions: List[str]) -> str:
-        """格式化音频解析输出"""
-        try:
-            # 基本信息
-            duration_seconds = len(audio) / 1000
-            sample_rate = audio.frame_rate
-            channels = audio.channels
-            
-            # 构建输出内容
-            output_parts = []
-            
-            # 音频基本信息
-            output_parts.append("# 音频信息")
-            output_parts.append(f"**文件名**: {os.path.basename(file_path)}")
-            output_parts.append(f"**时长**: {duration_seconds:.1f} 秒")
-            output_parts.append(f"**采样率**: {sample_rate} Hz")
-            output_parts.append(f"**声道数**: {channels}")
-            output_parts.append(f"**片段数**: {len(segments)}")
-            output_parts.append("")
-            
-            # 分段转录结果
-            output_parts.append("# 语音转录")
-            output_parts.append("")
-            
-            for i, (segment, transcription) in enumerate(zip(segments, transcriptions)):
-                start_time = segment.start_time
-                end_time = segment.end_time
-                confidence = segment.confidence
-                
-                # 时间戳格式化
-                start_str = self._format_timestamp(start_time)
-                end_str = self._format_timestamp(end_time)
-                
-                # 片段标题
-                output_parts.append(f"## 片段 {i+1} [{start_str} - {end_str}]")
-                
-                # 置信度指示
-                if confidence >= 0.8:
-                    quality_indicator = "🟢 高质量"
-                elif confidence >= 0.5:
-                    quality_indicator = "🟡 中等质量"
-                else:
-                    quality_indicator = "🔴 低质量"
-                
-                output_parts.append(f"**音质**: {quality_indicator} (置信度: {confidence:.2f})")
-                output_parts.append("")
-                
-                # 转录文本
-                if transcription and transcription.strip():
-                    output_parts.append(transcription.strip())
-                else:
-                    output_parts.append("*[无法识别的语音内容]*")
-                
-                output_parts.append("")
-            
-            # 统计信息
-            total_chars = sum(len(t) for t in transcriptions if t)
-            valid_segments = sum(1 for t in transcriptions if t and not t.startswith('['))
-            
-            output_parts.append("# 处理统计")
-            output_parts.append(f"**有效片段**: {valid_segments}/{len(segments)}")
-            output_parts.append(f"**转录字符数**: {total_chars}")
-            if len(segments) > 0:
-                output_parts.append(f"**平均片段时长**: {duration_seconds/len(segments):.1f} 秒")
+                                 transcriptions: AsyncIterator[str]) -> AsyncIterator[ParseChunk]:
+        """格式化音频解析输出，依次产出音频信息、各片段转录和处理统计"""
+        # 基本信息
+        duration_seconds = len(audio) / 1000
+        sample_rate = audio.frame_rate
+        channels = audio.channels
+        
+        # 音频基本信息
+        output_parts = []
+        output_parts.append("# 音频信息")
+        output_parts.append(f"**文件名**: {os.path.basename(file_path)}")
+        output_parts.append(f"**时长**: {duration_seconds:.1f} 秒")
+        output_parts.append(f"**采样率**: {sample_rate} Hz")
+        output_parts.append(f"**声道数**: {channels}")
+        output_parts.append(f"**片段数**: {len(segments)}")
+        output_parts.append("")
+        
+        # 分段转录结果
+        output_parts.append("# 语音转录")
+        yield ParseChunk(kind="header", index=0, text='\n'.join(output_parts))
+        
+        completed: List[str] = []
+        async for transcription in transcriptions:
+            i = len(completed)
+            segment = segments[i]
+            completed.append(transcription)
+            
+            # 时间戳格式化
+            start_str = self._format_timestamp(segment.start_time)
+            end_str = self._format_timestamp(segment.end_time)
+            
+            # 置信度指示
+            confidence = segment.confidence
+            if confidence >= 0.8:
+                quality_indicator = "🟢 高质量"
+            elif confidence >= 0.5:
+                quality_indicator = "🟡 中等质量"
             else:
-                output_parts.append("**平均片段时长**: N/A (无有效片段)")
-            
-            # 格式化为音频代码块
-            content = '\n'.join(output_parts)
-            formatted_content = f"```audio\n{content}\n```"
-            
-            return formatted_content
+                quality_indicator = "🔴 低质量"
+            
+            # 片段标题
+            output_parts = [
+                f"## 片段 {i+1} [{start_str} - {end_str}]",
+                f"**音质**: {quality_indicator} (置信度: {confidence:.2f})",
+                ""
+            ]
+            
+            # 转录文本
+            if transcription and transcription.strip():
+                output_parts.append(transcription.strip())
+            else:
+                output_parts.append("*[无法识别的语音内容]*")
             
-        except Exception as e:
-            logger.error(f"格式化输出失败: {e}")
-            return f"```audio\n# 音频解析失败\n错误: {str(e)}\n```"
+            yield ParseChunk(kind="segment", index=i + 1, text='\n'.join(output_parts))
+        
+        # 统计信息
+        total_chars = sum(len(t) for t in completed if t)
+        valid_segments = sum(1 for t in completed if t and not t.startswith('['))
+        
+        output_parts = []
+        output_parts.append("# 处理统计")
+        output_parts.append(f"**有效片段**: {valid_segments}/{len(segments)}")
+        output_parts.append(f"**转录字符数**: {total_chars}")
+        if len(segments) > 0:
+            output_parts.append(f"**平均片段时长**: {duration_seconds/len(segments):.1f} 秒")
+        else:
+            output_parts.append("**平均片段时长**: N/A (无有效片段)")
+        yield ParseChunk(kind="summary", index=0, text='\n'.join(output_parts))
     
     async def _format_video_subtitle_output(self, file_path: str, audio, 
                                            segments: List[AudioSegmentInfo], 
-                                           transcriptions: List[str]) -> str:
-        """格式化视频字幕输出"""
-        try:
-            # 基本信息
-            duration_seconds = len(audio) / 1000
-            sample_rate = audio.frame_rate
-            
-            # 构建输出内容
-            output_parts = []
-            
-            # 视频基本信息
-            output_parts.append("# Video Information")
-            output_parts.append(f"**Filename**: {os.path.basename(file_path)}")
-            output_parts.append(f"**Audio Duration**: {duration_seconds:.1f} seconds")
-            output_parts.append(f"**Sample Rate**: {sample_rate} Hz")
-            output_parts.append(f"**Segments**: {len(segments)}")
-            output_parts.append("")
-            
-            # 字幕内容
-            output_parts.append("# Subtitles")
-            output_parts.append("")
-            
-            for i, (segment, transcription) in enumerate(zip(segments, transcriptions)):
-                start_time = segment.start_time
-                end_time = segment.end_time
-                confidence = segment.confidence
-                
-                # SRT格式的时间戳
-                start_str = self._format_srt_timestamp(start_time)
-                end_str = self._format_srt_timestamp(end_time)
-                
-                # 字幕条目（类似SRT格式）
-                output_parts.append(f"{i+1}")
-                output_parts.append(f"{start_str} --> {end_str}")
-                
-                # 转录文本（如果有效）
-                if transcription and transcription.strip() and not transcription.startswith('['):
-                    output_parts.append(transcription.strip())
-                else:
-                    # 如果是低质量或失败的转录，添加质量标记
-                    if confidence < 0.5:
-                        output_parts.append(f"[Low Quality Audio] {transcription}")
-                    else:
-                        output_parts.append("*[Inaudible]*")
-                
-                output_parts.append("")  # 空行分隔
-            
-            # 处理统计
-            total_chars = sum(len(t) for t in transcriptions if t and not t.startswith('['))
-            valid_segments = sum(1 for t in transcriptions if t and not t.startswith('['))
-            
-            output_parts.append("# Processing Statistics")
-            output_parts.append(f"**Valid Segments**: {valid_segments}/{len(segments)}")
-            output_parts.append(f"**Total Characters**: {total_chars}")
-            if len(segments) > 0:
-                output_parts.append(f"**Average Segment Duration**: {duration_seconds/len(segments):.1f} seconds")
+                                           transcriptions: AsyncIterator[str]) -> AsyncIterator[ParseChunk]:
+        """格式化视频字幕输出，依次产出视频信息、各条字幕和处理统计"""
+        # 基本信息
+        duration_seconds = len(audio) / 1000
+        sample_rate = audio.frame_rate
+        
+        # 视频基本信息
+        output_parts = []
+        output_parts.append("# Video Information")
+        output_parts.append(f"**Filename**: {os.path.basename(file_path)}")
+        output_parts.append(f"**Audio Duration**: {duration_seconds:.1f} seconds")
+        output_parts.append(f"**Sample Rate**: {sample_rate} Hz")
+        output_parts.append(f"**Segments**: {len(segments)}")
+        output_parts.append("")
+        
+        # 字幕内容
+        output_parts.append("# Subtitles")
+        yield ParseChunk(kind="header", index=0, text='\n'.join(output_parts))
+        
+        completed: List[str] = []
+        async for transcription in transcriptions:
+            i = len(completed)
+            segment = segments[i]
+            completed.append(transcription)
+            
+            # SRT格式的时间戳
+            start_str = self._format_srt_timestamp(segment.start_time)
+            end_str = self._format_srt_timestamp(segment.end_time)
+            
+            # 字幕条目（类似SRT格式）
+            output_parts = [f"{i+1}", f"{start_str} --> {end_str}"]
+            
+            # 转录文本（如果有效）
+            if transcription and transcription.strip() and not transcription.startswith('['):
+                output_parts.append(transcription.strip())
             else:
-                output_parts.append("**Average Segment Duration**: N/A (no valid segments)")
-            
-            # 格式化为视频代码块
-            content = '\n'.join(output_parts)
-            formatted_content = f"```video\n{content}\n```"
-            
-            return formatted_content
+                # 如果是低质量或失败的转录，添加质量标记
+                if segment.confidence < 0.5:
+                    output_parts.append(f"[Low Quality Audio] {transcription}")
+                else:
+                    output_parts.append("*[Inaudible]*")
             
-        except Exception as e:
-            logger.error(f"视频字幕格式化失败: {e}")
-            return f"```video\n# Video Subtitle Generation Failed\nError: {str(e)}\n```"
+            yield ParseChunk(kind="segment", index=i + 1, text='\n'.join(output_parts))
+        
+        # 处理统计
+        total_chars = sum(len(t) for t in completed if t and not t.startswith('['))
+        valid_segments = sum(1 for t in completed if t and not t.startswith('['))
+        
+        output_parts = []
+        output_parts.append("# Processing Statistics")
+        output_parts.append(f"**Valid Segments**: {valid_segments}/{len(segments)}")
+        output_parts.append(f"**Total Characters**: {total_chars}")
+        if len(segments) > 0:
+            output_parts.append(f"**Average Segment Duration**: {duration_seconds/len(segments):.1f} seconds")
+        else:
+            output_parts.append("**Average Segment Duration**: N/A (no valid segments)")
+        yield ParseChunk(kind="summary", index=0, text='\n'.join(output_parts))
     
     def _format_srt_timestamp(self, seconds: float) -> str:
         """格式化SRT时间戳为 HH:MM:SS,mmm 格式"""
@@ -1,5 +1,6 @@
-from abc import ABC, abstractmethod
-from typing import Union, List, Optional
+from abc import ABC
+from dataclasses import dataclass
+from typing import Union, List, Optional, Tuple, AsyncIterator, Dict, Any
 import os
 import tempfile
 import re
@@ -7,6 +8,124 @@ import aiofiles
 import aiofiles.os
 from loguru import logger
 
+from app.cache import build_cache_namespace
+from app.config import config
+
+
+class PageSelector:
+    """
+    页码选择器
+    
+    支持 "3"、"1-5"、"10-"（第10页到末尾）以及逗号分隔的组合，如 "1-3,8,12-"，页码从1开始。
+    """
+    
+    def __init__(self, spec: str):
+        self.ranges: List[Tuple[int, Optional[int]]] = []
+        for part in spec.replace(' ', '').split(','):
+            if not part:
+                continue
+            match = re.fullmatch(r'(\d+)(?:-(\d*))?', part)
+            if not match:
+                raise ValueError(f"无效的页码范围: {part}")
+            start = int(match.group(1))
+            if match.group(2) is None:
+                end: Optional[int] = start
+            else:
+                end = int(match.group(2)) if match.group(2) else None
+            if start < 1 or (end is not None and end < start):
+                raise ValueError(f"无效的页码范围: {part}")
+            self.ranges.append((start, end))
+        
+        if not self.ranges:
+            raise ValueError("页码范围不能为空")
+        self.ranges.sort()
+    
+    def __contains__(self, number: int) -> bool:
+        return any(start <= number and (end is None or number <= end) for start, end in self.ranges)
+    
+    @property
+    def last(self) -> Optional[int]:
+        """选中的最大页码，包含开放区间时为None"""
+        if any(end is None for _, end in self.ranges):
+            return None
+        return max(end for _, end in self.ranges)  # type: ignore
+    
+    def select(self, total: int) -> List[int]:
+        """返回 1..total 中被选中的页码"""
+        return [number for number in range(1, total + 1) if number in self]
+    
+    def __str__(self) -> str:
+        return ','.join(
+            str(start) if end == start else f"{start}-{end if end is not None else ''}"
+            for start, end in self.ranges
+        )
+
+
+@dataclass(frozen=True)
+class ParseOptions:
+    """
+    解析选项
+    
+    pages 用于 PDF/DOCX，slides 用于 PPTX（未指定时使用 pages），
+    sheets 用于 Excel（工作表名称或从1开始的序号，逗号分隔）。
+    """
+    pages: Optional[PageSelector] = None
+    slides: Optional[PageSelector] = None
+    sheets: Optional[Tuple[str, ...]] = None
+    
+    @classmethod
+    def from_request(cls, pages: Optional[str] = None, slides: Optional[str] = None,
+                     sheets: Optional[str] = None) -> "ParseOptions":
+        """
+        从请求参数构造解析选项
+        
+        Raises:
+            ValueError: 参数格式无效
+        """
+        sheet_names = None
+        if sheets and sheets.strip():
+            sheet_names = tuple(name.strip() for name in sheets.split(',') if name.strip())
+        return cls(
+            pages=PageSelector(pages) if pages and pages.strip() else None,
+            slides=PageSelector(slides) if slides and slides.strip() else None,
+            sheets=sheet_names or None
+        )
+    
+    @property
+    def is_default(self) -> bool:
+        """是否为默认选项（解析全部内容）"""
+        return self.pages is None and self.slides is None and self.sheets is None
+    
+    def cache_variant(self) -> str:
+        """缓存键中区分不同选择范围的部分，默认选项为空字符串"""
+        parts = []
+        if self.pages is not None:
+            parts.append(f"pages={self.pages}")
+        if self.slides is not None:
+            parts.append(f"slides={self.slides}")
+        if self.sheets is not None:
+            parts.append(f"sheets={','.join(self.sheets)}")
+        return ';'.join(parts)
+    
+    def select_sheet(self, sheet_name: str, sheet_index: int) -> bool:
+        """工作表是否被选中（sheet_index 从1开始）"""
+        if self.sheets is None:
+            return True
+        return sheet_name in self.sheets or str(sheet_index) in self.sheets
+
+
+@dataclass
+class ParseChunk:
+    """
+    流式解析产出的内容片段
+    
+    kind 为片段类型（如 page/slide/sheet/segment/document），index 为页码、幻灯片序号等（从1开始，整篇文档为0）。
+    """
+    kind: str
+    index: int
+    text: str
+
+
 class BaseParser(ABC):
     """
     文档解析器基类
@@ -14,14 +133,37 @@ class BaseParser(ABC):
     提供异步文件操作和临时文件管理功能
     """
     
-    def __init__(self):
+    # 流式输出时片段外层的代码块类型，None 表示片段本身即为完整内容
+    block_type: Optional[str] = None
+    # 没有提取到任何内容时的占位文本
+    empty_content: str = ""
+    # 片段之间的分隔符
+    chunk_separator: str = "\n\n"
+    # 输出格式版本，解析结果格式变化时递增，旧版本的缓存结果不再命中
+    parser_version: int = 1
+    # 影响解析结果的配置项（config 属性名），参与缓存命名空间
+    cache_config_keys: Tuple[str, ...] = ()
+    # 结果中是否包含图片OCR/视觉识别内容（识别引擎、模型、提示词变化时缓存失效）
+    uses_image_analysis: bool = False
+    # 升级前的缓存（按文件MD5存储，不区分接口）能否视为本解析器的结果
+    legacy_cache_compatible: bool = True
+    
+    def __init__(self, options: Optional[ParseOptions] = None):
         self.temp_files: List[str] = []
+        self.options = options or ParseOptions()
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # parse 与 iter_parse 的默认实现互相调用，具体解析器必须至少实现其中一个
+        if cls.parse is BaseParser.parse and cls.iter_parse is BaseParser.iter_parse:
+            raise TypeError(f"{cls.__name__} 必须实现 parse 或 iter_parse")
     
-    @abstractmethod
     async def parse(self, file_path: str) -> str:
         """
         解析文档并返回Markdown文本
         
+        默认实现拼接 iter_parse 产出的全部片段，只支持整篇输出的解析器直接覆盖此方法。
+        
         Args:
             file_path: 文档文件路径
             
@@ -33,7 +175,59 @@ class BaseParser(ABC):
             PermissionError: 文件权限不足
             Exception: 解析过程中的其他错误
         """
-        pass
+        chunks = [chunk async for chunk in self.iter_parse(file_path)]
+        return self.assemble(chunks)
+    
+    async def iter_parse(self, file_path: str) -> AsyncIterator[ParseChunk]:
+        """
+        流式解析文档，按页/幻灯片/片段顺序产出内容
+        
+        默认实现在 parse 完成后一次性产出整篇内容，支持增量输出的解析器覆盖此方法，
+        片段的拼接格式由 block_type、empty_content 和 chunk_separator 决定。
+        
+        Args:
+            file_path: 文档文件路径
+            
+        Yields:
+            内容片段
+        """
+        yield ParseChunk(kind="document", index=0, text=await self.parse(file_path))
+    
+    def assemble(self, chunks: List[ParseChunk]) -> str:
+        """
+        将流式片段拼接为与 parse 相同格式的Markdown文本
+        
+        Args:
+            chunks: iter_parse 产出的片段
+            
+        Returns:
+            Markdown格式的文本内容
+        """
+        raw_content = self.chunk_separator.join(chunk.text for chunk in chunks)
+        if self.block_type is None:
+            return raw_content
+        return f"```{self.block_type}\n{raw_content or self.empty_content}\n```"
+    
+    @classmethod
+    def cache_settings(cls) -> Dict[str, Any]:
+        """
+        影响解析结果的设置
+        
+        默认包含 cache_config_keys 中的配置项，以及图片识别的引擎/模型标识；
+        依赖其他设置的解析器可扩展此方法。
+        """
+        settings: Dict[str, Any] = {key: getattr(config, key) for key in cls.cache_config_keys}
+        if cls.uses_image_analysis:
+            from app.vision import DOCUMENT_IMAGE_PROMPT, ocr_cache_identity, vision_cache_identity
+            settings['ocr'] = ocr_cache_identity()
+            settings['vision'] = vision_cache_identity(DOCUMENT_IMAGE_PROMPT)
+            settings['phash'] = config.IMAGE_PHASH_MAX_DISTANCE if config.IMAGE_PHASH_ENABLED else None
+        return settings
+    
+    @classmethod
+    def cache_namespace(cls) -> str:
+        """解析结果的缓存命名空间，解析器版本或相关设置变化时随之变化"""
+        return build_cache_namespace(cls.__name__, cls.parser_version, cls.cache_settings())
     
     @classmethod
     def get_supported_extensions(cls) -> List[str]:
@@ -8,6 +8,8 @@ from app.config import config
 class CodeParser(BaseParser):
     """代码文件解析器"""
     
+    cache_config_keys = ("MAX_TEXT_LINES", "MAX_TEXT_CHARS")
+    
     # 文件扩展名到语言类型的映射
     EXTENSION_TO_LANGUAGE = {
         '.py': 'python',
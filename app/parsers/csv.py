@@ -1,18 +1,21 @@
-from .base import BaseParser
+from .base import BaseParser, ParseChunk
 from loguru import logger
 import pandas as pd
 from tabulate import tabulate
 import chardet
+from typing import AsyncIterator
 
 class CsvParser(BaseParser):
     """CSV文件解析器"""
     
+    block_type = "sheet"
+    
     @classmethod
     def get_supported_extensions(cls) -> list[str]:
         return ['.csv']
     
-    async def parse(self, file_path: str) -> str:
-        """解析CSV文件"""
+    async def iter_parse(self, file_path: str) -> AsyncIterator[ParseChunk]:
+        """解析CSV文件，依次产出基本信息、数据内容和列统计"""
         try:
             # 检测文件编码
             with open(file_path, 'rb') as f:
@@ -25,15 +28,15 @@ class CsvParser(BaseParser):
             # 处理NaN值
             df = df.fillna('')
             
-            content_parts = []
-            
             # 添加基本信息
-            content_parts.append(f"# CSV数据文件")
-            content_parts.append(f"**数据行数**: {len(df)}")
-            content_parts.append(f"**数据列数**: {len(df.columns)}")
+            yield ParseChunk(kind="section", index=1, text='\n\n'.join([
+                "# CSV数据文件",
+                f"**数据行数**: {len(df)}",
+                f"**数据列数**: {len(df.columns)}"
+            ]))
             
             # 转换为HTML表格
-            content_parts.append("## 数据内容")
+            content_parts = ["## 数据内容"]
             
             # 如果数据太多，只显示前100行
             display_df = df.head(100) if len(df) > 100 else df
@@ -43,10 +46,13 @@ class CsvParser(BaseParser):
             if len(df) > 100:
                 content_parts.append(f"*注意: 为了便于阅读，此处仅显示前100行数据，实际文件包含{len(df)}行数据*")
             
+            # 处理换行符
+            yield ParseChunk(kind="section", index=2, text='\n\n'.join(content_parts).replace('\\n', '\n'))
+            
             # 添加数据统计
             numeric_cols = df.select_dtypes(include=['number']).columns
             if len(numeric_cols) > 0:
-                content_parts.append("## 数值列统计")
+                content_parts = ["## 数值列统计"]
                 stats_data = []
                 for col in numeric_cols:
                     stats_data.append([
@@ -61,11 +67,12 @@ class CsvParser(BaseParser):
                 stats_df = pd.DataFrame(stats_data, columns=pd.Index(['列名', '计数', '平均值', '标准差', '最小值', '最大值']))
                 stats_table = tabulate(stats_df, headers='keys', tablefmt='html', showindex=False)
                 content_parts.append(stats_table)
+                yield ParseChunk(kind="section", index=3, text='\n\n'.join(content_parts).replace('\\n', '\n'))
             
             # 添加文本列信息
             text_cols = df.select_dtypes(include=['object']).columns
             if len(text_cols) > 0:
-                content_parts.append("## 文本列信息")
+                content_parts = ["## 文本列信息"]
                 text_info = []
                 for col in text_cols:
                     unique_count = df[col].nunique()
@@ -75,17 +82,9 @@ class CsvParser(BaseParser):
                 text_df = pd.DataFrame(text_info, columns=pd.Index(['列名', '唯一值数量', '最常见值']))
                 text_table = tabulate(text_df, headers='keys', tablefmt='html', showindex=False)
                 content_parts.append(text_table)
-            
-            raw_content = '\n\n'.join(content_parts)
-            
-            # 处理换行符
-            raw_content = raw_content.replace('\\n', '\n')
-            
-            # 格式化为统一的代码块格式
-            markdown_content = f"```sheet\n{raw_content}\n```"
+                yield ParseChunk(kind="section", index=4, text='\n\n'.join(content_parts).replace('\\n', '\n'))
             
             logger.info(f"成功解析CSV文件: {file_path}")
-            return markdown_content
             
         except Exception as e:
             logger.error(f"解析CSV文件失败 {file_path}: {e}")
@@ -5,14 +5,13 @@ import docx2txt
 import subprocess
 from markdownify import markdownify
 import os
-import base64
-import asyncio
-from app.vision import get_ocr_text, vision_client
-from app.config import config
+from app.vision import analyze_image
 
 class DocParser(BaseParser):
     """DOC文件解析器"""
     
+    uses_image_analysis = True
+    
     @classmethod
     def get_supported_extensions(cls) -> list[str]:
         return ['.doc']
@@ -23,12 +22,10 @@ class DocParser(BaseParser):
             return img_name, f'<img src="{img_name}" alt="图片提取失败，已跳过" />'
         
         try:
-            # 并发执行OCR和视觉识别，添加异常保护
+            # 并发执行OCR和视觉识别（优先使用图片缓存），添加异常保护
             try:
-                ocr_task = get_ocr_text(temp_path)
-                vision_task = self._get_vision_description(temp_path)
-                
-                ocr_text, vision_description = await asyncio.gather(ocr_task, vision_task)
+                image_data = await self.read_file_async(temp_path, mode='rb')
+                ocr_text, vision_description = await analyze_image(image_data)  # type: ignore
             except Exception as ocr_vision_error:
                 logger.warning(f"OCR/视觉识别失败，跳过处理 图片{img_idx}: {ocr_vision_error}")
                 ocr_text = "OCR处理失败"
@@ -46,42 +43,6 @@ class DocParser(BaseParser):
             html_img_tag = f'<img src="{img_name}" alt="图片处理失败，已跳过" />'
             return img_name, html_img_tag
     
-    async def _get_vision_description(self, temp_img_path: str) -> str:
-        """获取视觉模型描述"""
-        if not vision_client:
-            return "视觉模型未配置"
-        
-        try:
-            # 读取图片并转换为base64
-            with open(temp_img_path, "rb") as image_file:
-                base64_image = base64.b64encode(image_file.read()).decode('utf-8')
-            
-            response = vision_client.chat.completions.create(
-                model=os.getenv("VISION_MODEL", "gpt-4o-mini"),
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/png;base64,{base64_image}"
-                                }
-                            },
-                            {
-                                "type": "text", 
-                                "text": "Please provide a detailed description of this image, including: 1. Overall accurate description of the image; 2. Main elements and structure of the image; 3. If there are tables, charts, etc., please describe their content and layout in detail."
-                            }
-                        ]
-                    }
-                ],
-                max_tokens=1000
-            )
-            return response.choices[0].message.content or "视觉模型识别失败"
-        except Exception as e:
-            logger.warning(f"Vision API调用失败: {e}")
-            return "视觉模型识别失败"
-
     async def parse(self, file_path: str) -> str:
         """解析DOC文件"""
         try:
@@ -1,98 +1,120 @@
 from .base import BaseParser
 from loguru import logger
 import docx
+from docx.oxml.ns import qn
 from markdownify import markdownify
+from typing import List, Optional, Set, Tuple
 import os
 from PIL import Image
-from app.vision import image_to_markdown, get_ocr_text, vision_client
-import base64
-import asyncio
+from app.vision import analyze_images
 from app.config import config
 
 class DocxParser(BaseParser):
     """DOCX文件解析器"""
     
+    uses_image_analysis = True
+    cache_config_keys = ("MAX_IMAGES_PER_DOC",)
+    
     @classmethod
     def get_supported_extensions(cls) -> list[str]:
         return ['.docx']
     
-    async def _process_image_concurrent(self, image_data: bytes, img_name: str, image_counter: int):
-        """并发处理单个图片的OCR和视觉识别"""
-        try:
-            # 创建临时图片文件
-            temp_img_path = self.create_temp_file(suffix='.png')
-            
-            # 保存图片
-            with open(temp_img_path, 'wb') as img_file:
-                img_file.write(image_data)
-            
-            # 并发执行OCR和视觉识别，添加异常保护
-            try:
-                ocr_task = get_ocr_text(temp_img_path)
-                vision_task = self._get_vision_description(temp_img_path)
-                
-                ocr_text, vision_description = await asyncio.gather(ocr_task, vision_task)
-            except Exception as ocr_vision_error:
-                logger.warning(f"OCR/视觉识别失败，跳过处理 图片{image_counter}: {ocr_vision_error}")
-                ocr_text = "OCR处理失败"
-                vision_description = "视觉识别失败"
+    def _format_image_part(self, img_name: str, image_counter: int, ocr_text: str, vision_description: str) -> str:
+        """根据OCR和视觉识别结果生成单个图片的内容"""
+        # 生成HTML标签格式
+        alt_text = f"# OCR: {ocr_text} # Visual_Features: {vision_description}"
+        html_img_tag = f'<img src="{img_name}" alt="{alt_text}" />'
+        
+        logger.info(f"成功处理DOCX图片 {image_counter}: {img_name}")
+        return f"### 图片 {image_counter}\n\n{html_img_tag}"
+    
+    def _assign_pages(self, doc) -> Tuple[List[int], List[int]]:
+        """
+        估算正文中每个段落和表格所在的页码
+        
+        DOCX 本身没有固定分页，优先使用 Word 保存时写入的渲染分页标记（lastRenderedPageBreak），
+        文档中没有该标记时按显式分页符、段前分页和分节符计算。
+        Word 把渲染分页标记写在新页面第一个文字所在的位置，出现在段落（表格）文字之前的标记
+        表示该段落从新页面开始，之后的标记只影响后续内容。
+        
+        Returns:
+            (段落页码列表, 表格页码列表)，分别与 doc.paragraphs、doc.tables 顺序一致
+        """
+        body = doc.element.body
+        rendered = next(body.iter(qn('w:lastRenderedPageBreak')), None) is not None
+        
+        paragraph_pages: List[int] = []
+        table_pages: List[int] = []
+        page = 1
+        for element in body.iterchildren():
+            if element.tag not in (qn('w:p'), qn('w:tbl')):
+                continue
             
-            # 生成HTML标签格式
-            alt_text = f"# OCR: {ocr_text} # Visual_Features: {vision_description}"
-            html_img_tag = f'<img src="{img_name}" alt="{alt_text}" />'
+            trailing_breaks = 0
+            if rendered:
+                leading_breaks, trailing_breaks = self._rendered_breaks(element)
+                page += leading_breaks
+            elif element.tag == qn('w:p') and element.find(f"{qn('w:pPr')}/{qn('w:pageBreakBefore')}") is not None:
+                page += 1
             
-            logger.info(f"成功处理DOCX图片 {image_counter}: {img_name}")
-            return f"### 图片 {image_counter}\n\n{html_img_tag}"
+            if element.tag == qn('w:p'):
+                paragraph_pages.append(page)
+            else:
+                table_pages.append(page)
             
-        except Exception as e:
-            logger.warning(f"DOCX图片提取失败，跳过该图片 图片{image_counter}: {e}")
-            return f"### 图片 {image_counter}\n\n*图片提取失败，已跳过*"
-    
-    async def _get_vision_description(self, temp_img_path: str) -> str:
-        """获取视觉模型描述"""
-        if not vision_client:
-            return "视觉模型未配置"
+            if rendered:
+                page += trailing_breaks
+            else:
+                page += sum(1 for br in element.iter(qn('w:br')) if br.get(qn('w:type')) == 'page')
+                if element.find(f"{qn('w:pPr')}/{qn('w:sectPr')}") is not None:
+                    page += 1
         
-        try:
-            # 读取图片并转换为base64
-            with open(temp_img_path, "rb") as image_file:
-                base64_image = base64.b64encode(image_file.read()).decode('utf-8')
-            
-            response = vision_client.chat.completions.create(
-                model=os.getenv("VISION_MODEL", "gpt-4o-mini"),
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/png;base64,{base64_image}"
-                                }
-                            },
-                            {
-                                "type": "text", 
-                                "text": "Please provide a detailed description of this image, including: 1. Overall accurate description of the image; 2. Main elements and structure of the image; 3. If there are tables, charts, etc., please describe their content and layout in detail."
-                            }
-                        ]
-                    }
-                ],
-                max_tokens=1000
-            )
-            return response.choices[0].message.content or "视觉模型识别失败"
-        except Exception as e:
-            logger.warning(f"Vision API调用失败: {e}")
-            return "视觉模型识别失败"
-
+        return paragraph_pages, table_pages
+    
+    @staticmethod
+    def _rendered_breaks(element) -> Tuple[int, int]:
+        """统计元素中位于第一个文字之前和之后的渲染分页标记数量"""
+        leading = trailing = 0
+        seen_text = False
+        for node in element.iter(qn('w:lastRenderedPageBreak'), qn('w:t')):
+            if node.tag == qn('w:t'):
+                seen_text = seen_text or bool(node.text)
+            elif seen_text:
+                trailing += 1
+            else:
+                leading += 1
+        return leading, trailing
+    
+    def _image_rel_ids(self, elements) -> Set[str]:
+        """收集元素中引用的图片关系ID"""
+        rel_ids = set()
+        for element in elements:
+            for blip in element.iter(qn('a:blip')):
+                rel_id = blip.get(qn('r:embed'))
+                if rel_id:
+                    rel_ids.add(rel_id)
+        return rel_ids
+    
     async def parse(self, file_path: str) -> str:
         """解析DOCX文件"""
         try:
             doc = docx.Document(file_path)
             
+            paragraphs = list(doc.paragraphs)
+            tables = list(doc.tables)
+            # 指定了页码范围时只保留选中页面上的段落、表格和图片
+            selected_rel_ids: Optional[Set[str]] = None
+            if self.options.pages is not None:
+                paragraph_pages, table_pages = self._assign_pages(doc)
+                paragraphs = [p for p, page in zip(paragraphs, paragraph_pages) if page in self.options.pages]
+                tables = [t for t, page in zip(tables, table_pages) if page in self.options.pages]
+                selected_rel_ids = self._image_rel_ids([p._p for p in paragraphs] + [t._tbl for t in tables])
+                logger.info(f"DOCX按页码范围 {self.options.pages} 选中 {len(paragraphs)} 个段落, {len(tables)} 个表格")
+            
             # 提取所有段落文本
             content_parts = []
             
-            for paragraph in doc.paragraphs:
+            for paragraph in paragraphs:
                 if paragraph.text.strip():
                     # 处理不同的段落样式
                     text = paragraph.text.strip()
@@ -105,12 +127,15 @@ class DocxParser(BaseParser):
                     content_parts.append(text)
             
             # 处理表格
-            for table in doc.tables:
+            for table in tables:
                 content_parts.append(self._parse_table(table))
             
             # 获取图片数量，添加保护机制
             rels = doc.part.rels
-            image_count = sum(1 for rel in rels.values() if "image" in rel.target_ref)
+            image_count = sum(
+                1 for rel_id, rel in rels.items()
+                if "image" in rel.target_ref and (selected_rel_ids is None or rel_id in selected_rel_ids)
+            )
             
             # 图片数量保护机制
             max_imgs = config.MAX_IMAGES_PER_DOC
@@ -121,7 +146,7 @@ class DocxParser(BaseParser):
                     content_parts.append(f"*因图片数量超过{max_imgs}张限制，已跳过所有图片处理*")
             else:
                 # 提取并处理图片
-                image_parts = await self._extract_images(doc, file_path)
+                image_parts = await self._extract_images(doc, file_path, selected_rel_ids)
                 content_parts.extend(image_parts)
             
             raw_content = '\n\n'.join(content_parts)
@@ -163,8 +188,15 @@ class DocxParser(BaseParser):
             logger.warning(f"表格解析失败: {e}")
             return "[表格解析失败]"
     
-    async def _extract_images(self, doc, file_path: str) -> list[str]:
-        """提取DOCX文档中的图片并进行OCR+视觉识别"""
+    async def _extract_images(self, doc, file_path: str, selected_rel_ids: Optional[Set[str]] = None) -> list[str]:
+        """
+        提取DOCX文档中的图片并进行OCR+视觉识别
+        
+        Args:
+            doc: DOCX文档对象
+            file_path: 文件路径
+            selected_rel_ids: 只处理这些关系ID对应的图片，None表示处理全部图片
+        """
         try:
             # 获取文档的关系部分来访问图片
             rels = doc.part.rels
@@ -177,6 +209,9 @@ class DocxParser(BaseParser):
             for rel_id, rel in rels.items():
                 if "image" in rel.target_ref:
                     image_counter += 1
+                    # 图片编号按整篇文档计算，页码范围外的图片跳过但保留编号
+                    if selected_rel_ids is not None and rel_id not in selected_rel_ids:
+                        continue
                     try:
                         # 获取图片数据
                         image_data = rel.target_part.blob
@@ -196,45 +231,33 @@ class DocxParser(BaseParser):
                             'counter': image_counter
                         })
             
-            # 并发处理所有图片
+            # 批量处理所有图片（OCR合并推理，视觉识别并发执行）
             if image_data_list:
-                image_tasks = []
+                valid_images = [img_info for img_info in image_data_list if img_info['data'] is not None]
+                try:
+                    analysis_results = await analyze_images([img_info['data'] for img_info in valid_images])
+                except Exception as ocr_vision_error:
+                    logger.warning(f"OCR/视觉识别失败，跳过处理所有图片: {ocr_vision_error}")
+                    analysis_results = [("OCR处理失败", "视觉识别失败")] * len(valid_images)
+                analysis_map = {
+                    img_info['counter']: result for img_info, result in zip(valid_images, analysis_results)
+                }
+                
+                final_image_parts = []
                 for img_info in image_data_list:
-                    if img_info['data'] is not None:
-                        task = self._process_image_concurrent(
-                            img_info['data'], 
-                            img_info['name'], 
-                            img_info['counter']
-                        )
-                    else:
+                    if img_info['counter'] not in analysis_map:
                         # 图片提取失败的情况
-                        async def create_error_result(counter):
-                            return f"### 图片 {counter}\n\n*图片提取失败，已跳过*"
-                        task = create_error_result(img_info['counter'])
-                    
-                    image_tasks.append(task)
+                        final_image_parts.append(f"### 图片 {img_info['counter']}\n\n*图片提取失败，已跳过*")
+                        continue
+                    ocr_text, vision_description = analysis_map[img_info['counter']]
+                    final_image_parts.append(self._format_image_part(
+                        img_info['name'], img_info['counter'], ocr_text, vision_description
+                    ))
                 
-                try:
-                    image_parts = await asyncio.gather(*image_tasks, return_exceptions=True)
-                    
-                    # 处理结果
-                    final_image_parts = []
-                    for i, result in enumerate(image_parts):
-                        if isinstance(result, Exception):
-                            logger.error(f"DOCX图片并发处理异常，跳过该图片 图片{i+1}: {result}")
-                            final_image_parts.append(f"### 图片 {i+1}\n\n*图片处理异常，已跳过*")
-                        else:
-                            final_image_parts.append(result)
-                    
-                    if image_counter > 0:
-                        logger.info(f"DOCX文档中共提取到 {image_counter} 张图片")
-                    
-                    return final_image_parts
-                    
-                except Exception as e:
-                    logger.error(f"DOCX图片并发处理失败，跳过所有图片: {e}")
-                    # 回退处理
-                    return [f"### 图片 {i+1}\n\n*图片处理失败，已跳过*" for i in range(len(image_data_list))]
+                if image_counter > 0:
+                    logger.info(f"DOCX文档中共提取到 {image_counter} 张图片")
+                
+                return final_image_parts
             
             return []
             
@@ -1,200 +1,422 @@
-from .base import BaseParser
+from .base import BaseParser, ParseChunk
 from loguru import logger
 import pandas as pd
 from tabulate import tabulate
 import openpyxl
 from openpyxl.drawing.image import Image as OpenpyxlImage
 import os
-import base64
+import re
 import asyncio
-from app.vision import get_ocr_text, vision_client
+import json
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from app.vision import analyze_images
+from app.cache import cache_manager
 from app.config import config
 
+_NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_NS_DOC_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_NS_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+# 单元格元素（不匹配自闭合的空单元格），共享字符串类型的单元格值为字符串表中的序号
+_CELL_PATTERN = re.compile(rb'<(?:\w+:)?c\b([^>]*?)(?<!/)>(.*?)</(?:\w+:)?c>', re.S)
+_VALUE_PATTERN = re.compile(rb'<(?:\w+:)?v>(\d+)</(?:\w+:)?v>')
+_SHARED_TYPE_PATTERN = re.compile(rb'\bt="s"')
+# 识别失败时的占位文本，含有这些结果的工作表图片不写入分片缓存
+_FAILED_ANALYSIS = ("OCR处理失败", "视觉识别失败", "视觉模型识别失败")
+
+
+def _part_rels(zf: zipfile.ZipFile, part: str) -> Dict[str, str]:
+    """读取部件的关系文件，返回 {关系ID: 目标部件路径}（忽略外部链接）"""
+    rels_path = posixpath.join(posixpath.dirname(part), '_rels', posixpath.basename(part) + '.rels')
+    try:
+        root = ET.fromstring(zf.read(rels_path))
+    except KeyError:
+        return {}
+    targets = {}
+    for rel in root.iter(f'{{{_NS_PKG_REL}}}Relationship'):
+        target = rel.get('Target', '')
+        if rel.get('TargetMode') == 'External' or not target:
+            continue
+        if target.startswith('/'):
+            targets[rel.get('Id', '')] = target.lstrip('/')
+        else:
+            targets[rel.get('Id', '')] = posixpath.normpath(posixpath.join(posixpath.dirname(part), target))
+    return targets
+
+
+def _shared_string_refs(sheet_xml: bytes) -> List[int]:
+    """按出现顺序返回工作表引用的共享字符串序号"""
+    refs = []
+    for attrs, body in _CELL_PATTERN.findall(sheet_xml):
+        if _SHARED_TYPE_PATTERN.search(attrs):
+            value = _VALUE_PATTERN.search(body)
+            if value:
+                refs.append(int(value.group(1)))
+    return refs
+
+
+def _xlsx_sheet_hashes(file_path: str) -> List[Tuple[str, str]]:
+    """
+    按XLSX压缩包中的原始部件计算各工作表的内容哈希，无需读取单元格数据
+    
+    哈希覆盖工作表名称、工作表XML、其引用的共享字符串、样式表与日期系统（决定数值和日期的读取结果），
+    以及工作表关联的绘图、图片等部件（两层关系）。共享字符串只计入本表引用的条目，
+    其他工作表新增文字导致序号整体变化时本表哈希随之变化（按未命中处理），不会误命中。
+    
+    Returns:
+        按工作簿顺序的 (工作表名称, 十六进制哈希) 列表，找不到工作表部件时哈希为空字符串；
+        无法解析时返回空列表（不使用分片缓存）
+    """
+    try:
+        with zipfile.ZipFile(file_path) as zf:
+            workbook_part = 'xl/workbook.xml'
+            workbook = ET.fromstring(zf.read(workbook_part))
+            workbook_rels = _part_rels(zf, workbook_part)
+            properties = workbook.find(f'{{{_NS_MAIN}}}workbookPr')
+            date1904 = properties is not None and properties.get('date1904') in ('1', 'true')
+            names = set(zf.namelist())
+            styles = zf.read('xl/styles.xml') if 'xl/styles.xml' in names else b''
+            
+            shared_strings: List[bytes] = []
+            if 'xl/sharedStrings.xml' in names:
+                with zf.open('xl/sharedStrings.xml') as stream:
+                    for _, element in ET.iterparse(stream):
+                        if element.tag == f'{{{_NS_MAIN}}}si':
+                            shared_strings.append(ET.tostring(element))
+                            element.clear()
+            
+            hashes = []
+            for sheet in workbook.iter(f'{{{_NS_MAIN}}}sheet'):
+                name = sheet.get('name', '')
+                part = workbook_rels.get(sheet.get(f'{{{_NS_DOC_REL}}}id', ''))
+                if not part or part not in names:
+                    hashes.append((name, ""))
+                    continue
+                sheet_xml = zf.read(part)
+                hasher = cache_manager.new_unit_hasher()
+                hasher.update(json.dumps([name, date1904], ensure_ascii=False).encode('utf-8'))
+                hasher.update(styles)
+                hasher.update(sheet_xml)
+                for index in _shared_string_refs(sheet_xml):
+                    text = shared_strings[index] if index < len(shared_strings) else b''
+                    hasher.update(len(text).to_bytes(4, 'big') + text)
+                
+                # 绘图、批注等关联部件及其引用的图片
+                pending = list(_part_rels(zf, part).values())
+                seen = set()
+                for depth in range(2):
+                    next_pending = []
+                    for related in sorted(pending):
+                        if related in seen or related not in names:
+                            continue
+                        seen.add(related)
+                        hasher.update(related.encode('utf-8'))
+                        hasher.update(zf.read(related))
+                        if depth == 0:
+                            next_pending.extend(_part_rels(zf, related).values())
+                    pending = next_pending
+                hashes.append((name, hasher.hexdigest()))
+            return hashes
+    except Exception as e:
+        logger.debug(f"计算工作表内容哈希失败 {file_path}: {e}")
+        return []
+
 class ExcelParser(BaseParser):
     """Excel文件解析器"""
     
+    block_type = "sheet"
+    empty_content = "Excel文件为空或无法提取内容"
+    uses_image_analysis = True
+    cache_config_keys = ("MAX_IMAGES_PER_DOC",)
+    
     @classmethod
     def get_supported_extensions(cls) -> list[str]:
         return ['.xls', '.xlsx']
     
-    async def _process_image_concurrent(self, image_data: bytes, img_name: str, sheet_name: str, sheet_image_counter: int):
-        """并发处理单个图片的OCR和视觉识别"""
-        try:
-            # 创建临时图片文件
-            temp_img_path = self.create_temp_file(suffix='.png')
-            
-            # 保存图片数据
-            with open(temp_img_path, 'wb') as img_file:
-                img_file.write(image_data)
+    def _format_image_part(self, img_name: str, sheet_name: str, sheet_image_counter: int,
+                           ocr_text: str, vision_description: str) -> str:
+        """根据OCR和视觉识别结果生成单个图片的内容"""
+        # 生成HTML标签格式
+        alt_text = f"# OCR: {ocr_text} # Visual_Features: {vision_description}"
+        html_img_tag = f'<img src="{img_name}" alt="{alt_text}" />'
+        
+        logger.info(f"成功处理Excel图片 {sheet_name} 图片{sheet_image_counter}: {img_name}")
+        return f"### 工作表 {sheet_name} - 图片 {sheet_image_counter}\n\n{html_img_tag}"
+    
+    def _format_chunk(self, kind: str, index: int, parts: list[str]) -> ParseChunk:
+        """拼接一个片段的内容，处理换行符并将代码块转换为HTML标签"""
+        text = '\n\n'.join(parts).replace('\\n', '\n')
+        return ParseChunk(kind=kind, index=index, text=self.convert_code_blocks_to_html(text))
+    
+    def _build_sheet_chunk(self, sheet_idx: int, sheet_name: str, df: pd.DataFrame) -> ParseChunk:
+        """生成单个工作表的内容（HTML表格与数值列统计）"""
+        sheet_parts = []
+        
+        # 添加工作表标题
+        sheet_parts.append(f"## 工作表: {sheet_name}")
+        
+        # 转换为HTML表格
+        html_table = tabulate(df, headers='keys', tablefmt='html', showindex=False)
+        sheet_parts.append(html_table)
+        
+        # 添加基本统计信息
+        numeric_cols = df.select_dtypes(include=['number']).columns
+        if len(numeric_cols) > 0:
+            sheet_parts.append("### 数据统计")
+            stats_data = []
+            for col in numeric_cols:
+                stats_data.append([
+                    col,
+                    f"{df[col].count()}",
+                    f"{df[col].mean():.2f}" if df[col].count() > 0 else "N/A",
+                    f"{df[col].min():.2f}" if df[col].count() > 0 else "N/A",
+                    f"{df[col].max():.2f}" if df[col].count() > 0 else "N/A"
+                ])
             
-            # 并发执行OCR和视觉识别，添加异常保护
+            stats_df = pd.DataFrame(stats_data, columns=pd.Index(['列名', '计数', '平均值', '最小值', '最大值']))
+            stats_table = tabulate(stats_df, headers='keys', tablefmt='html', showindex=False)
+            sheet_parts.append(stats_table)
+        
+        return self._format_chunk("sheet", sheet_idx, sheet_parts)
+    
+    async def _load_sheet_records(self, file_path: str) -> Tuple[List[Tuple[int, str, str]], Dict[str, dict]]:
+        """
+        计算选中工作表的内容哈希并一次批量查询分片缓存
+        
+        缓存记录为 {"text": 工作表内容, "image_count": 图片数量, "images": [[OCR文本, 视觉描述], ...]}，
+        图片数量未知时 image_count 为None，图片未识别或识别失败时 images 为None。
+        
+        Returns:
+            ([(工作表序号, 工作表名称, 内容哈希)], {内容哈希: 缓存记录})，不使用分片缓存时均为空
+        """
+        if not file_path.lower().endswith('.xlsx') or not cache_manager.unit_cache_enabled:
+            return [], {}
+        
+        sheet_hashes = await asyncio.to_thread(_xlsx_sheet_hashes, file_path)
+        selected = [
+            (sheet_idx, sheet_name, content_hash)
+            for sheet_idx, (sheet_name, content_hash) in enumerate(sheet_hashes, 1)
+            if self.options.select_sheet(sheet_name, sheet_idx)
+        ]
+        cached = await cache_manager.get_unit_results(
+            self.cache_namespace(), "sheet", [content_hash for _, _, content_hash in selected if content_hash]
+        )
+        records = {}
+        for content_hash, value in cached.items():
             try:
-                ocr_task = get_ocr_text(temp_img_path)
-                vision_task = self._get_vision_description(temp_img_path)
-                
-                ocr_text, vision_description = await asyncio.gather(ocr_task, vision_task)
-            except Exception as ocr_vision_error:
-                logger.warning(f"OCR/视觉识别失败，跳过处理 {sheet_name} 图片{sheet_image_counter}: {ocr_vision_error}")
-                ocr_text = "OCR处理失败"
-                vision_description = "视觉识别失败"
-            
-            # 生成HTML标签格式
-            alt_text = f"# OCR: {ocr_text} # Visual_Features: {vision_description}"
-            html_img_tag = f'<img src="{img_name}" alt="{alt_text}" />'
-            
-            logger.info(f"成功处理Excel图片 {sheet_name} 图片{sheet_image_counter}: {img_name}")
-            return f"### 工作表 {sheet_name} - 图片 {sheet_image_counter}\n\n{html_img_tag}"
-            
-        except Exception as e:
-            logger.warning(f"Excel图片处理失败，跳过该图片 {sheet_name} 图片{sheet_image_counter}: {e}")
-            return f"### 工作表 {sheet_name} - 图片 {sheet_image_counter}\n\n*图片处理失败，已跳过*"
+                record = json.loads(value)
+            except ValueError:
+                record = None
+            if isinstance(record, dict) and isinstance(record.get("text"), str):
+                records[content_hash] = record
+            else:
+                logger.debug(f"工作表分片缓存无法解析，按未命中处理: {content_hash[:8]}...")
+        return selected, records
+    
+    async def _cache_sheet_records(self, sheets: Dict[str, Tuple[str, str]],
+                                   image_counts: Optional[Dict[str, int]], analyses: Dict[str, list]) -> None:
+        """
+        写入工作表分片缓存
+        
+        Args:
+            sheets: {内容哈希: (工作表名称, 工作表内容)}
+            image_counts: _process_images 返回的各工作表图片数量，未处理图片时为None
+            analyses: _process_images 返回的各工作表图片识别结果
+        """
+        records = {}
+        for content_hash, (sheet_name, text) in sheets.items():
+            image_count = image_counts.get(sheet_name, 0) if image_counts is not None else None
+            records[content_hash] = json.dumps({
+                "text": text,
+                "image_count": image_count,
+                "images": [] if image_count == 0 else analyses.get(sheet_name)
+            }, ensure_ascii=False)
+        await cache_manager.cache_unit_results(self.cache_namespace(), "sheet", records)
+    
+    def _image_limit_parts(self, total_image_count: int) -> list[str]:
+        """图片数量超过 MAX_IMAGES_PER_DOC 时的提示内容"""
+        max_imgs = config.MAX_IMAGES_PER_DOC
+        logger.warning(f"Excel文档包含 {total_image_count} 张图片，超过{max_imgs}张限制，跳过所有图片处理")
+        return [
+            f"### 文档包含 {total_image_count} 张图片",
+            f"*因图片数量超过{max_imgs}张限制，已跳过所有图片处理*"
+        ]
+    
+    def _over_image_limit(self, total_image_count: int) -> bool:
+        """图片数量是否超过 MAX_IMAGES_PER_DOC（-1 表示不限制）"""
+        max_imgs = config.MAX_IMAGES_PER_DOC
+        return max_imgs != -1 and total_image_count > max_imgs
     
-    async def _get_vision_description(self, temp_img_path: str) -> str:
-        """获取视觉模型描述"""
-        if not vision_client:
-            return "视觉模型未配置"
+    def _cached_image_parts(self, file_path: str, sheets: List[Tuple[str, dict]]) -> Optional[list[str]]:
+        """
+        由缓存记录生成图片内容
         
+        Returns:
+            图片内容列表，任一工作表的图片数量或识别结果不在缓存中时返回None（需要重新提取）
+        """
+        if any(record.get("image_count") is None for _, record in sheets):
+            return None
+        total_image_count = sum(record["image_count"] for _, record in sheets)
+        if self._over_image_limit(total_image_count):
+            return self._image_limit_parts(total_image_count)
+        if any(record["image_count"] and record.get("images") is None for _, record in sheets):
+            return None
+        
+        base_name = os.path.splitext(os.path.basename(file_path))[0]
+        image_parts = []
+        for sheet_name, record in sheets:
+            for counter, (ocr_text, vision_description) in enumerate(record.get("images") or [], 1):
+                image_parts.append(self._format_image_part(
+                    f"{base_name}_{sheet_name}_image_{counter}.png", sheet_name, counter, ocr_text, vision_description
+                ))
+        if image_parts:
+            logger.info(f"Excel图片识别结果来自分片缓存: {len(image_parts)} 张")
+        return image_parts
+    
+    async def _process_images(self, file_path: str) -> Tuple[list[str], Optional[Dict[str, int]], Dict[str, list]]:
+        """
+        提取并识别XLSX中选中工作表的图片
+        
+        Returns:
+            (图片内容列表, {工作表名称: 图片数量}（统计失败时为None）, {工作表名称: 识别结果}（仅全部成功的工作表）)
+        """
+        image_parts: list[str] = []
+        image_counts = None
+        analyses: Dict[str, list] = {}
         try:
-            # 读取图片并转换为base64
-            with open(temp_img_path, "rb") as image_file:
-                base64_image = base64.b64encode(image_file.read()).decode('utf-8')
+            # 先统计图片数量
+            image_counts = await self._count_images_in_xlsx(file_path)
+            total_image_count = sum(image_counts.values()) if image_counts is not None else 0
             
-            response = vision_client.chat.completions.create(
-                model=os.getenv("VISION_MODEL", "gpt-4o-mini"),
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/png;base64,{base64_image}"
-                                }
-                            },
-                            {
-                                "type": "text", 
-                                "text": "Please provide a detailed description of this image, including: 1. Overall accurate description of the image; 2. Main elements and structure of the image; 3. If there are tables, charts, etc., please describe their content and layout in detail."
-                            }
-                        ]
-                    }
-                ],
-                max_tokens=1000
-            )
-            return response.choices[0].message.content or "视觉模型识别失败"
-        except Exception as e:
-            logger.warning(f"Vision API调用失败: {e}")
-            return "视觉模型识别失败"
-
-    async def parse(self, file_path: str) -> str:
-        """解析Excel文件"""
+            # 图片数量保护机制
+            if self._over_image_limit(total_image_count):
+                image_parts = self._image_limit_parts(total_image_count)
+            else:
+                image_parts, analyses = await self._extract_images_from_xlsx(file_path)
+        except Exception as img_error:
+            logger.warning(f"Excel图片提取失败，跳过所有图片: {img_error}")
+        return image_parts, image_counts, analyses
+    
+    async def iter_parse(self, file_path: str) -> AsyncIterator[ParseChunk]:
+        """
+        解析Excel文件，逐个工作表产出内容，图片内容在所有工作表之后产出
+        
+        内容未变化的工作表复用分片缓存；选中的工作表全部命中时不再读取工作簿，
+        图片识别结果也取自缓存。
+        """
         try:
-            content_parts = []
+            selected, records = await self._load_sheet_records(file_path)
+            
+            if selected and all(content_hash in records for _, _, content_hash in selected):
+                for sheet_idx, _, content_hash in selected:
+                    if records[content_hash]["text"]:
+                        yield ParseChunk(kind="sheet", index=sheet_idx, text=records[content_hash]["text"])
+                
+                image_parts = self._cached_image_parts(
+                    file_path, [(sheet_name, records[content_hash]) for _, sheet_name, content_hash in selected]
+                )
+                if image_parts is None:
+                    # 图片识别结果不在缓存中：重新提取，并补全工作表记录
+                    image_parts, image_counts, analyses = await self._process_images(file_path)
+                    await self._cache_sheet_records(
+                        {content_hash: (sheet_name, records[content_hash]["text"])
+                         for _, sheet_name, content_hash in selected},
+                        image_counts, analyses
+                    )
+                if image_parts:
+                    yield self._format_chunk("images", 0, image_parts)
+                
+                logger.info(f"成功解析Excel文件（工作表全部来自分片缓存）: {file_path}")
+                return
+            
+            hashes_by_name = {sheet_name: content_hash for _, sheet_name, content_hash in selected if content_hash}
+            new_sheets: Dict[str, Tuple[str, str]] = {}
             
             # 读取所有工作表的数据
             xlsx_file = pd.ExcelFile(file_path)
             
-            for sheet_name in xlsx_file.sheet_names:
+            for sheet_idx, sheet_name in enumerate(xlsx_file.sheet_names, 1):
+                # 只解析选中的工作表
+                if not self.options.select_sheet(str(sheet_name), sheet_idx):
+                    continue
+                
+                # 分片缓存：内容未变化的工作表直接复用转换结果
+                content_hash = hashes_by_name.get(str(sheet_name), "")
+                if content_hash in records:
+                    if records[content_hash]["text"]:
+                        yield ParseChunk(kind="sheet", index=sheet_idx, text=records[content_hash]["text"])
+                    continue
+                
                 try:
-                    # 读取工作表数据
-                    df = pd.read_excel(file_path, sheet_name=sheet_name)
+                    # 读取工作表数据（复用已打开的工作簿，不再为每个工作表重新解析文件）
+                    df = xlsx_file.parse(sheet_name)
                     
                     # 跳过空工作表
-                    if df.empty:
-                        continue
-                    
-                    # 处理NaN值
-                    df = df.fillna('')
-                    
-                    # 添加工作表标题
-                    content_parts.append(f"## 工作表: {sheet_name}")
-                    
-                    # 转换为HTML表格
-                    html_table = tabulate(df, headers='keys', tablefmt='html', showindex=False)
-                    content_parts.append(html_table)
-                    
-                    # 添加基本统计信息
-                    numeric_cols = df.select_dtypes(include=['number']).columns
-                    if len(numeric_cols) > 0:
-                        content_parts.append("### 数据统计")
-                        stats_data = []
-                        for col in numeric_cols:
-                            stats_data.append([
-                                col,
-                                f"{df[col].count()}",
-                                f"{df[col].mean():.2f}" if df[col].count() > 0 else "N/A",
-                                f"{df[col].min():.2f}" if df[col].count() > 0 else "N/A",
-                                f"{df[col].max():.2f}" if df[col].count() > 0 else "N/A"
-                            ])
-                        
-                        stats_df = pd.DataFrame(stats_data, columns=pd.Index(['列名', '计数', '平均值', '最小值', '最大值']))
-                        stats_table = tabulate(stats_df, headers='keys', tablefmt='html', showindex=False)
-                        content_parts.append(stats_table)
-                    
+                    chunk = None
+                    if not df.empty:
+                        # 处理NaN值
+                        chunk = self._build_sheet_chunk(sheet_idx, sheet_name, df.fillna(''))
                 except Exception as sheet_error:
                     logger.warning(f"工作表 {sheet_name} 解析失败: {sheet_error}")
-                    content_parts.append(f"## 工作表: {sheet_name}\n\n*工作表解析失败: {str(sheet_error)}*")
+                    yield self._format_chunk(
+                        "sheet", sheet_idx, [f"## 工作表: {sheet_name}\n\n*工作表解析失败: {str(sheet_error)}*"]
+                    )
+                    continue
+                
+                if content_hash:
+                    new_sheets[content_hash] = (str(sheet_name), chunk.text if chunk else "")
+                if chunk:
+                    yield chunk
             
             # 提取并处理图片（仅支持.xlsx格式）
+            image_counts: Optional[Dict[str, int]] = None
+            analyses: Dict[str, list] = {}
             if file_path.lower().endswith('.xlsx'):
-                try:
-                    # 先统计图片总数
-                    total_image_count = await self._count_images_in_xlsx(file_path)
-                    
-                    # 图片数量保护机制
-                    max_imgs = config.MAX_IMAGES_PER_DOC
-                    if max_imgs != -1 and total_image_count > max_imgs:
-                        logger.warning(f"Excel文档包含 {total_image_count} 张图片，超过{max_imgs}张限制，跳过所有图片处理")
-                        if total_image_count > 0:
-                            content_parts.append(f"### 文档包含 {total_image_count} 张图片")
-                            content_parts.append(f"*因图片数量超过{max_imgs}张限制，已跳过所有图片处理*")
-                    else:
-                        image_parts = await self._extract_images_from_xlsx(file_path)
-                        if image_parts:
-                            content_parts.extend(image_parts)
-                except Exception as img_error:
-                    logger.warning(f"Excel图片提取失败，跳过所有图片: {img_error}")
+                image_parts, image_counts, analyses = await self._process_images(file_path)
+                if image_parts:
+                    yield self._format_chunk("images", 0, image_parts)
             
-            raw_content = '\n\n'.join(content_parts)
-            
-            # 处理换行符
-            raw_content = raw_content.replace('\\n', '\n')
-            
-            # 将代码块转换为HTML标签
-            raw_content = self.convert_code_blocks_to_html(raw_content)
-            
-            # 格式化为统一的代码块格式
-            markdown_content = f"```sheet\n{raw_content or 'Excel文件为空或无法提取内容'}\n```"
+            if new_sheets:
+                await self._cache_sheet_records(new_sheets, image_counts, analyses)
             
             logger.info(f"成功解析Excel文件: {file_path}")
-            return markdown_content
             
         except Exception as e:
             logger.error(f"解析Excel文件失败 {file_path}: {e}")
             raise Exception(f"Excel文件解析错误: {str(e)}")
     
-    async def _count_images_in_xlsx(self, file_path: str) -> int:
-        """统计XLSX文件中的图片数量"""
+    async def _count_images_in_xlsx(self, file_path: str) -> Optional[Dict[str, int]]:
+        """统计XLSX文件中选中工作表的图片数量，统计失败时返回None"""
         try:
             workbook = openpyxl.load_workbook(file_path)
-            total_count = 0
+            counts = {}
             
-            for sheet_name in workbook.sheetnames:
+            for sheet_idx, sheet_name in enumerate(workbook.sheetnames, 1):
+                if not self.options.select_sheet(sheet_name, sheet_idx):
+                    continue
                 worksheet = workbook[sheet_name]
                 
                 # 检查工作表中的图片
                 images = getattr(worksheet, '_images', None)
-                if images:
-                    total_count += len(images)
+                counts[sheet_name] = len(images) if images else 0
             
             workbook.close()
-            return total_count
+            return counts
             
         except Exception as e:
             logger.warning(f"统计Excel图片数量失败: {e}")
-            return 0
+            return None
     
-    async def _extract_images_from_xlsx(self, file_path: str) -> list[str]:
-        """从XLSX文件中提取图片并进行OCR+视觉识别"""
+    async def _extract_images_from_xlsx(self, file_path: str) -> Tuple[list[str], Dict[str, list]]:
+        """
+        从XLSX文件中提取图片并进行OCR+视觉识别
+        
+        Returns:
+            (图片内容列表, {工作表名称: [[OCR文本, 视觉描述], ...]})，
+            后者只包含图片全部提取并识别成功的工作表，用于写入分片缓存
+        """
         try:
             # 使用openpyxl打开工作簿
             workbook = openpyxl.load_workbook(file_path)
@@ -203,7 +425,9 @@ class ExcelParser(BaseParser):
             # 收集所有图片信息
             all_image_info = []
             
-            for sheet_name in workbook.sheetnames:
+            for sheet_idx, sheet_name in enumerate(workbook.sheetnames, 1):
+                if not self.options.select_sheet(sheet_name, sheet_idx):
+                    continue
                 worksheet = workbook[sheet_name]
                 sheet_image_counter = 0
                 
@@ -235,54 +459,44 @@ class ExcelParser(BaseParser):
                                 'counter': sheet_image_counter
                             })
             
-            # 并发处理所有图片
+            workbook.close()
+            
+            # 批量处理所有图片（OCR合并推理，视觉识别并发执行）
             if all_image_info:
-                image_tasks = []
+                valid_images = [img_info for img_info in all_image_info if img_info['data'] is not None]
+                try:
+                    analysis_results = await analyze_images([img_info['data'] for img_info in valid_images])
+                except Exception as ocr_vision_error:
+                    logger.warning(f"OCR/视觉识别失败，跳过处理所有图片: {ocr_vision_error}")
+                    analysis_results = [("OCR处理失败", "视觉识别失败")] * len(valid_images)
+                analysis_iter = iter(analysis_results)
+                
+                final_image_parts = []
+                analyses: Dict[str, list] = {}
+                failed_sheets = set()
                 for img_info in all_image_info:
-                    if img_info['data'] is not None:
-                        task = self._process_image_concurrent(
-                            img_info['data'],
-                            img_info['name'],
-                            img_info['sheet'],
-                            img_info['counter']
-                        )
-                    else:
+                    if img_info['data'] is None:
                         # 图片提取失败的情况
-                        async def create_error_result(sheet, counter):
-                            return f"### 工作表 {sheet} - 图片 {counter}\n\n*图片提取失败，已跳过*"
-                        task = create_error_result(img_info['sheet'], img_info['counter'])
-                    
-                    image_tasks.append(task)
+                        final_image_parts.append(
+                            f"### 工作表 {img_info['sheet']} - 图片 {img_info['counter']}\n\n*图片提取失败，已跳过*"
+                        )
+                        failed_sheets.add(img_info['sheet'])
+                        continue
+                    ocr_text, vision_description = next(analysis_iter)
+                    final_image_parts.append(self._format_image_part(
+                        img_info['name'], img_info['sheet'], img_info['counter'], ocr_text, vision_description
+                    ))
+                    if ocr_text in _FAILED_ANALYSIS or vision_description in _FAILED_ANALYSIS:
+                        failed_sheets.add(img_info['sheet'])
+                    analyses.setdefault(img_info['sheet'], []).append([ocr_text, vision_description])
                 
-                try:
-                    image_parts = await asyncio.gather(*image_tasks, return_exceptions=True)
-                    
-                    # 处理结果
-                    final_image_parts = []
-                    for i, result in enumerate(image_parts):
-                        if isinstance(result, Exception):
-                            img_info = all_image_info[i]
-                            logger.error(f"Excel图片并发处理异常，跳过该图片 {img_info['sheet']} 图片{img_info['counter']}: {result}")
-                            final_image_parts.append(f"### 工作表 {img_info['sheet']} - 图片 {img_info['counter']}\n\n*图片处理异常，已跳过*")
-                        else:
-                            final_image_parts.append(result)
-                    
-                    total_image_counter = len(all_image_info)
-                    if total_image_counter > 0:
-                        logger.info(f"Excel文档中共处理了 {total_image_counter} 张图片")
-                    
-                    workbook.close()
-                    return final_image_parts
-                    
-                except Exception as e:
-                    logger.error(f"Excel图片并发处理失败，跳过所有图片: {e}")
-                    workbook.close()
-                    # 回退处理
-                    return [f"### 工作表 图片处理失败\n\n*图片并发处理失败，已跳过*" for _ in range(len(all_image_info))]
+                logger.info(f"Excel文档中共处理了 {len(all_image_info)} 张图片")
+                return final_image_parts, {
+                    sheet: results for sheet, results in analyses.items() if sheet not in failed_sheets
+                }
             
-            workbook.close()
-            return []
+            return [], {}
             
         except Exception as e:
             logger.warning(f"Excel图片提取过程失败，跳过所有图片: {e}")
-            return [] 
\ No newline at end of file
+            return [], {} 
\ No newline at end of file
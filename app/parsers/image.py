@@ -5,6 +5,10 @@ from app.vision import image_to_markdown
 class ImageParser(BaseParser):
     """图片文件解析器"""
     
+    uses_image_analysis = True
+    # 升级前 /ocr 与 /convert 的图片结果共用同一缓存键，无法区分
+    legacy_cache_compatible = False
+    
     @classmethod
     def get_supported_extensions(cls) -> list[str]:
         return ['.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff', '.webp', '.ico', '.tga']
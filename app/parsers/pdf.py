@@ -1,151 +1,761 @@
-from .base import BaseParser
+from .base import BaseParser, ParseChunk
 from loguru import logger
 import pdfplumber
 from PIL import Image
-from app.vision import get_ocr_text
+from app.vision import analyze_images
+import io
 import os
+import re
+import json
 import asyncio
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
 from app.config import config
-from typing import List, Tuple, Dict
+from app.cache import cache_manager
+from typing import Any, Callable, List, Tuple, Dict, Optional, Union, AsyncIterator, Deque
+from pdfminer.pdftypes import (
+    PDFObjRef, PDFStream, resolve1, LITERALS_DCT_DECODE, LITERALS_JPX_DECODE, LITERALS_FLATE_DECODE, LITERALS_LZW_DECODE
+)
+
+# 页面处理策略
+PAGE_TEXT = "text"  # 仅提取文本层
+PAGE_OCR = "ocr"    # OCR整页光栅图（扫描页）
+PAGE_BOTH = "both"  # 提取文本层，并OCR内嵌图片
+
+# 计算页面内容哈希时跳过的字典键：父节点/所属页面的反向引用，以及缩略图、结构树序号等不影响提取结果的元数据
+_PAGE_HASH_SKIP_KEYS = frozenset(("Parent", "P", "Thumb", "StructParents", "B", "PieceInfo", "LastModified", "Metadata"))
+
+# 无法映射为Unicode的字形，pdfminer 输出为 (cid:123)，不计入可用文字
+_CID_PATTERN = re.compile(r'\(cid:\d+\)|\s')
+
+
+@dataclass
+class PdfImage:
+    """待OCR的PDF图片（内嵌图片或整页光栅图）"""
+    name: str
+    page_num: int
+    img_idx: int
+    image: Union[bytes, Image.Image]
+
+
+def _raster_name(base_name: str, page_num: int) -> str:
+    return f"{base_name}_page{page_num}.png"
+
+
+def _image_name(base_name: str, page_num: int, img_idx: int) -> str:
+    return f"{base_name}_page{page_num}_image_{img_idx + 1}.png"
+
+
+@dataclass
+class PdfPageResult:
+    """单页提取结果"""
+    page_num: int
+    strategy: str
+    text: str = ""
+    images: List[PdfImage] = field(default_factory=list)
+    raster: Optional[PdfImage] = None
+    failed_images: List[int] = field(default_factory=list)
+    # 页面内容哈希，为空时不使用分片缓存
+    content_hash: str = ""
+    # 来自分片缓存的识别结果（按图片名称），非 None 时无需提取和OCR
+    ocr_texts: Optional[Dict[str, str]] = None
+
+    def to_record(self, ocr_results: Dict[str, str]) -> Optional[str]:
+        """
+        序列化为分片缓存记录
+
+        记录中不含页码和图片名称，复用时按当前文档的文件名和页码重新生成，
+        因此插入或删除页面后其余页面仍能命中。
+
+        Args:
+            ocr_results: 按图片名称的OCR结果
+
+        Returns:
+            JSON字符串，存在OCR失败的图片时返回None（不缓存临时失败）
+        """
+        raster_text = ocr_results.get(self.raster.name, "OCR处理失败") if self.raster is not None else None
+        image_texts = [[item.img_idx, ocr_results.get(item.name, "OCR处理失败")] for item in self.images]
+        if raster_text == "OCR处理失败" or any(text == "OCR处理失败" for _, text in image_texts):
+            return None
+        return json.dumps({
+            "strategy": self.strategy,
+            "text": self.text,
+            "raster": raster_text,
+            "images": image_texts,
+            "failed": self.failed_images
+        }, ensure_ascii=False)
+
+    @classmethod
+    def from_record(cls, record: str, page_num: int, base_name: str, content_hash: str) -> "PdfPageResult":
+        """从分片缓存记录恢复页面结果（图片数据为空，识别结果保存在 ocr_texts 中）"""
+        data = json.loads(record)
+        if data["strategy"] not in (PAGE_TEXT, PAGE_OCR, PAGE_BOTH):
+            raise ValueError(f"未知的页面处理策略: {data['strategy']}")
+        result = cls(
+            page_num=page_num, strategy=data["strategy"], text=data["text"],
+            failed_images=list(data["failed"]), content_hash=content_hash, ocr_texts={}
+        )
+        if data["raster"] is not None:
+            result.raster = PdfImage(name=_raster_name(base_name, page_num), page_num=page_num, img_idx=-1, image=b"")
+            result.ocr_texts[result.raster.name] = data["raster"]  # type: ignore
+        for img_idx, ocr_text in data["images"]:
+            pdf_image = PdfImage(name=_image_name(base_name, page_num, img_idx), page_num=page_num,
+                                 img_idx=img_idx, image=b"")
+            result.images.append(pdf_image)
+            result.ocr_texts[pdf_image.name] = ocr_text  # type: ignore
+        return result
+
+
+class PageContentHasher:
+    """
+    计算页面内容哈希
+
+    按引用展开页面字典（内容流、资源、页面尺寸与旋转等，继承的属性已由 pdfminer 合并），
+    数据流使用未解码的原始数据，结果与对象编号无关：文档重新保存或增量修改后，
+    内容未变化的页面哈希保持不变。
+    """
+
+    def __init__(self, new_hasher: Callable[[], Any]):
+        self.new_hasher = new_hasher
+        # 多页共用的数据流（字体、图片等）只计算一次摘要
+        self._stream_digests: Dict[int, bytes] = {}
+
+    def hash_page(self, page) -> str:
+        """
+        计算单个页面的内容哈希
+
+        Args:
+            page: pdfplumber 页面对象
+
+        Returns:
+            十六进制哈希字符串
+        """
+        hasher = self.new_hasher()
+        self._update(hasher, page.page_obj.attrs, {})
+        return hasher.hexdigest()
+
+    def _update(self, hasher, obj, refs: Dict[int, int]) -> None:
+        if isinstance(obj, PDFObjRef):
+            # 重复引用（包括循环引用）按首次出现的顺序编号
+            if obj.objid in refs:
+                hasher.update(b"R%d;" % refs[obj.objid])
+                return
+            refs[obj.objid] = len(refs)
+            self._update(hasher, resolve1(obj), refs)
+        elif isinstance(obj, PDFStream):
+            hasher.update(b"S")
+            self._update(hasher, obj.attrs, refs)
+            hasher.update(self._stream_digest(obj))
+        elif isinstance(obj, dict):
+            keys = sorted(key for key in obj if key not in _PAGE_HASH_SKIP_KEYS)
+            hasher.update(b"D%d;" % len(keys))
+            for key in keys:
+                hasher.update(f"{key}=".encode('utf-8'))
+                self._update(hasher, obj[key], refs)
+        elif isinstance(obj, (list, tuple)):
+            hasher.update(b"A%d;" % len(obj))
+            for item in obj:
+                self._update(hasher, item, refs)
+        elif isinstance(obj, bytes):
+            hasher.update(b"B%d;" % len(obj))
+            hasher.update(obj)
+        else:
+            hasher.update(f"{type(obj).__name__}:{obj!r};".encode('utf-8'))
+
+    def _stream_digest(self, stream: PDFStream) -> bytes:
+        objid = getattr(stream, 'objid', None)
+        digest = self._stream_digests.get(objid) if objid is not None else None
+        if digest is None:
+            hasher = self.new_hasher()
+            hasher.update(stream.rawdata if stream.rawdata is not None else stream.get_data())
+            digest = hasher.digest()
+            if objid is not None:
+                self._stream_digests[objid] = digest
+        return digest
+
+
+def hash_pages(pages: list, new_hasher: Callable[[], Any]) -> List[str]:
+    """
+    计算一组页面的内容哈希（同步）
+
+    需要在提取页面之前调用：提取会解码数据流，之后只能读取解码后的数据，哈希随之变化。
+
+    Args:
+        pages: pdfplumber 页面对象列表
+        new_hasher: 哈希对象工厂
+
+    Returns:
+        与 pages 一一对应的哈希，无法计算的页面为空字符串（不使用分片缓存）
+    """
+    hasher = PageContentHasher(new_hasher)
+    hashes = []
+    for page in pages:
+        try:
+            hashes.append(hasher.hash_page(page))
+        except Exception as e:
+            logger.debug(f"计算PDF页面内容哈希失败 第{page.page_number}页: {e}")
+            hashes.append("")
+    return hashes
+
+
+def _image_coverage(page) -> float:
+    """计算图片覆盖页面面积的比例（裁剪到页面范围内）"""
+    page_area = float(page.width * page.height)
+    if page_area <= 0:
+        return 0.0
+
+    covered = 0.0
+    for img in page.images:
+        width = min(img['x1'], page.width) - max(img['x0'], 0)
+        height = min(img['bottom'], page.height) - max(img['top'], 0)
+        if width > 0 and height > 0:
+            covered += width * height
+    return min(covered / page_area, 1.0)
+
+
+def _glyph_count(text: str) -> int:
+    """文本层中可映射为Unicode的字形数"""
+    return len(_CID_PATTERN.sub('', text or ''))
+
+
+def classify_page(page, text: str) -> str:
+    """
+    判断页面的处理策略
+
+    - 文本层可用（可映射字形数达到阈值）：仅提取文本；图片面积较大时同时OCR内嵌图片，
+      但图片几乎覆盖整页时视为已带文本层的扫描件，不再重复OCR
+    - 文本层不足且图片几乎覆盖整页：视为扫描页，OCR整页光栅图（已有的少量文本保留作OCR失败时的回退）
+    - 文本层不足但有较大图片：提取文本，并OCR内嵌图片
+    - 其他（封面、短标题页、只有表格线等矢量图形的页面）：仅提取文本
+
+    Args:
+        page: pdfplumber 页面对象
+        text: 页面文本层内容
+
+    Returns:
+        PAGE_TEXT / PAGE_OCR / PAGE_BOTH
+    """
+    strategy = config.PDF_OCR_STRATEGY
+    if strategy == "text":
+        return PAGE_TEXT
+    if strategy == "ocr":
+        return PAGE_OCR
+    if strategy == "images":
+        return PAGE_BOTH
+
+    coverage = _image_coverage(page)
+
+    if _glyph_count(text) >= config.PDF_TEXT_MIN_CHARS:
+        if coverage >= config.PDF_SCAN_COVERAGE:
+            return PAGE_TEXT
+        return PAGE_BOTH if coverage >= config.PDF_FIGURE_COVERAGE else PAGE_TEXT
+
+    if coverage >= config.PDF_SCAN_COVERAGE:
+        return PAGE_OCR
+    return PAGE_BOTH if coverage >= config.PDF_FIGURE_COVERAGE else PAGE_TEXT
+
+
+_COLORSPACE_COMPONENTS = {
+    'DeviceGray': 1, 'CalGray': 1,
+    'DeviceRGB': 3, 'CalRGB': 3,
+    'DeviceCMYK': 4,
+}
+_COMPONENT_MODES = {1: 'L', 3: 'RGB', 4: 'CMYK'}
+
+
+def _literal_name(value) -> str:
+    """PSLiteral 或字符串转换为名称"""
+    value = resolve1(value)
+    return getattr(value, 'name', value) if value is not None else ''
+
+
+def _colorspace_components(colorspace) -> Optional[int]:
+    """解析色彩空间的通道数，索引色、Separation 等需要查表的色彩空间返回None"""
+    colorspace = resolve1(colorspace)
+    if isinstance(colorspace, list):
+        if not colorspace:
+            return None
+        family = _literal_name(colorspace[0])
+        if family == 'ICCBased' and len(colorspace) > 1:
+            icc_stream = resolve1(colorspace[1])
+            components = resolve1(getattr(icc_stream, 'attrs', {}).get('N'))
+            return components if components in (1, 3, 4) else None
+        return _COLORSPACE_COMPONENTS.get(family)
+    return _COLORSPACE_COMPONENTS.get(_literal_name(colorspace))
+
+
+def extract_xobject_image(img: dict) -> Optional[Union[bytes, Image.Image]]:
+    """
+    直接从图片 XObject 数据流中取出图片，不经过页面渲染
+
+    - DCTDecode：原始数据即为JPEG文件
+    - JPXDecode：原始数据即为JPEG 2000文件（需要Pillow支持OpenJPEG）
+    - FlateDecode/LZWDecode/无压缩：解码后的像素按色彩空间构造图片
+
+    内联图片、带遮罩（ImageMask/SMask/Mask）、Decode数组、索引色等
+    需要页面渲染语义的图片返回None，由调用方回退到渲染。
+
+    Args:
+        img: pdfplumber 的图片对象
+
+    Returns:
+        JPEG字节或PIL图片，无法直接提取时返回None
+    """
+    stream = img.get('stream')
+    # 内联图片没有对象编号
+    if stream is None or getattr(stream, 'objid', None) is None:
+        return None
+
+    attrs = stream.attrs
+    if resolve1(attrs.get('ImageMask')) or 'SMask' in attrs or 'Mask' in attrs or 'Decode' in attrs:
+        return None
+
+    filters = [f for f, _ in stream.get_filters()]
+    components = _colorspace_components(attrs.get('ColorSpace'))
+
+    if len(filters) == 1 and filters[0] in LITERALS_DCT_DECODE:
+        if components not in (1, 3):
+            # CMYK JPEG 的反相约定因生成工具而异，交给渲染器处理
+            return None
+        return stream.get_rawdata()
+
+    if len(filters) == 1 and filters[0] in LITERALS_JPX_DECODE:
+        jpx_image = Image.open(io.BytesIO(stream.get_rawdata()))
+        jpx_image.load()
+        return jpx_image
+
+    if any(f not in LITERALS_FLATE_DECODE and f not in LITERALS_LZW_DECODE for f in filters):
+        return None
+
+    width = resolve1(attrs.get('Width'))
+    height = resolve1(attrs.get('Height'))
+    bits = resolve1(attrs.get('BitsPerComponent', 8))
+    if not width or not height or components is None:
+        return None
+
+    data = stream.get_data()
+    if bits == 8 and components in _COMPONENT_MODES:
+        if len(data) < width * height * components:
+            return None
+        return Image.frombytes(_COMPONENT_MODES[components], (width, height), data)
+    if bits == 1 and components == 1:
+        if len(data) < (width + 7) // 8 * height:
+            return None
+        return Image.frombytes('1', (width, height), data)
+    return None
+
+
+def _render_image(page, img: dict) -> Image.Image:
+    """将图片所在的页面区域渲染为内存中的PIL图片"""
+    bbox = (img['x0'], img['top'], img['x1'], img['bottom'])
+    cropped_page = page.crop(bbox)
+    return cropped_page.to_image(resolution=150).original
+
+
+def extract_page(page, page_num: int, base_name: str,
+                 xobject_cache: Optional[Dict[int, Union[bytes, Image.Image]]] = None) -> PdfPageResult:
+    """
+    提取单个页面的文本和待OCR图片（同步，CPU密集）
+
+    Args:
+        page: pdfplumber 页面对象
+        page_num: 页码（从1开始）
+        base_name: 文档文件名（不含扩展名），用于生成图片名称
+        xobject_cache: 文档内已提取的图片 XObject（按对象编号），多页复用的图片只解码一次
+
+    Returns:
+        页面提取结果
+    """
+    text = page.extract_text() or ""
+    strategy = classify_page(page, text)
+    result = PdfPageResult(page_num=page_num, strategy=strategy)
+
+    if strategy == PAGE_OCR:
+        # 扫描页：渲染整页光栅图交给OCR，已有的文本层内容在OCR失败时作为回退
+        page_img = page.to_image(resolution=config.PDF_OCR_RESOLUTION)
+        result.raster = PdfImage(
+            name=_raster_name(base_name, page_num), page_num=page_num, img_idx=-1, image=page_img.original
+        )
+        if _glyph_count(text) > 0:
+            result.text = text.strip()
+        return result
+
+    result.text = text.strip()
+    if strategy == PAGE_TEXT:
+        return result
+
+    # 收集当前页面的所有内嵌图片
+    for img_idx, img in enumerate(page.images):
+        try:
+            image = None
+            if config.PDF_IMAGE_EXTRACTION == "xobject":
+                objid = getattr(img.get('stream'), 'objid', None)
+                if xobject_cache is not None and objid in xobject_cache:
+                    image = xobject_cache[objid]
+                else:
+                    try:
+                        image = extract_xobject_image(img)
+                    except Exception as xobject_error:
+                        logger.debug(f"图片XObject直接提取失败，回退到渲染 第{page_num}页 图片{img_idx + 1}: {xobject_error}")
+                    if image is not None and xobject_cache is not None:
+                        xobject_cache[objid] = image  # type: ignore
+
+            if image is None:
+                # 内联/带遮罩等图片：渲染页面区域为内存中的PIL图片，无需编码或写盘
+                image = _render_image(page, img)
+
+            result.images.append(PdfImage(
+                name=_image_name(base_name, page_num, img_idx),
+                page_num=page_num, img_idx=img_idx, image=image
+            ))
+        except Exception as img_error:
+            logger.warning(f"PDF图片提取失败，跳过该图片 第{page_num}页 图片{img_idx + 1}: {img_error}")
+            result.failed_images.append(img_idx)
+
+    return result
+
+
+def extract_page_range(file_path: str, page_numbers: List[int], base_name: str) -> List[PdfPageResult]:
+    """
+    提取一组页面（在PDF工作进程中运行）
+
+    Args:
+        file_path: PDF文件路径
+        page_numbers: 按升序排列的页码（从1开始）
+        base_name: 文档文件名（不含扩展名）
+
+    Returns:
+        按页码排序的页面提取结果
+    """
+    with pdfplumber.open(file_path, pages=page_numbers) as pdf:
+        return extract_window(pdf.pages, base_name)
+
+
+def _release_page(page) -> None:
+    """释放页面缓存的版面对象（pdfplumber 新版本为 close，旧版本为 flush_cache）"""
+    release = getattr(page, 'close', None) or getattr(page, 'flush_cache', None)
+    if release is not None:
+        release()
+
+
+def extract_window(pages: list, base_name: str) -> List[PdfPageResult]:
+    """
+    提取一个窗口内的页面，每页处理完即释放其版面缓存（同步，CPU密集）
+
+    Args:
+        pages: pdfplumber 页面对象列表
+        base_name: 文档文件名（不含扩展名）
+
+    Returns:
+        按页码排序的页面提取结果
+    """
+    results = []
+    # XObject 复用缓存只在窗口内有效，避免整篇文档的图片常驻内存
+    xobject_cache: Dict[int, Union[bytes, Image.Image]] = {}
+    for page in pages:
+        try:
+            results.append(extract_page(page, page.page_number, base_name, xobject_cache))
+        finally:
+            _release_page(page)
+    return results
+
+
+class PdfWorkerPool:
+    """
+    PDF页面提取工作进程池
+
+    pdfplumber 的版面分析是纯Python的CPU密集计算，大文档按页码区间分片后
+    由多个工作进程并行提取，结果在主进程按页码合并。进程池在首次使用时启动。
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_workers > 0
+
+    async def run(self, func, *args):
+        """在工作进程中执行模块级同步函数"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            logger.info(f"PDF工作进程池已启动，工作进程数: {self.max_workers}")
+
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._executor, func, *args)
+        except BrokenProcessPool as e:
+            logger.error(f"PDF工作进程异常退出，正在重建进程池: {e}")
+            self.shutdown(wait=False)
+            raise Exception("PDF工作进程异常退出，请重试")
+
+    def shutdown(self, wait: bool = True) -> None:
+        """关闭工作进程池"""
+        if self._executor is None:
+            return
+        executor = self._executor
+        self._executor = None
+        executor.shutdown(wait=wait, cancel_futures=True)
+        logger.info("PDF工作进程池已关闭")
+
+
+# 全局PDF工作进程池
+pdf_pool = PdfWorkerPool(max_workers=config.PDF_PARALLEL_WORKERS)
+
+
+async def close_pdf_pool():
+    """关闭PDF工作进程池"""
+    pdf_pool.shutdown()
+
 
 class PdfParser(BaseParser):
     """PDF文件解析器"""
-    
+
+    block_type = "document"
+    empty_content = "PDF文件为空或无法提取内容"
+    uses_image_analysis = True
+    # 2: 文本层不足的页面只在图片几乎覆盖整页时整页OCR，并保留文本层内容
+    parser_version = 2
+    cache_config_keys = (
+        "PDF_OCR_STRATEGY", "PDF_TEXT_MIN_CHARS", "PDF_SCAN_COVERAGE",
+        "PDF_FIGURE_COVERAGE", "PDF_OCR_RESOLUTION", "PDF_IMAGE_EXTRACTION",
+    )
+
     @classmethod
     def get_supported_extensions(cls) -> list[str]:
         return ['.pdf']
-    
-    async def _process_image_ocr_only(self, temp_img_path: str, img_name: str, page_num: int, img_idx: int, global_img_id: int):
-        """仅对图片进行OCR处理，不使用视觉模型"""
+
+    def _format_image_part(self, pdf_image: PdfImage, ocr_text: str) -> str:
+        """根据OCR结果生成单个图片的内容（不使用视觉模型）"""
+        # 生成HTML标签格式，仅包含OCR结果
+        alt_text = f"# OCR: {ocr_text}"
+        html_img_tag = f'<img src="{pdf_image.name}" alt="{alt_text}" />'
+
+        logger.info(f"成功处理PDF图片 第{pdf_image.page_num}页 图片{pdf_image.img_idx + 1}: {pdf_image.name}")
+        return f"### 第 {pdf_image.page_num} 页 - 图片 {pdf_image.img_idx + 1}\n\n{html_img_tag}"
+
+    def _format_page(self, page_result: PdfPageResult, ocr_results: Dict[str, str]) -> List[str]:
+        """按页面顺序组织文本、扫描页OCR文本和图片内容"""
+        parts = []
+
+        if page_result.raster is not None:
+            ocr_text = ocr_results.get(page_result.raster.name, "OCR处理失败")
+            if ocr_text in ("OCR处理失败", "未检测到文字内容") and page_result.text:
+                # OCR失败或未识别到文字时保留文本层内容
+                parts.append(f"## 第 {page_result.page_num} 页\n\n{page_result.text}")
+            elif ocr_text == "OCR处理失败":
+                parts.append(f"## 第 {page_result.page_num} 页\n\n*页面OCR失败，已跳过*")
+            elif ocr_text != "未检测到文字内容":
+                parts.append(f"## 第 {page_result.page_num} 页\n\n{ocr_text}")
+            return parts
+
+        if page_result.text:
+            parts.append(f"## 第 {page_result.page_num} 页\n\n{page_result.text}")
+        elif page_result.images or page_result.failed_images:
+            parts.append(f"## 第 {page_result.page_num} 页\n")
+
+        for pdf_image in page_result.images:
+            parts.append(self._format_image_part(pdf_image, ocr_results.get(pdf_image.name, "OCR处理失败")))
+        for img_idx in page_result.failed_images:
+            parts.append(f"### 第 {page_result.page_num} 页 - 图片 {img_idx + 1}\n\n*图片提取失败，已跳过*")
+        return parts
+
+    async def _ocr_pages(self, page_results: List[PdfPageResult]) -> Dict[str, str]:
+        """批量OCR所有页面的内嵌图片和扫描页光栅图（优先使用图片缓存）"""
+        ocr_images = []
+        for page_result in page_results:
+            if page_result.raster is not None:
+                ocr_images.append(page_result.raster)
+            ocr_images.extend(page_result.images)
+
+        if not ocr_images:
+            return {}
+
+        logger.info(f"开始批量OCR {len(ocr_images)} 张图片/扫描页...")
         try:
-            # 仅执行OCR处理
+            analysis_results = await analyze_images([item.image for item in ocr_images], use_vision=False)
+        except Exception as ocr_error:
+            logger.warning(f"OCR处理失败，跳过处理所有图片: {ocr_error}")
+            analysis_results = [("OCR处理失败", "")] * len(ocr_images)
+
+        return {item.name: ocr_text for item, (ocr_text, _) in zip(ocr_images, analysis_results)}
+
+    async def _lookup_cached_pages(self, pdf, page_numbers: List[int],
+                                   base_name: str) -> Tuple[Dict[int, str], Deque[PdfPageResult]]:
+        """
+        计算选中页面的内容哈希并批量读取分片缓存
+
+        Returns:
+            (按页码的内容哈希, 按页码排序的已缓存页面)
+        """
+        pages = [pdf.pages[number - 1] for number in page_numbers]
+        hashes = await asyncio.to_thread(hash_pages, pages, cache_manager.new_unit_hasher)
+        content_hashes = {number: content_hash for number, content_hash in zip(page_numbers, hashes) if content_hash}
+        records = await cache_manager.get_unit_results(self.cache_namespace(), "page", list(content_hashes.values()))
+
+        cached: Deque[PdfPageResult] = deque()
+        for number, content_hash in content_hashes.items():
+            record = records.get(content_hash)
+            if record is None:
+                continue
             try:
-                ocr_text = await get_ocr_text(temp_img_path)
-            except Exception as ocr_error:
-                logger.warning(f"OCR处理失败，跳过处理 第{page_num}页 图片{img_idx + 1}: {ocr_error}")
-                ocr_text = "OCR处理失败"
-            
-            # 生成HTML标签格式，仅包含OCR结果
-            alt_text = f"# OCR: {ocr_text}"
-            html_img_tag = f'<img src="{img_name}" alt="{alt_text}" />'
-            
-            logger.info(f"成功处理PDF图片 第{page_num}页 图片{img_idx + 1}: {img_name}")
-            return {
-                'global_id': global_img_id,
-                'page_num': page_num,
-                'img_idx': img_idx,
-                'content': f"### 第 {page_num} 页 - 图片 {img_idx + 1}\n\n{html_img_tag}"
-            }
-            
-        except Exception as e:
-            logger.warning(f"PDF图片处理失败，跳过该图片 第{page_num}页 图片{img_idx + 1}: {e}")
-            return {
-                'global_id': global_img_id,
-                'page_num': page_num,
-                'img_idx': img_idx,
-                'content': f"### 第 {page_num} 页 - 图片 {img_idx + 1}\n\n*图片处理失败，已跳过*"
-            }
-
-    async def parse(self, file_path: str) -> str:
-        """解析PDF文件"""
+                cached.append(PdfPageResult.from_record(record, number, base_name, content_hash))
+            except (ValueError, KeyError, TypeError) as record_error:
+                logger.warning(f"PDF页面缓存记录无效，重新处理 第{number}页: {record_error}")
+        return content_hashes, cached
+
+    @staticmethod
+    def _merge_cached(results: List[PdfPageResult], content_hashes: Dict[int, str],
+                      cached: Deque[PdfPageResult]) -> List[PdfPageResult]:
+        """记录提取结果的内容哈希，并按页码顺序并入不晚于本窗口末页的缓存页（results 为空时并入全部）"""
+        for result in results:
+            result.content_hash = content_hashes.get(result.page_num, "")
+        last_page = results[-1].page_num if results else None
+        merged = list(results)
+        while cached and (last_page is None or cached[0].page_num <= last_page):
+            merged.append(cached.popleft())
+        merged.sort(key=lambda result: result.page_num)
+        return merged
+
+    async def _iter_windows(self, file_path: str, base_name: str) -> AsyncIterator[List[PdfPageResult]]:
+        """
+        按页码顺序逐个窗口产出页面提取结果
+
+        小文档在线程中逐窗口提取；大文档按页码区间分片交给PDF工作进程，
+        同时在途的分片数不超过工作进程数。指定了页码范围时只提取选中的页面。
+        启用分片缓存时，内容未变化的页面直接使用缓存记录，不再提取。
+        """
+        content_hashes: Dict[int, str] = {}
+        cached: Deque[PdfPageResult] = deque()
+        with pdfplumber.open(file_path) as pdf:
+            page_count = len(pdf.pages)
+            if self.options.pages is not None:
+                page_numbers = self.options.pages.select(page_count)
+                logger.info(f"PDF共 {page_count} 页，按页码范围 {self.options.pages} 选中 {len(page_numbers)} 页")
+            else:
+                page_numbers = list(range(1, page_count + 1))
+
+            if cache_manager.unit_cache_enabled and page_numbers:
+                content_hashes, cached = await self._lookup_cached_pages(pdf, page_numbers, base_name)
+                if cached:
+                    cached_numbers = {result.page_num for result in cached}
+                    page_numbers = [number for number in page_numbers if number not in cached_numbers]
+                    logger.info(f"PDF {len(cached_numbers)} 页内容未变化，复用缓存，{len(page_numbers)} 页待提取")
+
+            if not pdf_pool.enabled or len(page_numbers) < config.PDF_PARALLEL_MIN_PAGES:
+                window = config.PDF_PAGE_WINDOW
+                for start in range(0, len(page_numbers), window):
+                    pages = [pdf.pages[number - 1] for number in page_numbers[start:start + window]]
+                    results = await asyncio.to_thread(extract_window, pages, base_name)
+                    yield self._merge_cached(results, content_hashes, cached)
+                if cached:
+                    yield self._merge_cached([], content_hashes, cached)
+                return
+
+        chunk_size = config.PDF_PAGES_PER_CHUNK
+        chunks = [page_numbers[start:start + chunk_size] for start in range(0, len(page_numbers), chunk_size)]
+        logger.info(f"PDF共 {len(page_numbers)} 页待提取，分为 {len(chunks)} 个分片并行提取")
+
+        pending: Deque[asyncio.Future] = deque()
         try:
-            content_parts = []
-            all_image_tasks = []
-            global_img_id = 0
-            
-            with pdfplumber.open(file_path) as pdf:
-                # 第一遍：收集所有图片任务
-                for page_num, page in enumerate(pdf.pages, 1):
-                    # 提取文本
-                    text = page.extract_text()
-                    if text and text.strip():
-                        content_parts.append(f"## 第 {page_num} 页\n\n{text.strip()}")
-                    
-                    # 收集当前页面的所有图片任务
-                    images = page.images
-                    if images:
-                        for img_idx, img in enumerate(images):
-                            try:
-                                # 提取图片
-                                bbox = (img['x0'], img['top'], img['x1'], img['bottom'])
-                                cropped_page = page.crop(bbox)
-                                
-                                # 保存为临时图片文件
-                                temp_img_path = self.create_temp_file(suffix='.png')
-                                
-                                # 将页面转换为图片
-                                page_img = cropped_page.to_image(resolution=150)
-                                page_img.save(temp_img_path, format='PNG')
-                                
-                                # 生成图片文件名
-                                base_name = os.path.splitext(os.path.basename(file_path))[0]
-                                img_name = f"{base_name}_page{page_num}_image_{img_idx + 1}.png"
-                                
-                                # 创建OCR任务，包含全局ID以保持顺序
-                                task = self._process_image_ocr_only(temp_img_path, img_name, page_num, img_idx, global_img_id)
-                                all_image_tasks.append(task)
-                                global_img_id += 1
-                                
-                            except Exception as img_error:
-                                logger.warning(f"PDF图片提取失败，跳过该图片 第{page_num}页 图片{img_idx + 1}: {img_error}")
-                                content_parts.append(f"### 第 {page_num} 页 - 图片 {img_idx + 1}\n\n*图片提取失败，已跳过*")
-                
-                # 第二遍：并发处理所有图片
-                if all_image_tasks:
-                    logger.info(f"开始并发处理 {len(all_image_tasks)} 张图片...")
-                    try:
-                        image_results = await asyncio.gather(*all_image_tasks, return_exceptions=True)
-                        
-                        # 按全局ID排序，保持原始顺序
-                        valid_results = []
-                        for result in image_results:
-                            if isinstance(result, Exception):
-                                logger.error(f"图片并发处理异常: {result}")
-                            else:
-                                valid_results.append(result)
-                        
-                        # 按全局ID排序
-                        valid_results.sort(key=lambda x: x['global_id'])
-                        
-                        # 按页面和图片索引重新组织内容
-                        page_content_map = {}
-                        for result in valid_results:
-                            page_num = result['page_num']
-                            if page_num not in page_content_map:
-                                page_content_map[page_num] = []
-                            page_content_map[page_num].append(result['content'])
-                        
-                        # 按页面顺序插入图片内容
-                        current_page = 1
-                        for page_num in sorted(page_content_map.keys()):
-                            # 如果当前页面没有文本内容，添加页面标题
-                            if not any("## 第 " in part for part in content_parts):
-                                content_parts.append(f"## 第 {page_num} 页\n")
-                            
-                            # 添加当前页面的图片内容
-                            content_parts.extend(page_content_map[page_num])
-                            current_page = page_num + 1
-                        
-                        logger.info(f"成功并发处理 {len(valid_results)} 张图片")
-                        
-                    except Exception as e:
-                        logger.error(f"图片并发处理失败: {e}")
-                        content_parts.append("### 图片处理失败\n\n*图片并发处理失败，已跳过所有图片*")
-            
-            raw_content = '\n\n'.join(content_parts)
-            
-            # 处理换行符
-            raw_content = raw_content.replace('\\n', '\n')
-            
-            # 将代码块转换为HTML标签
-            raw_content = self.convert_code_blocks_to_html(raw_content)
-            
-            # 格式化为统一的代码块格式
-            markdown_content = f"```document\n{raw_content or 'PDF文件为空或无法提取内容'}\n```"
-            
-            logger.info(f"成功解析PDF文件: {file_path} (仅OCR处理，不受图片数量限制，全文档并发处理)")
-            return markdown_content
-            
+            for chunk in chunks:
+                pending.append(asyncio.ensure_future(
+                    pdf_pool.run(extract_page_range, file_path, chunk, base_name)
+                ))
+                if len(pending) >= pdf_pool.max_workers:
+                    yield self._merge_cached(await pending.popleft(), content_hashes, cached)
+            while pending:
+                yield self._merge_cached(await pending.popleft(), content_hashes, cached)
+            if cached:
+                yield self._merge_cached([], content_hashes, cached)
+        finally:
+            for future in pending:
+                future.cancel()
+
+    async def _process_window(self, page_results: List[PdfPageResult]) -> List[ParseChunk]:
+        """
+        OCR一个窗口的图片并生成该窗口各页的内容，完成后窗口内的图片即可释放
+
+        已缓存的页面使用缓存的识别结果，新处理的页面写入分片缓存。
+        """
+        ocr_results = await self._ocr_pages([result for result in page_results if result.ocr_texts is None])
+        unit_records: Dict[str, str] = {}
+        for page_result in page_results:
+            if page_result.ocr_texts is not None:
+                ocr_results.update(page_result.ocr_texts)
+            elif page_result.content_hash:
+                record = page_result.to_record(ocr_results)
+                if record is not None:
+                    unit_records[page_result.content_hash] = record
+        if unit_records:
+            await cache_manager.cache_unit_results(self.cache_namespace(), "page", unit_records)
+
+        chunks = []
+        for page_result in page_results:
+            page_parts = self._format_page(page_result, ocr_results)
+            if not page_parts:
+                continue
+            # 处理换行符，并将代码块转换为HTML标签
+            page_content = '\n\n'.join(page_parts).replace('\\n', '\n')
+            page_content = self.convert_code_blocks_to_html(page_content)
+            chunks.append(ParseChunk(kind="page", index=page_result.page_num, text=page_content))
+        return chunks
+
+    async def iter_parse(self, file_path: str) -> AsyncIterator[ParseChunk]:
+        """解析PDF文件，按页码顺序流式产出页面内容"""
+        base_name = os.path.splitext(os.path.basename(file_path))[0]
+        strategy_counts = {PAGE_TEXT: 0, PAGE_OCR: 0, PAGE_BOTH: 0}
+        cached_pages = 0
+
+        # 流水线：逐窗口提取页面，窗口的OCR与后续窗口的提取并行，
+        # 在途OCR窗口数有上限，峰值内存与文档页数无关；已完成的窗口按顺序立即产出
+        inflight = asyncio.Semaphore(config.PDF_OCR_INFLIGHT_WINDOWS)
+        window_tasks: Deque[asyncio.Task] = deque()
+
+        async def process_window(page_results: List[PdfPageResult]) -> List[ParseChunk]:
+            try:
+                return await self._process_window(page_results)
+            finally:
+                inflight.release()
+
+        windows = self._iter_windows(file_path, base_name)
+        try:
+            async for page_results in windows:
+                for page_result in page_results:
+                    strategy_counts[page_result.strategy] += 1
+                    if page_result.ocr_texts is not None:
+                        cached_pages += 1
+                await inflight.acquire()
+                window_tasks.append(asyncio.create_task(process_window(page_results)))
+                del page_results
+
+                while window_tasks and window_tasks[0].done():
+                    for chunk in window_tasks.popleft().result():
+                        yield chunk
+
+            while window_tasks:
+                for chunk in await window_tasks.popleft():
+                    yield chunk
+
         except Exception as e:
             logger.error(f"解析PDF文件失败 {file_path}: {e}")
-            raise Exception(f"PDF文件解析错误: {str(e)}") 
\ No newline at end of file
+            raise Exception(f"PDF文件解析错误: {str(e)}")
+
+        finally:
+            # 调用方提前停止消费（如客户端断开）时取消在途OCR并关闭页面提取
+            for task in window_tasks:
+                task.cancel()
+            await windows.aclose()
+
+        logger.info(
+            f"PDF页面分类: 文本 {strategy_counts[PAGE_TEXT]} 页, 扫描 {strategy_counts[PAGE_OCR]} 页, "
+            f"文本+图片 {strategy_counts[PAGE_BOTH]} 页, 其中复用缓存 {cached_pages} 页"
+        )
+        logger.info(f"成功解析PDF文件: {file_path} (仅OCR处理，不受图片数量限制，按页面窗口流水线处理)")
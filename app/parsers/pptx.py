@@ -1,80 +1,122 @@
-from .base import BaseParser
+from .base import BaseParser, ParseChunk
 from loguru import logger
 from pptx import Presentation
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
 from app.vision import image_to_markdown
+from app.cache import cache_manager
 import io
 import os
+from typing import AsyncIterator
 
 class PptxParser(BaseParser):
     """PPTX文件解析器"""
     
+    block_type = "slideshow"
+    empty_content = "PowerPoint文件为空或无法提取内容"
+    uses_image_analysis = False
+    chunk_separator = "\n\n---\n\n"
+    
     @classmethod
     def get_supported_extensions(cls) -> list[str]:
         return ['.ppt', '.pptx']
     
-    async def parse(self, file_path: str) -> str:
-        """解析PPTX文件"""
+    @staticmethod
+    def _slide_hash(slide) -> str:
+        """幻灯片内容哈希（幻灯片XML，文本与形状均保存在其中，以及幻灯片引用的图片/音视频）"""
+        hasher = cache_manager.new_unit_hasher()
+        hasher.update(slide.part.blob)
+        for rel_id, rel in sorted(slide.part.rels.items()):
+            if not rel.is_external and rel.reltype in (RT.IMAGE, RT.MEDIA, RT.VIDEO, RT.AUDIO):
+                hasher.update(rel_id.encode('utf-8'))
+                hasher.update(rel.target_part.blob)
+        return hasher.hexdigest()
+    
+    def _slide_body(self, slide) -> str:
+        """提取单张幻灯片的正文内容（不含标题行），没有内容时返回空字符串"""
+        slide_content = []
+        
+        # 提取文本内容
+        for shape in slide.shapes:
+            text_attr = getattr(shape, "text", None)
+            if text_attr and text_attr.strip():
+                text = text_attr.strip()
+                # 处理标题和内容
+                if shape.shape_type == 1:  # 标题形状
+                    slide_content.append(f"### {text}")
+                else:
+                    # 处理列表项
+                    lines = text.split('\n')
+                    formatted_lines = []
+                    for line in lines:
+                        line = line.strip()
+                        if line:
+                            if line.startswith('•') or line.startswith('-'):
+                                formatted_lines.append(f"- {line[1:].strip()}")
+                            else:
+                                formatted_lines.append(line)
+                    slide_content.append('\n'.join(formatted_lines))
+            
+            # 处理图片 - 已禁用
+            # if hasattr(shape, "image"):
+            #     try:
+            #         # 提取图片数据
+            #         image = shape.image
+            #         image_bytes = image.blob
+            #         
+            #         # 保存为临时文件
+            #         temp_img_path = self.create_temp_file(suffix='.png', content=image_bytes)
+            #         
+            #         # 使用视觉模型解析图片
+            #         img_markdown = await image_to_markdown(temp_img_path)
+            #         slide_content.append(img_markdown)
+            #         
+            #     except Exception as img_error:
+            #         logger.warning(f"PPT图片处理失败 幻灯片{slide_idx}: {img_error}")
+            #         slide_content.append("*图片处理失败*")
+        
+        # 处理换行符
+        return '\n\n'.join(slide_content).replace('\\n', '\n')
+    
+    async def iter_parse(self, file_path: str) -> AsyncIterator[ParseChunk]:
+        """解析PPTX文件，逐张幻灯片产出内容，内容未变化的幻灯片复用分片缓存"""
         try:
             prs = Presentation(file_path)
-            content_parts = []
             
-            for slide_idx, slide in enumerate(prs.slides, 1):
-                slide_content = []
-                slide_content.append(f"## 幻灯片 {slide_idx}")
-                
-                # 提取文本内容
-                for shape in slide.shapes:
-                    text_attr = getattr(shape, "text", None)
-                    if text_attr and text_attr.strip():
-                        text = text_attr.strip()
-                        # 处理标题和内容
-                        if shape.shape_type == 1:  # 标题形状
-                            slide_content.append(f"### {text}")
-                        else:
-                            # 处理列表项
-                            lines = text.split('\n')
-                            formatted_lines = []
-                            for line in lines:
-                                line = line.strip()
-                                if line:
-                                    if line.startswith('•') or line.startswith('-'):
-                                        formatted_lines.append(f"- {line[1:].strip()}")
-                                    else:
-                                        formatted_lines.append(line)
-                            slide_content.append('\n'.join(formatted_lines))
-                    
-                    # 处理图片 - 已禁用
-                    # if hasattr(shape, "image"):
-                    #     try:
-                    #         # 提取图片数据
-                    #         image = shape.image
-                    #         image_bytes = image.blob
-                    #         
-                    #         # 保存为临时文件
-                    #         temp_img_path = self.create_temp_file(suffix='.png', content=image_bytes)
-                    #         
-                    #         # 使用视觉模型解析图片
-                    #         img_markdown = await image_to_markdown(temp_img_path)
-                    #         slide_content.append(img_markdown)
-                    #         
-                    #     except Exception as img_error:
-                    #         logger.warning(f"PPT图片处理失败 幻灯片{slide_idx}: {img_error}")
-                    #         slide_content.append("*图片处理失败*")
-                
-                if len(slide_content) > 1:  # 有内容才添加
-                    content_parts.append('\n\n'.join(slide_content))
+            # 幻灯片范围：优先使用 slides，未指定时沿用 pages
+            selector = self.options.slides or self.options.pages
             
-            raw_content = '\n\n---\n\n'.join(content_parts)
+            slides = []
+            for slide_idx, slide in enumerate(prs.slides, 1):
+                if selector is not None and slide_idx not in selector:
+                    if selector.last is not None and slide_idx > selector.last:
+                        break
+                    continue
+                slides.append((slide_idx, slide))
             
-            # 处理换行符
-            raw_content = raw_content.replace('\\n', '\n')
+            # 所有幻灯片一次批量查询；缓存的正文不含幻灯片序号，插入或删除幻灯片后其余幻灯片仍能命中
+            slide_hashes = {}
+            cached_bodies = {}
+            if cache_manager.unit_cache_enabled:
+                slide_hashes = {slide_idx: self._slide_hash(slide) for slide_idx, slide in slides}
+                cached_bodies = await cache_manager.get_unit_results(
+                    self.cache_namespace(), "slide", list(slide_hashes.values())
+                )
             
-            # 格式化为统一的代码块格式
-            markdown_content = f"```slideshow\n{raw_content or 'PowerPoint文件为空或无法提取内容'}\n```"
+            new_bodies = {}
+            for slide_idx, slide in slides:
+                content_hash = slide_hashes.get(slide_idx)
+                body = cached_bodies.get(content_hash) if content_hash else None
+                if body is None:
+                    body = self._slide_body(slide)
+                    if content_hash:
+                        new_bodies[content_hash] = body
+                
+                if body:  # 有内容才添加
+                    yield ParseChunk(kind="slide", index=slide_idx, text=f"## 幻灯片 {slide_idx}\n\n{body}")
             
+            await cache_manager.cache_unit_results(self.cache_namespace(), "slide", new_bodies)
             logger.info(f"成功解析PPTX文件: {file_path}")
-            return markdown_content
             
         except Exception as e:
             logger.error(f"解析PPTX文件失败 {file_path}: {e}")
-            raise Exception(f"PPTX文件解析错误: {str(e)}") 
\ No newline at end of file
+            raise Exception(f"PPTX文件解析错误: {str(e)}")
\ No newline at end of file
@@ -4,9 +4,8 @@ import chardet
 import os
 import asyncio
 import re
-from app.vision import get_ocr_text, call_vision_api_with_retry, vision_client
+from app.vision import get_ocr_text, vision_service
 from app.config import config
-import base64
 
 # 尝试导入SVG转换库
 try:
@@ -31,49 +30,47 @@ if not WAND_AVAILABLE and not CAIRO_AVAILABLE:
 class SvgParser(BaseParser):
     """SVG文件解析器 - 同时识别代码和视觉特征"""
     
+    uses_image_analysis = True
+    
     @classmethod
     def get_supported_extensions(cls) -> list[str]:
         return ['.svg']
     
-    async def _convert_svg_to_png(self, svg_path: str) -> str:
-        """将SVG文件转换为PNG格式以便视觉识别"""
+    async def _convert_svg_to_png(self, svg_path: str) -> bytes:
+        """将SVG文件转换为PNG格式以便视觉识别（在内存中完成，不写临时文件）"""
         if not WAND_AVAILABLE and not CAIRO_AVAILABLE:
             raise Exception("没有可用的SVG转换库，无法进行视觉识别")
         
-        # 创建临时PNG文件
-        temp_png_path = self.create_temp_file(suffix='.png')
-        
         try:
             if CAIRO_AVAILABLE:
                 # 优先使用CairoSVG（更轻量级）
-                await self._convert_with_cairo(svg_path, temp_png_path)
-            elif WAND_AVAILABLE:
+                png_data = await self._convert_with_cairo(svg_path)
+            else:
                 # 回退到ImageMagick
-                await self._convert_with_wand(svg_path, temp_png_path)
+                png_data = await self._convert_with_wand(svg_path)
             
-            logger.info(f"成功将SVG转换为PNG: {svg_path} -> {temp_png_path}")
-            return temp_png_path
+            logger.info(f"成功将SVG转换为PNG: {svg_path} ({len(png_data)} bytes)")
+            return png_data
             
         except Exception as e:
             logger.error(f"SVG转PNG失败 {svg_path}: {e}")
             raise Exception(f"SVG转换错误: {str(e)}")
     
-    async def _convert_with_cairo(self, svg_path: str, png_path: str):
+    async def _convert_with_cairo(self, svg_path: str) -> bytes:
         """使用CairoSVG转换SVG到PNG"""
         # 读取SVG内容
         with open(svg_path, 'r', encoding='utf-8') as f:
             svg_content = f.read()
         
         # 转换为PNG
-        cairosvg.svg2png(
+        return cairosvg.svg2png(
             bytestring=svg_content.encode('utf-8'),
-            write_to=png_path,
             output_width=800,  # 设置输出宽度
             output_height=600,  # 设置输出高度
             background_color='white'
         )
     
-    async def _convert_with_wand(self, svg_path: str, png_path: str):
+    async def _convert_with_wand(self, svg_path: str) -> bytes:
         """使用Wand(ImageMagick)转换SVG到PNG"""
         with WandImage() as img:
             with Color('white') as background_color:
@@ -120,26 +117,22 @@ class SvgParser(BaseParser):
             # 设置分辨率（限制最大分辨率）
             img.resolution = (min(150, 150), min(150, 150))
             
-            # 保存为PNG
-            img.save(filename=png_path)
+            # 输出PNG字节
+            return img.make_blob('png')
     
-    async def _get_vision_description(self, png_path: str) -> str:
+    async def _get_vision_description(self, png_data: bytes) -> str:
         """获取视觉模型描述"""
-        if not vision_client:
+        if not vision_service.enabled:
             return "视觉模型未配置，无法提供详细描述"
         
         try:
-            # 读取PNG图片并转换为base64
-            with open(png_path, "rb") as image_file:
-                base64_image = base64.b64encode(image_file.read()).decode('utf-8')
-            
             prompt = ("Please provide a detailed description of this SVG image, including: "
                      "1. Overall accurate description of the visual elements; "
                      "2. Main elements, shapes, colors, and structure; "
                      "3. If there are charts, diagrams, icons, or text elements, describe their content and layout; "
                      "4. Visual design characteristics and styling.")
             
-            vision_description = await call_vision_api_with_retry(base64_image, prompt)
+            vision_description = await vision_service.describe_image_data(png_data, prompt)
             return vision_description
             
         except Exception as e:
@@ -173,11 +166,11 @@ class SvgParser(BaseParser):
             if WAND_AVAILABLE or CAIRO_AVAILABLE:
                 try:
                     # 转换SVG到PNG
-                    png_path = await self._convert_svg_to_png(file_path)
+                    png_data = await self._convert_svg_to_png(file_path)
                     
                     # 并发执行OCR和视觉识别
-                    ocr_task = get_ocr_text(png_path)
-                    vision_task = self._get_vision_description(png_path)
+                    ocr_task = get_ocr_text(png_data)
+                    vision_task = self._get_vision_description(png_data)
                     
                     ocr_text, vision_description = await asyncio.gather(ocr_task, vision_task)
                     
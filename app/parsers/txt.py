@@ -8,6 +8,8 @@ from app.config import config
 class PlainParser(BaseParser):
     """纯文本文件解析器"""
     
+    cache_config_keys = ("MAX_TEXT_LINES", "MAX_TEXT_CHARS")
+    
     @classmethod
     def get_supported_extensions(cls) -> list[str]:
         return ['.txt', '.text', '.md', '.markdown']
@@ -0,0 +1,261 @@
+"""
+感知哈希近似重复图片检测模块
+
+扫描件和幻灯片中经常出现同一张图片以不同尺寸、不同压缩率重新编码的情况，
+按字节哈希的图片缓存无法命中。本模块为图片计算 dHash（灰度缩略图相邻像素差分），
+当新图片与已处理图片的汉明距离不超过配置阈值时，直接复用其OCR/视觉识别结果。
+
+- 进程内索引：覆盖单个文档内和同一进程内的跨文档复用，并能等待正在处理中的近似图片
+- Redis索引：按分段（pigeonhole）建立倒排集合，支持跨文档、跨副本检索
+"""
+import asyncio
+import io
+import math
+from dataclasses import dataclass
+from typing import Optional, Dict, List, Tuple, Union
+import numpy as np
+from PIL import Image
+from loguru import logger
+
+from app.config import config
+from app.cache import cache_manager
+
+
+@dataclass
+class ImageFingerprint:
+    """图片感知指纹"""
+    bits: np.ndarray
+    aspect_bucket: int
+
+    @property
+    def hex(self) -> str:
+        """十六进制表示"""
+        return np.packbits(self.bits).tobytes().hex()
+
+
+def _aspect_bucket(width: int, height: int) -> int:
+    """宽高比分桶，避免横幅与方形图标等比例差异很大的图片被误判为近似"""
+    if width <= 0 or height <= 0:
+        return 0
+    return int(round(math.log2(width / height) * 4))
+
+
+def _to_grayscale(image: Image.Image) -> Image.Image:
+    """透明图片先合成到白色背景上，避免透明区域的随机像素影响哈希"""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        rgba = image.convert('RGBA')
+        background = Image.new('RGBA', rgba.size, (255, 255, 255, 255))
+        return Image.alpha_composite(background, rgba).convert('L')
+    return image.convert('L')
+
+
+def compute_fingerprint(image: Union[bytes, Image.Image], hash_size: int) -> ImageFingerprint:
+    """
+    计算图片的 dHash 指纹（同步，CPU密集，应在线程中调用）
+
+    Args:
+        image: 图片字节，或已解码的PIL图片（复用解码结果）
+        hash_size: 哈希边长，指纹位数为 hash_size * hash_size
+
+    Returns:
+        图片指纹
+    """
+    if isinstance(image, Image.Image):
+        width, height = image.size
+        gray = _to_grayscale(image)
+    else:
+        with Image.open(io.BytesIO(image)) as opened:
+            width, height = opened.size
+
+            # JPEG 可在解码阶段直接缩小，避免解码完整分辨率
+            opened.draft('RGB', (hash_size * 8, hash_size * 8))
+            gray = _to_grayscale(opened)
+
+    thumbnail = gray.resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+    pixels = np.asarray(thumbnail, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+
+    return ImageFingerprint(bits=bits, aspect_bucket=_aspect_bucket(width, height))
+
+
+def _hex_to_bits(phash_hex: str) -> np.ndarray:
+    """十六进制指纹还原为位数组"""
+    return np.unpackbits(np.frombuffer(bytes.fromhex(phash_hex), dtype=np.uint8)).astype(bool)
+
+
+def split_bands(phash_hex: str, max_distance: int) -> List[Optional[str]]:
+    """
+    将指纹的位切分为 max_distance + 1 段（各段位数相差不超过1）
+
+    汉明距离不超过 max_distance 的两个指纹，至少有一段完全相同（抽屉原理），
+    因此只需按段精确匹配即可召回所有候选。
+    全0或全1的段（大面积纯色或单调渐变区域）在大量图片中相同，会形成热点集合，
+    以 None 表示，不写入也不查询Redis索引；这类图片仍可由进程内索引召回。
+
+    Args:
+        phash_hex: 十六进制指纹
+        max_distance: 最大汉明距离
+
+    Returns:
+        按段序号排列的分段值（十六进制），退化的段为 None
+
+    Raises:
+        ValueError: 段数超过指纹位数
+    """
+    bits = _hex_to_bits(phash_hex)
+    band_count = max_distance + 1
+    if band_count > bits.size:
+        raise ValueError(f"最大汉明距离 {max_distance} 超过指纹位数 {bits.size}")
+
+    bands: List[Optional[str]] = []
+    for band in np.array_split(bits, band_count):
+        if band.all() or not band.any():
+            bands.append(None)
+        else:
+            bands.append(np.packbits(band).tobytes().hex())
+    return bands
+
+
+class PerceptualHashIndex:
+    """
+    进程内感知哈希索引
+
+    使用固定容量的环形缓冲区保存指纹位矩阵，检索时用 NumPy 向量化计算汉明距离。
+    """
+
+    def __init__(self, capacity: int, hash_bits: int):
+        self.capacity = capacity
+        self._bits = np.zeros((capacity, hash_bits), dtype=bool)
+        self._buckets = np.zeros(capacity, dtype=np.int32)
+        self._used = np.zeros(capacity, dtype=bool)
+        self._image_hashes: List[Optional[str]] = [None] * capacity
+        self._slots: Dict[str, int] = {}
+        self._next_slot = 0
+        # 图片内容哈希 -> {(结果类型, 标识): 识别文本}
+        self.results: Dict[str, Dict[Tuple[str, str], str]] = {}
+
+    def find(self, fingerprint: ImageFingerprint, max_distance: int) -> Optional[str]:
+        """查找汉明距离最近且不超过阈值的图片，返回其内容哈希"""
+        candidates = np.flatnonzero(self._used & (self._buckets == fingerprint.aspect_bucket))
+        if candidates.size == 0:
+            return None
+
+        distances = np.count_nonzero(self._bits[candidates] != fingerprint.bits, axis=1)
+        best = int(np.argmin(distances))
+        if distances[best] > max_distance:
+            return None
+        return self._image_hashes[candidates[best]]
+
+    def add(self, fingerprint: ImageFingerprint, image_hash: str) -> None:
+        """加入索引，容量满时覆盖最早的条目"""
+        if image_hash in self._slots:
+            return
+
+        slot = self._next_slot
+        self._next_slot = (slot + 1) % self.capacity
+
+        evicted = self._image_hashes[slot]
+        if evicted is not None:
+            self._slots.pop(evicted, None)
+            self.results.pop(evicted, None)
+
+        self._bits[slot] = fingerprint.bits
+        self._buckets[slot] = fingerprint.aspect_bucket
+        self._used[slot] = True
+        self._image_hashes[slot] = image_hash
+        self._slots[image_hash] = slot
+
+
+class NearDuplicateDetector:
+    """近似重复图片检测器，组合进程内索引与Redis索引"""
+
+    def __init__(self, hash_size: int, max_distance: int, capacity: int):
+        self.hash_size = hash_size
+        self.max_distance = max_distance
+        self.local_index = PerceptualHashIndex(capacity, hash_size * hash_size)
+        self._pending: Dict[str, asyncio.Future] = {}
+        self.hit_count = 0
+
+    async def fingerprint(self, image: Union[bytes, Image.Image]) -> Optional[ImageFingerprint]:
+        """计算图片指纹，无法解码的图片返回None"""
+        try:
+            return await asyncio.to_thread(compute_fingerprint, image, self.hash_size)
+        except Exception as e:
+            logger.debug(f"感知哈希计算失败，跳过近似检测: {e}")
+            return None
+
+    async def find_similar(self, fingerprint: ImageFingerprint) -> Optional[str]:
+        """先查进程内索引，再查Redis索引，返回近似图片的内容哈希"""
+        image_hash = self.local_index.find(fingerprint, self.max_distance)
+        if image_hash:
+            return image_hash
+
+        phash_hex = fingerprint.hex
+        candidates = await cache_manager.find_phash_candidates(
+            fingerprint.aspect_bucket, split_bands(phash_hex, self.max_distance)
+        )
+        if not candidates:
+            return None
+
+        # 候选条目格式: "{指纹}:{图片内容哈希}"
+        candidate_hexes = [item.split(':', 1) for item in candidates]
+        candidate_bits = np.stack([_hex_to_bits(h) for h, _ in candidate_hexes])
+        distances = np.count_nonzero(candidate_bits != fingerprint.bits, axis=1)
+        best = int(np.argmin(distances))
+        if distances[best] > self.max_distance:
+            return None
+        return candidate_hexes[best][1]
+
+    def is_similar(self, first: ImageFingerprint, second: ImageFingerprint) -> bool:
+        """判断两个指纹是否为近似图片"""
+        return (first.aspect_bucket == second.aspect_bucket
+                and int(np.count_nonzero(first.bits != second.bits)) <= self.max_distance)
+
+    async def get_result(self, image_hash: str, kind: str, identity: str) -> Optional[str]:
+        """获取近似图片的识别结果，若其仍在处理中则等待完成"""
+        pending = self._pending.get(image_hash)
+        if pending is not None:
+            await asyncio.shield(pending)
+
+        local_results = self.local_index.results.get(image_hash, {})
+        if (kind, identity) in local_results:
+            return local_results[(kind, identity)]
+        return await cache_manager.get_image_result(kind, identity, image_hash)
+
+    def begin(self, fingerprint: ImageFingerprint, image_hash: str) -> bool:
+        """登记正在处理的图片，使并发的近似图片可以等待其结果"""
+        if image_hash in self._pending:
+            return False
+        self.local_index.add(fingerprint, image_hash)
+        self._pending[image_hash] = asyncio.get_running_loop().create_future()
+        return True
+
+    async def complete(self, fingerprint: ImageFingerprint, image_hash: str,
+                       results: Dict[Tuple[str, str], str]) -> None:
+        """记录识别结果并唤醒等待者"""
+        self.local_index.results.setdefault(image_hash, {}).update(results)
+        self._release(image_hash)
+
+        if results:
+            phash_hex = fingerprint.hex
+            await cache_manager.add_phash_entry(
+                fingerprint.aspect_bucket, split_bands(phash_hex, self.max_distance),
+                f"{phash_hex}:{image_hash}"
+            )
+
+    def abort(self, image_hash: str) -> None:
+        """处理失败时释放登记"""
+        self._release(image_hash)
+
+    def _release(self, image_hash: str) -> None:
+        pending = self._pending.pop(image_hash, None)
+        if pending is not None and not pending.done():
+            pending.set_result(None)
+
+
+# 全局近似重复检测器
+near_duplicate_detector = NearDuplicateDetector(
+    hash_size=config.IMAGE_PHASH_SIZE,
+    max_distance=config.IMAGE_PHASH_MAX_DISTANCE,
+    capacity=config.IMAGE_PHASH_LOCAL_SIZE
+)
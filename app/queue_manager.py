@@ -6,12 +6,15 @@ from datetime import datetime
 import uuid
 from loguru import logger
 from fastapi import UploadFile
-import tempfile
 import os
 from pathlib import Path
 
 from app.parsers.registry import parser_registry
+from app.parsers.base import ParseOptions
 from app.cache import cache_manager
+from app.singleflight import conversion_flight, flight_key
+from app.exceptions import FileSizeError
+from app.utils import spool_upload
 
 
 class TaskStatus(Enum):
@@ -37,6 +40,8 @@ class ConversionTask:
     result: Optional[str] = None
     error: Optional[str] = None
     duration_ms: Optional[int] = None
+    options: ParseOptions = field(default_factory=ParseOptions)
+    file_hash: str = ""
 
 
 class ConversionQueueManager:
@@ -148,12 +153,21 @@ class ConversionQueueManager:
                 
                 logger.info(f"开始处理任务: {task.filename} (ID: {task_id})")
                 
-                # 读取文件内容用于缓存检查
-                with open(task.temp_file_path, 'rb') as f:
-                    file_content = f.read()
+                # 获取文件扩展名
+                file_extension = Path(task.filename).suffix.lower()
                 
-                # 检查缓存
-                cached_result = await cache_manager.get_cached_result(file_content)
+                # 获取解析器，缓存命名空间由解析器决定
+                parser_class = parser_registry.get_parser(file_extension)
+                if parser_class is None:
+                    raise ValueError(f"未找到文件类型 {file_extension} 的解析器")
+                cache_variant = task.options.cache_variant()
+                cache_namespace = parser_class.cache_namespace()
+                
+                # 检查缓存（文件哈希已在上传落盘时计算）
+                cached_result = await cache_manager.get_cached_result(
+                    variant=cache_variant, file_hash=task.file_hash, namespace=cache_namespace,
+                    file_path=task.temp_file_path, legacy_lookup=parser_class.legacy_cache_compatible
+                )
                 if cached_result:
                     # 使用缓存结果
                     task.status = TaskStatus.COMPLETED
@@ -164,46 +178,56 @@ class ConversionQueueManager:
                     logger.info(f"任务从缓存完成: {task.filename} (ID: {task_id}), 耗时: {task.duration_ms}ms (缓存命中)")
                     return
                 
-                # 获取文件扩展名
-                file_extension = Path(task.filename).suffix.lower()
-                
-                # 获取解析器
-                parser_class = parser_registry.get_parser(file_extension)
-                if parser_class is None:
-                    raise ValueError(f"未找到文件类型 {file_extension} 的解析器")
-                parser_instance = parser_class()
-                
-                # 执行文件转换
-                start_time = datetime.now()
-                markdown_content = await parser_instance.parse(task.temp_file_path)
-                end_time = datetime.now()
+                async def run_conversion() -> str:
+                    parser_instance = parser_class(task.options)
+                    try:
+                        # 执行文件转换
+                        start_time = datetime.now()
+                        markdown_content = await parser_instance.parse(task.temp_file_path)
+                        duration_ms = int((datetime.now() - start_time).total_seconds() * 1000)
+                        
+                        # 缓存结果
+                        await cache_manager.cache_result(
+                            file_content=None,
+                            filename=task.filename,
+                            markdown_content=markdown_content,
+                            file_size=task.file_size,
+                            duration_ms=duration_ms,
+                            content_type=task.content_type,
+                            variant=cache_variant,
+                            file_hash=task.file_hash,
+                            namespace=cache_namespace
+                        )
+                        return markdown_content
+                    finally:
+                        # 清理解析器临时文件
+                        try:
+                            parser_instance.cleanup()
+                        except Exception as cleanup_error:
+                            logger.warning(f"解析器清理失败 (任务 {task_id}): {cleanup_error}")
                 
-                # 计算处理时间
-                duration_ms = int((end_time - start_time).total_seconds() * 1000)
+                async def lookup_result() -> Optional[str]:
+                    cached = await cache_manager.get_cached_result(
+                        variant=cache_variant, file_hash=task.file_hash, namespace=cache_namespace,
+                        legacy_lookup=False, count_stats=False
+                    )
+                    return cached["content"] if cached else None
                 
-                # 缓存结果
-                await cache_manager.cache_result(
-                    file_content=file_content,
-                    filename=task.filename,
-                    markdown_content=markdown_content,
-                    file_size=task.file_size,
-                    duration_ms=duration_ms,
-                    content_type=task.content_type
+                # 同一批次或其他请求中的相同文件只解析一次
+                markdown_content, shared = await conversion_flight.do(
+                    flight_key(cache_namespace, task.file_hash, cache_variant), run_conversion, lookup_result
                 )
                 
                 # 更新任务结果
                 task.status = TaskStatus.COMPLETED
-                task.completed_at = end_time
+                task.completed_at = datetime.now()
                 task.result = markdown_content
-                task.duration_ms = duration_ms
-                
-                logger.info(f"任务处理完成: {task.filename} (ID: {task_id}), 耗时: {duration_ms}ms")
+                task.duration_ms = int((task.completed_at - task.started_at).total_seconds() * 1000)
                 
-                # 清理解析器临时文件
-                try:
-                    parser_instance.cleanup()
-                except Exception as cleanup_error:
-                    logger.warning(f"解析器清理失败 (任务 {task_id}): {cleanup_error}")
+                logger.info(
+                    f"任务处理完成: {task.filename} (ID: {task_id}), 耗时: {task.duration_ms}ms"
+                    + (" (复用并发请求结果)" if shared else "")
+                )
                 
             except Exception as e:
                 # 处理失败
@@ -225,8 +249,17 @@ class ConversionQueueManager:
                 if task_id in self.active_tasks:
                     del self.active_tasks[task_id]
     
-    async def submit_task(self, file: UploadFile) -> str:
-        """提交文件转换任务到队列"""
+    async def submit_task(self, file: UploadFile, options: Optional[ParseOptions] = None) -> str:
+        """
+        提交文件转换任务到队列
+        
+        Args:
+            file: 上传的文件
+            options: 解析选项（页码/幻灯片/工作表范围），None表示解析全部内容
+            
+        Returns:
+            任务ID
+        """
         from app.config import config
         
         # 验证文件
@@ -244,57 +277,28 @@ class ConversionQueueManager:
         # 生成任务ID
         task_id = str(uuid.uuid4())
         
-        # 保存上传的文件到临时位置
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=file_extension)
-        temp_file_path = temp_file.name
+        # 流式写入临时文件，同时计算文件哈希并检查大小，内存占用与文件大小无关
+        try:
+            spooled = await spool_upload(file, suffix=file_extension, max_size=config.MAX_FILE_SIZE)
+        except FileSizeError as e:
+            raise ValueError(
+                f"文件过大: {e.details['file_size']} bytes，最大允许: {config.MAX_FILE_SIZE} bytes "
+                f"({config.MAX_FILE_SIZE // 1024 // 1024} MB)"
+            )
         
         try:
-            # 使用流式读取检查文件大小，避免内存耗尽
-            file_size = 0
-            content = b""
-            chunk_size = 8192  # 8KB 块大小
-            
-            while True:
-                chunk = await file.read(chunk_size)
-                if not chunk:
-                    break
-                file_size += len(chunk)
-                
-                # 检查是否超过大小限制，避免继续读取和内存耗尽
-                if file_size > config.MAX_FILE_SIZE:
-                    # 立即关闭并清理临时文件
-                    temp_file.close()
-                    if os.path.exists(temp_file_path):
-                        try:
-                            os.unlink(temp_file_path)
-                        except:
-                            pass
-                    raise ValueError(
-                        f"文件过大: {file_size} bytes，最大允许: {config.MAX_FILE_SIZE} bytes "
-                        f"({config.MAX_FILE_SIZE // 1024 // 1024} MB)"
-                    )
-                content += chunk
-            
-            if file_size == 0:
-                temp_file.close()
-                if os.path.exists(temp_file_path):
-                    try:
-                        os.unlink(temp_file_path)
-                    except:
-                        pass
+            if spooled.size == 0:
                 raise ValueError("文件为空")
             
-            # 写入文件内容
-            temp_file.write(content)
-            temp_file.close()
-            
             # 创建任务
             task = ConversionTask(
                 task_id=task_id,
                 filename=file.filename,
-                file_size=file_size,
+                file_size=spooled.size,
                 content_type=file.content_type or "application/octet-stream",
-                temp_file_path=temp_file_path
+                temp_file_path=spooled.path,
+                options=options or ParseOptions(),
+                file_hash=spooled.file_hash
             )
             
             # 保存任务到字典
@@ -303,15 +307,15 @@ class ConversionQueueManager:
             # 将任务ID加入队列
             await self.queue.put(task_id)
             
-            logger.info(f"任务已提交到队列: {file.filename} (ID: {task_id}), 大小: {file_size} bytes")
+            logger.info(f"任务已提交到队列: {file.filename} (ID: {task_id}), 大小: {spooled.size} bytes")
             
             return task_id
             
         except Exception as e:
             # 如果出错，清理临时文件
-            if os.path.exists(temp_file_path):
+            if os.path.exists(spooled.path):
                 try:
-                    os.unlink(temp_file_path)
+                    os.unlink(spooled.path)
                 except:
                     pass
             raise e
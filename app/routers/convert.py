@@ -1,12 +1,11 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from loguru import logger
 import os
 import time
-import tempfile
 from pathlib import Path
 import json
-from typing import List
+from typing import List, Optional, AsyncIterator
 
 from app.config import config
 from app.auth import get_api_key
@@ -16,8 +15,12 @@ from app.models import (
     CacheStatsResponse, OCRResponse
 )
 from app.parsers.registry import parser_registry
+from app.parsers.base import BaseParser, ParseChunk, ParseOptions
 from app.queue_manager import TaskStatus
-from app.cache import cache_manager
+from app.cache import build_cache_namespace, cache_manager
+from app.singleflight import conversion_flight, flight_key
+from app.exceptions import FileSizeError
+from app.utils import SpooledUpload, spool_upload
 
 # 自定义JSON响应类，确保中文字符正确显示
 class UnicodeJSONResponse(JSONResponse):
@@ -56,11 +59,116 @@ def log_conversion_result(filename: str, content: str, file_size: int) -> None:
         lines_count = content.count('\n') + 1
         logger.info(f"转换结果摘要: {content_length} 字符, {lines_count} 行")
 
+def build_parse_options(pages: Optional[str], slides: Optional[str], sheets: Optional[str]) -> ParseOptions:
+    """
+    根据请求参数构造解析选项
+    
+    Raises:
+        HTTPException: 页码范围格式无效
+    """
+    try:
+        return ParseOptions.from_request(pages=pages, slides=slides, sheets=sheets)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=422,
+            detail={
+                "code": "INVALID_OPTIONS",
+                "message": f"解析选项无效: {str(e)}"
+            }
+        )
+
+async def spool_upload_file(file: UploadFile) -> SpooledUpload:
+    """
+    验证上传文件并流式写入临时文件，同时计算文件哈希
+    
+    上传内容只遍历一次，不在内存中保留完整副本，超出大小限制时立即停止读取。
+    
+    Raises:
+        HTTPException: 文件名为空、文件为空或文件过大
+    """
+    if not file.filename:
+        raise HTTPException(
+            status_code=422,
+            detail={
+                "code": "INVALID_FILE",
+                "message": "文件名不能为空"
+            }
+        )
+    
+    try:
+        spooled = await spool_upload(file, suffix=Path(file.filename).suffix.lower(), max_size=config.MAX_FILE_SIZE)
+    except FileSizeError as e:
+        raise HTTPException(
+            status_code=413,
+            detail={
+                "code": "FILE_TOO_LARGE",
+                "message": f"文件过大: {e.details['file_size']} bytes，最大允许: {config.MAX_FILE_SIZE} bytes ({config.MAX_FILE_SIZE // 1024 // 1024} MB)"
+            }
+        )
+    
+    # 检查文件大小
+    if spooled.size == 0:
+        remove_temp_file(spooled.path)
+        raise HTTPException(
+            status_code=422,
+            detail={
+                "code": "EMPTY_FILE",
+                "message": "文件为空"
+            }
+        )
+    
+    return spooled
+
+def remove_temp_file(temp_file_path: Optional[str]) -> None:
+    """删除临时文件，失败时仅记录警告"""
+    if temp_file_path and os.path.exists(temp_file_path):
+        try:
+            os.unlink(temp_file_path)
+        except Exception as cleanup_error:
+            logger.warning(f"临时文件清理失败: {cleanup_error}")
+
+def ocr_cache_namespace() -> str:
+    """/ocr 接口结果的缓存命名空间，OCR引擎或置信度阈值变化时随之变化"""
+    from app.vision import ocr_cache_identity
+    return build_cache_namespace("ocr", 1, {"ocr": ocr_cache_identity()})
+
+def resolve_parser_class(file_extension: str):
+    """
+    获取文件扩展名对应的解析器类
+    
+    Raises:
+        HTTPException: 不支持的文件类型
+    """
+    if not parser_registry.is_supported(file_extension):
+        supported_exts = parser_registry.get_supported_extensions()
+        raise HTTPException(
+            status_code=415,
+            detail={
+                "code": "UNSUPPORTED_TYPE",
+                "message": f"不支持的文件类型: {file_extension}",
+                "supported_types": supported_exts
+            }
+        )
+    
+    parser_class = parser_registry.get_parser(file_extension)
+    if parser_class is None:
+        raise HTTPException(
+            status_code=415,
+            detail={
+                "code": "PARSER_NOT_FOUND",
+                "message": f"未找到文件类型 {file_extension} 的解析器"
+            }
+        )
+    return parser_class
+
 router = APIRouter()
 
 @router.post("/convert", response_model=ConvertResponse)
 async def convert_file(
     file: UploadFile = File(...),
+    pages: Optional[str] = Form(None, description="PDF/DOCX 页码范围，如 1-5,8,10-"),
+    slides: Optional[str] = Form(None, description="PPTX 幻灯片范围，未指定时使用 pages"),
+    sheets: Optional[str] = Form(None, description="Excel 工作表名称或序号，逗号分隔"),
     api_key: str = Depends(get_api_key)
 ):
     """
@@ -68,45 +176,26 @@ async def convert_file(
     """
     start_time = time.time()
     temp_file_path = None
-    parser_instance = None
+    options = build_parse_options(pages, slides, sheets)
+    cache_variant = options.cache_variant()
     
     try:
-        # 验证文件
-        if not file.filename:
-            raise HTTPException(
-                status_code=422,
-                detail={
-                    "code": "INVALID_FILE",
-                    "message": "文件名不能为空"
-                }
-            )
-        
-        # 先快速读取文件内容用于缓存检查
-        content = await file.read()
-        file_size = len(content)
+        # 验证文件并写入临时文件，同时计算缓存检查所需的文件哈希
+        spooled = await spool_upload_file(file)
+        temp_file_path = spooled.path
+        file_size = spooled.size
         
-        # 检查文件大小
-        if file_size == 0:
-            raise HTTPException(
-                status_code=422,
-                detail={
-                    "code": "EMPTY_FILE",
-                    "message": "文件为空"
-                }
-            )
-        
-        if file_size > config.MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=413,
-                detail={
-                    "code": "FILE_TOO_LARGE",
-                    "message": f"文件过大: {file_size} bytes，最大允许: {config.MAX_FILE_SIZE} bytes ({config.MAX_FILE_SIZE // 1024 // 1024} MB)"
-                }
-            )
+        # 检查是否支持该文件类型并获取解析器，缓存命名空间由解析器决定
+        file_extension = Path(file.filename).suffix.lower()
+        parser_class = resolve_parser_class(file_extension)
+        cache_namespace = parser_class.cache_namespace()
         
         # 优先检查缓存，避免不必要的文件处理
         cache_check_start = time.time()
-        cached_result = await cache_manager.get_cached_result(content)
+        cached_result = await cache_manager.get_cached_result(
+            variant=cache_variant, file_hash=spooled.file_hash, namespace=cache_namespace,
+            file_path=spooled.path, legacy_lookup=parser_class.legacy_cache_compatible
+        )
         if cached_result:
             # 计算缓存检查的实际耗时
             cache_duration_ms = int((time.time() - cache_check_start) * 1000)
@@ -120,67 +209,58 @@ async def convert_file(
             logger.info(f"从缓存返回结果: {file.filename} (缓存查询: {cache_duration_ms}ms, 总耗时: {total_duration_ms}ms)")
             return UnicodeJSONResponse(content=cached_result)
         
-        # 获取文件扩展名
-        file_extension = Path(file.filename).suffix.lower()
-        
-        # 检查是否支持该文件类型
-        if not parser_registry.is_supported(file_extension):
-            supported_exts = parser_registry.get_supported_extensions()
-            raise HTTPException(
-                status_code=415,
-                detail={
-                    "code": "UNSUPPORTED_TYPE",
-                    "message": f"不支持的文件类型: {file_extension}",
-                    "supported_types": supported_exts
-                }
-            )
-        
-        # 保存上传的文件到临时位置
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=file_extension)
-        temp_file_path = temp_file.name
-        
-        # 写入文件内容
-        temp_file.write(content)
-        temp_file.close()
-        
-        # 获取解析器
-        parser_class = parser_registry.get_parser(file_extension)
-        if parser_class is None:
-            raise HTTPException(
-                status_code=415,
-                detail={
-                    "code": "PARSER_NOT_FOUND",
-                    "message": f"未找到文件类型 {file_extension} 的解析器"
-                }
+        async def run_conversion() -> str:
+            parser_instance = parser_class(options)
+            try:
+                # 解析文件
+                markdown_content = await parser_instance.parse(temp_file_path)
+                
+                duration_ms = int((time.time() - start_time) * 1000)
+                log_conversion_result(file.filename, markdown_content, file_size)
+                
+                # 缓存解析结果，等待中的其他副本从缓存读取
+                await cache_manager.cache_result(
+                    file_content=None,
+                    filename=file.filename,
+                    markdown_content=markdown_content,
+                    file_size=file_size,
+                    duration_ms=duration_ms,
+                    content_type=file.content_type,
+                    variant=cache_variant,
+                    file_hash=spooled.file_hash,
+                    namespace=cache_namespace
+                )
+                return markdown_content
+            finally:
+                # 清理解析器临时文件
+                try:
+                    parser_instance.cleanup()
+                except Exception as cleanup_error:
+                    logger.warning(f"解析器清理失败: {cleanup_error}")
+        
+        async def lookup_result() -> Optional[str]:
+            cached = await cache_manager.get_cached_result(
+                variant=cache_variant, file_hash=spooled.file_hash, namespace=cache_namespace,
+                legacy_lookup=False, count_stats=False
             )
-        parser_instance = parser_class()
+            return cached["content"] if cached else None
         
-        # 解析文件
-        markdown_content = await parser_instance.parse(temp_file_path)
+        # 相同文件的并发请求只解析一次
+        markdown_content, shared = await conversion_flight.do(
+            flight_key(cache_namespace, spooled.file_hash, cache_variant), run_conversion, lookup_result
+        )
         
         # 计算处理时间
         duration_ms = int((time.time() - start_time) * 1000)
         
-        log_conversion_result(file.filename, markdown_content, len(content))
-        
-        # 缓存解析结果
-        await cache_manager.cache_result(
-            file_content=content,
-            filename=file.filename,
-            markdown_content=markdown_content,
-            file_size=file_size,
-            duration_ms=duration_ms,
-            content_type=file.content_type
-        )
-        
         # 使用自定义响应类确保中文正确显示
         response_data = {
             "filename": file.filename,
-            "size": len(content),
+            "size": file_size,
             "content_type": file.content_type or "application/octet-stream",
             "content": markdown_content,
             "duration_ms": duration_ms,
-            "from_cache": False
+            "from_cache": shared
         }
         
         return UnicodeJSONResponse(content=response_data)
@@ -202,27 +282,213 @@ async def convert_file(
         
     finally:
         # 清理临时文件
-        if temp_file_path and os.path.exists(temp_file_path):
-            try:
-                os.unlink(temp_file_path)
-            except Exception as cleanup_error:
-                logger.warning(f"临时文件清理失败: {cleanup_error}")
+        remove_temp_file(temp_file_path)
+
+def format_stream_event(event: str, data: dict, stream_format: str) -> bytes:
+    """
+    编码流式响应中的一个事件
+    
+    Args:
+        event: 事件类型（start/chunk/end/error）
+        data: 事件数据
+        stream_format: ndjson 或 sse
+    """
+    if stream_format == "sse":
+        payload = json.dumps(data, ensure_ascii=False)
+        return f"event: {event}\ndata: {payload}\n\n".encode("utf-8")
+    payload = json.dumps({"event": event, **data}, ensure_ascii=False)
+    return f"{payload}\n".encode("utf-8")
+
+async def stream_conversion(
+    parser_instance: BaseParser,
+    spooled: SpooledUpload,
+    filename: str,
+    content_type: Optional[str],
+    cache_variant: str,
+    stream_format: str,
+    start_time: float
+) -> AsyncIterator[bytes]:
+    """
+    逐片段输出解析结果，解析完成后写入缓存
+    
+    客户端断开时生成器被关闭，解析器停止后续页面的处理，临时文件随之清理。
+    """
+    file_size = spooled.size
+    chunks: List[ParseChunk] = []
+    started = False
+    
+    def start_event() -> bytes:
+        # 解析器可能在开始解析后才确定代码块类型（如音频/视频），start 事件在首个片段前发送
+        return format_stream_event("start", {
+            "filename": filename,
+            "size": file_size,
+            "content_type": content_type or "application/octet-stream",
+            "block_type": parser_instance.block_type,
+            "separator": parser_instance.chunk_separator
+        }, stream_format)
+    
+    try:
+        async for chunk in parser_instance.iter_parse(spooled.path):
+            if not started:
+                started = True
+                yield start_event()
+            chunks.append(chunk)
+            yield format_stream_event("chunk", {
+                "kind": chunk.kind,
+                "index": chunk.index,
+                "text": chunk.text
+            }, stream_format)
+        
+        if not started:
+            started = True
+            yield start_event()
+        
+        markdown_content = parser_instance.assemble(chunks)
+        duration_ms = int((time.time() - start_time) * 1000)
+        log_conversion_result(filename, markdown_content, file_size)
+        
+        # 缓存完整结果，与 /convert 共用缓存
+        await cache_manager.cache_result(
+            file_content=None,
+            filename=filename,
+            markdown_content=markdown_content,
+            file_size=file_size,
+            duration_ms=duration_ms,
+            content_type=content_type,
+            variant=cache_variant,
+            file_hash=spooled.file_hash,
+            namespace=parser_instance.cache_namespace()
+        )
+        
+        yield format_stream_event("end", {
+            "chunks": len(chunks),
+            "duration_ms": duration_ms,
+            "from_cache": False
+        }, stream_format)
+        
+    except Exception as e:
+        # 响应头已发送，错误以事件形式通知客户端
+        logger.error(f"流式文件转换失败 {filename}: {e}")
+        yield format_stream_event("error", {
+            "code": "PARSE_ERROR",
+            "message": "文件解析失败",
+            "detail": str(e)
+        }, stream_format)
+        
+    finally:
+        # 清理临时文件
+        remove_temp_file(spooled.path)
         
         # 清理解析器临时文件
-        if parser_instance:
-            try:
-                parser_instance.cleanup()
-            except Exception as cleanup_error:
-                logger.warning(f"解析器清理失败: {cleanup_error}")
+        try:
+            parser_instance.cleanup()
+        except Exception as cleanup_error:
+            logger.warning(f"解析器清理失败: {cleanup_error}")
+
+async def stream_cached_result(cached_result: dict, filename: str, stream_format: str,
+                               start_time: float) -> AsyncIterator[bytes]:
+    """以单个片段输出缓存的完整结果"""
+    yield format_stream_event("start", {
+        "filename": filename,
+        "size": cached_result.get("size"),
+        "content_type": cached_result.get("content_type"),
+        "block_type": None,
+        "separator": "\n\n"
+    }, stream_format)
+    yield format_stream_event("chunk", {
+        "kind": "document",
+        "index": 0,
+        "text": cached_result["content"]
+    }, stream_format)
+    yield format_stream_event("end", {
+        "chunks": 1,
+        "duration_ms": int((time.time() - start_time) * 1000),
+        "from_cache": True
+    }, stream_format)
+
+@router.post("/convert/stream")
+async def convert_file_stream(
+    request: Request,
+    file: UploadFile = File(...),
+    format: Optional[str] = Form(None, description="输出格式：ndjson 或 sse，未指定时根据 Accept 头判断"),
+    pages: Optional[str] = Form(None, description="PDF/DOCX 页码范围，如 1-5,8,10-"),
+    slides: Optional[str] = Form(None, description="PPTX 幻灯片范围，未指定时使用 pages"),
+    sheets: Optional[str] = Form(None, description="Excel 工作表名称或序号，逗号分隔"),
+    api_key: str = Depends(get_api_key)
+):
+    """
+    将上传的文件流式转换为Markdown格式
+    
+    解析器按页/幻灯片/片段产出内容，每个片段完成后立即发送，客户端无需等待整篇文档处理完毕。
+    响应为 NDJSON（每行一个事件）或 SSE，事件依次为 start、若干 chunk、end，出错时以 error 事件结束。
+    以 start 事件中的 separator 拼接 chunk 文本，再用 block_type 作为代码块类型包裹，即得到与 /convert 相同的内容。
+    """
+    start_time = time.time()
+    options = build_parse_options(pages, slides, sheets)
+    cache_variant = options.cache_variant()
+    
+    if format is None:
+        format = "sse" if "text/event-stream" in request.headers.get("accept", "") else "ndjson"
+    stream_format = format.lower()
+    if stream_format not in ("ndjson", "sse"):
+        raise HTTPException(
+            status_code=422,
+            detail={
+                "code": "INVALID_OPTIONS",
+                "message": f"不支持的输出格式: {format}，仅支持 ndjson 或 sse"
+            }
+        )
+    media_type = "text/event-stream" if stream_format == "sse" else "application/x-ndjson"
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    
+    spooled = await spool_upload_file(file)
+    try:
+        file_extension = Path(file.filename or "").suffix.lower()
+        parser_class = resolve_parser_class(file_extension)
+        
+        cached_result = await cache_manager.get_cached_result(
+            variant=cache_variant, file_hash=spooled.file_hash, namespace=parser_class.cache_namespace(),
+            file_path=spooled.path, legacy_lookup=parser_class.legacy_cache_compatible
+        )
+        if cached_result:
+            remove_temp_file(spooled.path)
+            logger.info(f"从缓存流式返回结果: {file.filename}")
+            return StreamingResponse(
+                stream_cached_result(cached_result, file.filename or "", stream_format, start_time),
+                media_type=media_type,
+                headers=headers
+            )
+        
+        parser_instance = parser_class(options)
+    except BaseException:
+        remove_temp_file(spooled.path)
+        raise
+    
+    # 临时文件由流式生成器结束时清理
+    return StreamingResponse(
+        stream_conversion(
+            parser_instance, spooled, file.filename or "",
+            file.content_type, cache_variant, stream_format, start_time
+        ),
+        media_type=media_type,
+        headers=headers
+    )
 
 @router.post("/convert-batch", response_model=BatchSubmitResponse)
 async def convert_batch_files(
     files: List[UploadFile] = File(...),
+    pages: Optional[str] = Form(None, description="PDF/DOCX 页码范围，如 1-5,8,10-"),
+    slides: Optional[str] = Form(None, description="PPTX 幻灯片范围，未指定时使用 pages"),
+    sheets: Optional[str] = Form(None, description="Excel 工作表名称或序号，逗号分隔"),
     api_key: str = Depends(get_api_key)
 ):
     """
     批量提交文件转换任务到队列（异步处理，基于配置的并发数）
+    
+    页码/幻灯片/工作表选择对本批次所有文件生效。
     """
+    options = build_parse_options(pages, slides, sheets)
+
     # 获取队列管理器实例
     from app.main import queue_manager
     
@@ -236,7 +502,7 @@ async def convert_batch_files(
     for file in files:
         try:
             # 提交任务到队列
-            task_id = await queue_manager.submit_task(file)
+            task_id = await queue_manager.submit_task(file, options)
             
             submitted_tasks.append(TaskSubmitResponse(
                 task_id=task_id,
@@ -377,6 +643,11 @@ async def clear_cache(api_key: str = Depends(get_api_key)):
     清除所有缓存数据
     """
     cleared_count = await cache_manager.clear_cache()
+    # 同时清除按图片内容缓存的OCR/视觉识别结果及感知哈希索引
+    cleared_count += await cache_manager.clear_cache("file2md:img:*")
+    # 以及按页/工作表/幻灯片缓存的分片结果
+    cleared_count += await cache_manager.clear_cache("file2md:unit:*")
+    await cache_manager.clear_cache("file2md:phash:*")
     
     response_data = {
         "message": f"成功清除 {cleared_count} 条缓存记录",
@@ -399,44 +670,11 @@ async def ocr_image(
     temp_file_path = None
     
     try:
-        # 验证文件
-        if not file.filename:
-            raise HTTPException(
-                status_code=422,
-                detail={
-                    "code": "INVALID_FILE",
-                    "message": "文件名不能为空"
-                }
-            )
-        
-        # 先快速读取文件内容用于缓存检查
-        content = await file.read()
-        file_size = len(content)
-        
-        # 检查文件大小
-        if file_size == 0:
-            raise HTTPException(
-                status_code=422,
-                detail={
-                    "code": "EMPTY_FILE",
-                    "message": "文件为空"
-                }
-            )
-        
-        if file_size > config.MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=413,
-                detail={
-                    "code": "FILE_TOO_LARGE",
-                    "message": f"文件过大: {file_size} bytes，最大允许: {config.MAX_FILE_SIZE} bytes ({config.MAX_FILE_SIZE // 1024 // 1024} MB)"
-                }
-            )
-        
         # 检查文件类型是否为图片
-        file_extension = Path(file.filename).suffix.lower()
+        file_extension = Path(file.filename or "").suffix.lower()
         supported_image_extensions = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif', '.gif', '.webp'}
         
-        if file_extension not in supported_image_extensions:
+        if file.filename and file_extension not in supported_image_extensions:
             raise HTTPException(
                 status_code=415,
                 detail={
@@ -445,9 +683,17 @@ async def ocr_image(
                 }
             )
         
-        # 优先检查缓存，避免不必要的文件处理
+        # 验证文件并写入临时文件，同时计算缓存检查所需的文件哈希
+        spooled = await spool_upload_file(file)
+        temp_file_path = spooled.path
+        file_size = spooled.size
+        
+        # 优先检查缓存，避免不必要的文件处理（OCR结果与文档解析结果分属不同命名空间）
         cache_check_start = time.time()
-        cached_result = await cache_manager.get_cached_result(content)
+        cache_namespace = ocr_cache_namespace()
+        cached_result = await cache_manager.get_cached_result(
+            file_hash=spooled.file_hash, namespace=cache_namespace, legacy_lookup=False
+        )
         if cached_result:
             # 计算缓存检查的实际耗时
             cache_duration_ms = int((time.time() - cache_check_start) * 1000)
@@ -461,43 +707,51 @@ async def ocr_image(
             logger.info(f"从缓存返回OCR结果: {file.filename} (缓存查询: {cache_duration_ms}ms, 总耗时: {total_duration_ms}ms)")
             return UnicodeJSONResponse(content=cached_result)
         
-        # 保存上传的文件到临时位置
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=file_extension)
-        temp_file_path = temp_file.name
-        
-        # 写入文件内容
-        temp_file.write(content)
-        temp_file.close()
-        
         # 导入vision模块进行OCR处理
         from app.vision import get_ocr_text
         
-        # 进行OCR识别
-        ocr_text = await get_ocr_text(temp_file_path)
-        
-        # 计算处理时间
-        duration_ms = int((time.time() - start_time) * 1000)
+        async def run_ocr() -> str:
+            # OCR工作进程直接读取落盘的上传文件，无需在服务进程内保留图片内容
+            ocr_text = await get_ocr_text(temp_file_path)
+            
+            duration_ms = int((time.time() - start_time) * 1000)
+            logger.info(f"OCR处理成功: {file.filename} ({file_size} bytes) -> {len(ocr_text)} characters, 耗时: {duration_ms}ms")
+            
+            # 缓存OCR结果
+            await cache_manager.cache_result(
+                file_content=None,
+                filename=file.filename,
+                markdown_content=ocr_text,  # 使用markdown_content字段存储OCR文本
+                file_size=file_size,
+                duration_ms=duration_ms,
+                content_type=file.content_type,
+                file_hash=spooled.file_hash,
+                namespace=cache_namespace
+            )
+            return ocr_text
         
-        logger.info(f"OCR处理成功: {file.filename} ({file_size} bytes) -> {len(ocr_text)} characters, 耗时: {duration_ms}ms")
+        async def lookup_result() -> Optional[str]:
+            cached = await cache_manager.get_cached_result(
+                file_hash=spooled.file_hash, namespace=cache_namespace, legacy_lookup=False, count_stats=False
+            )
+            return cached["content"] if cached else None
         
-        # 缓存OCR结果
-        await cache_manager.cache_result(
-            file_content=content,
-            filename=file.filename,
-            markdown_content=ocr_text,  # 使用markdown_content字段存储OCR文本
-            file_size=file_size,
-            duration_ms=duration_ms,
-            content_type=file.content_type
+        # 相同图片的并发请求只识别一次
+        ocr_text, shared = await conversion_flight.do(
+            flight_key(cache_namespace, spooled.file_hash), run_ocr, lookup_result
         )
         
+        # 计算处理时间
+        duration_ms = int((time.time() - start_time) * 1000)
+        
         # 使用自定义响应类确保中文正确显示
         response_data = {
             "filename": file.filename,
-            "size": len(content),
+            "size": file_size,
             "content_type": file.content_type or "application/octet-stream",
             "ocr_text": ocr_text,
             "duration_ms": duration_ms,
-            "from_cache": False
+            "from_cache": shared
         }
         
         return UnicodeJSONResponse(content=response_data)
@@ -516,11 +770,8 @@ async def ocr_image(
                 "detail": str(e)
             }
         )
+ 
         
     finally:
         # 清理临时文件
-        if temp_file_path and os.path.exists(temp_file_path):
-            try:
-                os.unlink(temp_file_path)
-            except Exception as cleanup_error:
-                logger.warning(f"临时文件清理失败: {cleanup_error}") 
\ No newline at end of file
+        remove_temp_file(temp_file_path)
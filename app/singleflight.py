@@ -0,0 +1,156 @@
+"""
+请求合并模块（single-flight）
+
+多个客户端同时上传相同文件时，只由第一个请求执行解析/OCR，其余请求等待并复用其结果。
+进程内的重复请求共享同一个 Future；多副本部署时通过 Redis 锁（SET NX）选出执行者，
+其他副本轮询缓存等待结果，执行者失败或进程退出（锁过期）后由等待者接手。
+"""
+import asyncio
+import uuid
+from typing import Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+from loguru import logger
+
+from app.cache import cache_manager
+from app.config import config
+
+T = TypeVar("T")
+
+# 等待其他副本结果时的轮询间隔（秒），按指数退避增长到上限
+POLL_INTERVAL = 0.1
+MAX_POLL_INTERVAL = 2.0
+
+
+class FlightAbandoned(Exception):
+    """执行者被取消（如客户端断开），等待者需要重新发起"""
+
+
+def _consume_exception(future: asyncio.Future) -> None:
+    # 没有等待者时避免 "exception was never retrieved" 警告
+    if not future.cancelled():
+        future.exception()
+
+
+def flight_key(namespace: str, file_hash: str, variant: str = "") -> str:
+    """
+    生成合并键
+
+    Args:
+        namespace: 缓存命名空间（解析器及其版本/相关配置）
+        file_hash: 文件内容哈希
+        variant: 解析选项标识
+    """
+    return f"{namespace}:{file_hash}:{variant}" if variant else f"{namespace}:{file_hash}"
+
+
+class SingleFlight:
+    """
+    按键合并并发执行的协程
+
+    同一个键同时只有一个执行者，其余调用等待执行者的结果（或异常）。
+    提供 lookup 时同时跨副本合并：未获得分布式锁的调用轮询 lookup 直到结果出现。
+    """
+
+    def __init__(self, lock_ttl: int, wait_timeout: int):
+        self.lock_ttl = lock_ttl
+        self.wait_timeout = wait_timeout
+        self._flights: Dict[str, asyncio.Future] = {}
+
+    @property
+    def inflight(self) -> int:
+        """正在执行的键数量"""
+        return len(self._flights)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]],
+                 lookup: Optional[Callable[[], Awaitable[Optional[T]]]] = None) -> Tuple[T, bool]:
+        """
+        执行或等待键对应的任务
+
+        Args:
+            key: 合并键（内容哈希与解析选项）
+            fn: 实际执行的协程函数，应自行写入缓存
+            lookup: 从缓存读取其他副本结果的协程函数，None 表示只在进程内合并
+
+        Returns:
+            (结果, 是否复用了其他请求的结果)
+
+        Raises:
+            Exception: 执行者抛出的异常（等待者收到相同的异常）
+        """
+        while True:
+            future = self._flights.get(key)
+            if future is None:
+                break
+            try:
+                result = await asyncio.shield(future)
+                logger.info(f"复用并发请求的结果: {key[:48]}")
+                return result, True
+            except FlightAbandoned:
+                continue
+
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_consume_exception)
+        self._flights[key] = future
+        try:
+            result, shared = await self._run(key, fn, lookup)
+        except asyncio.CancelledError:
+            future.set_exception(FlightAbandoned())
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, shared
+        finally:
+            self._flights.pop(key, None)
+
+    async def _run(self, key: str, fn: Callable[[], Awaitable[T]],
+                   lookup: Optional[Callable[[], Awaitable[Optional[T]]]]) -> Tuple[T, bool]:
+        """获取分布式锁后执行，锁被其他副本持有时等待其结果"""
+        if lookup is None:
+            return await fn(), False
+
+        loop = asyncio.get_running_loop()
+        token = uuid.uuid4().hex
+        deadline = loop.time() + self.wait_timeout
+        delay = POLL_INTERVAL
+        waited = False
+
+        while not await cache_manager.acquire_lock(key, token, self.lock_ttl):
+            waited = True
+            result = await lookup()
+            if result is not None:
+                logger.info(f"复用其他副本的结果: {key[:48]}")
+                return result, True
+            if loop.time() >= deadline:
+                logger.warning(f"等待其他副本结果超时，自行处理: {key[:48]}")
+                return await fn(), False
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_POLL_INTERVAL)
+
+        keeper = asyncio.create_task(self._keep_lock(key, token))
+        try:
+            if waited:
+                # 前一个执行者可能在释放锁之前刚写入结果
+                result = await lookup()
+                if result is not None:
+                    return result, True
+            return await fn(), False
+        finally:
+            keeper.cancel()
+            await cache_manager.release_lock(key, token)
+
+    async def _keep_lock(self, key: str, token: str) -> None:
+        """执行期间定期为分布式锁续期，避免长时间解析时锁过期被其他副本重复执行"""
+        while True:
+            await asyncio.sleep(self.lock_ttl / 3)
+            if not await cache_manager.refresh_lock(key, token, self.lock_ttl):
+                logger.warning(f"分布式锁已失效，其他副本可能重复处理: {key[:48]}")
+                return
+
+
+# 全局请求合并实例，/convert、/ocr 与批量队列共用，相同文件的同步与批量请求也会合并
+conversion_flight = SingleFlight(
+    lock_ttl=config.SINGLEFLIGHT_LOCK_TTL,
+    wait_timeout=config.SINGLEFLIGHT_WAIT_TIMEOUT
+)
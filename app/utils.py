@@ -5,10 +5,13 @@
 """
 import os
 import asyncio
+import tempfile
 import aiofiles
 import aiofiles.os
+from dataclasses import dataclass
 from typing import List, Optional, Union
 from pathlib import Path
+from fastapi import UploadFile
 from loguru import logger
 
 from app.exceptions import ResourceCleanupError
@@ -234,6 +237,73 @@ async def create_temp_file_safe(content: Union[str, bytes], suffix: str = "", pr
         raise FileProcessingError(f"创建临时文件失败: {e}")
 
 
+# 上传文件落盘时每次读取的块大小
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class SpooledUpload:
+    """已写入临时文件的上传文件"""
+    path: str
+    size: int
+    file_hash: str
+
+
+async def spool_upload(file: UploadFile, suffix: str = "", max_size: Optional[int] = None,
+                       chunk_size: int = UPLOAD_CHUNK_SIZE) -> SpooledUpload:
+    """
+    将上传文件逐块写入临时文件，同时增量计算文件哈希并检查大小
+    
+    整个过程只遍历一次上传内容，内存占用与文件大小无关；
+    超出大小限制时立即停止读取并删除已写入的部分。
+    
+    Args:
+        file: 上传的文件
+        suffix: 临时文件后缀
+        max_size: 最大允许大小（字节），None表示不限制
+        chunk_size: 每次读取的字节数
+        
+    Returns:
+        临时文件路径、文件大小和文件哈希（与缓存键使用的哈希一致）
+        
+    Raises:
+        FileSizeError: 文件大小超出限制
+    """
+    from app.cache import cache_manager
+    from app.config import config
+    
+    hasher = cache_manager.new_file_hasher()
+    file_size = 0
+    temp_dir = config.TEMP_DIR if os.path.isdir(config.TEMP_DIR) else None
+    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=suffix, prefix="file2md_", dir=temp_dir)
+    temp_file_path = temp_file.name
+    temp_file.close()
+    
+    try:
+        async with aiofiles.open(temp_file_path, 'wb') as f:
+            while True:
+                chunk = await file.read(chunk_size)
+                if not chunk:
+                    break
+                file_size += len(chunk)
+                
+                # 超过大小限制时不再继续读取
+                if max_size is not None and file_size > max_size:
+                    from app.exceptions import FileSizeError
+                    raise FileSizeError(file_size, max_size, file.filename)
+                
+                hasher.update(chunk)
+                await f.write(chunk)
+    except BaseException:
+        try:
+            os.unlink(temp_file_path)
+        except OSError:
+            pass
+        raise
+    
+    return SpooledUpload(path=temp_file_path, size=file_size, file_hash=hasher.hexdigest())
+
+
 def format_file_size(size_bytes: int) -> str:
     """
     格式化文件大小显示
@@ -1,78 +1,27 @@
 import openai
-import base64
 import os
-import tempfile
 from loguru import logger
-from typing import Optional
+from typing import Optional, Tuple, List, Dict, Union
+from dataclasses import dataclass, field
+import hashlib
+import importlib.util
 # 移除 pytesseract 导入，改用 PaddleOCR
 # import pytesseract
-from PIL import Image
 import httpx
 import asyncio
 import aiofiles
+import random
+import time
 
 from app.config import config
+from app.cache import cache_manager
+from app.phash import near_duplicate_detector, ImageFingerprint
+from app.imaging import (
+    ImageInput, PreparedImage, VisionPayload, detect_mime_type, prepare_vision_payload
+)
 
-# 初始化 PaddleOCR
-_ocr_engine = None
-
-def _is_gpu_available() -> bool:
-    """检测系统是否存在可用 GPU 并且 PaddlePaddle 编译支持 CUDA"""
-    try:
-        import paddle
-        if paddle.device.is_compiled_with_cuda():
-            return paddle.device.cuda.device_count() > 0
-    except Exception as e:
-        # 捕获所有异常（包括未安装 paddle 的情况）
-        logger.debug(f"GPU 检测失败或不可用: {e}")
-    return False
-
-def init_paddle_ocr():
-    """初始化 PaddleOCR 引擎"""
-    global _ocr_engine
-    try:
-        from paddleocr import PaddleOCR
-        
-        # 根据系统环境自动检测是否启用 GPU
-        gpu_available = _is_gpu_available()
-
-        try:
-            # 尝试新版本参数
-            _ocr_engine = PaddleOCR(
-                use_textline_orientation=True,  # 使用文本行方向检测 (新参数名)
-                lang='ch',  # 中文识别
-                use_gpu=gpu_available  # 自动选择 GPU 或 CPU
-            )
-            logger.info(
-                f"PaddleOCR ({'GPU' if gpu_available else 'CPU'}) 初始化成功 - 使用新版API"
-            )
-        except TypeError:
-            # 回退到旧版本参数（use_angle_cls）
-            logger.info("使用旧版本PaddleOCR API参数")
-            _ocr_engine = PaddleOCR(
-                use_angle_cls=True,  # 使用角度分类器 (旧参数名)
-                lang='ch',  # 中文识别
-                use_gpu=gpu_available  # 自动选择 GPU 或 CPU
-            )
-            logger.info(
-                f"PaddleOCR ({'GPU' if gpu_available else 'CPU'}) 初始化成功 - 使用旧版API"
-            )
-        
-        return _ocr_engine
-        
-    except ImportError:
-        logger.error("PaddleOCR 未安装，请运行: pip install paddleocr")
-        return None
-    except Exception as e:
-        logger.error(f"PaddleOCR 初始化失败: {e}")
-        return None
-
-def get_ocr_engine():
-    """获取 OCR 引擎实例"""
-    global _ocr_engine
-    if _ocr_engine is None:
-        _ocr_engine = init_paddle_ocr()
-    return _ocr_engine
+# PaddleOCR 推理工作池
+from app.ocr_pool import recognize_image, recognize_images, ocr_pool, OCR_CONFIDENCE_THRESHOLD
 
 # 兼容性函数 - 废弃 Tesseract 配置
 def configure_tesseract():
@@ -80,14 +29,35 @@ def configure_tesseract():
     logger.warning("configure_tesseract() 已废弃，现在使用 PaddleOCR")
     return None
 
-# 初始化时配置 PaddleOCR
-init_paddle_ocr()
 from app.exceptions import (
     VisionAPIError, VisionAPIConnectionError, VisionAPIRateLimitError, OCRError
 )
 
+# HTTP/2 需要安装 h2 包（httpx[http2]），未安装时回退到 HTTP/1.1
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+def _create_vision_http_client() -> httpx.AsyncClient:
+    """创建视觉API共享的异步HTTP客户端（长连接池）"""
+    use_http2 = config.VISION_HTTP2 and HTTP2_AVAILABLE
+    if config.VISION_HTTP2 and not HTTP2_AVAILABLE:
+        logger.warning("未安装h2，Vision API回退到HTTP/1.1（pip install 'httpx[http2]'）")
+    
+    # 视觉客户端只访问单一API主机，连接池上限即为每主机连接上限
+    limits = httpx.Limits(
+        max_connections=config.VISION_MAX_CONNECTIONS,
+        max_keepalive_connections=config.VISION_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=config.VISION_KEEPALIVE_EXPIRY
+    )
+    timeout = httpx.Timeout(config.VISION_TIMEOUT, connect=10.0)
+    
+    logger.info(
+        f"Vision HTTP客户端: {'HTTP/2' if use_http2 else 'HTTP/1.1'}, "
+        f"最大连接数 {config.VISION_MAX_CONNECTIONS}, 保活连接数 {config.VISION_MAX_KEEPALIVE_CONNECTIONS}"
+    )
+    return httpx.AsyncClient(http2=use_http2, limits=limits, timeout=timeout)
+
 def init_vision_client():
-    """初始化视觉API客户端"""
+    """初始化视觉API客户端（进程内共享的异步客户端）"""
     vision_api_key = config.get_vision_api_key()
     
     if not vision_api_key:
@@ -96,17 +66,24 @@ def init_vision_client():
         
     try:
         if config.VISION_API_KEY:
+            http_client = _create_vision_http_client()
             if config.VISION_API_BASE and config.VISION_API_BASE != "https://api.openai.com/v1":
                 # 使用自定义API配置
-                client = openai.OpenAI(
+                client = openai.AsyncOpenAI(
                     api_key=config.VISION_API_KEY,
-                    base_url=config.VISION_API_BASE
+                    base_url=config.VISION_API_BASE,
+                    http_client=http_client,
+                    max_retries=0  # 重试由 VisionService 统一控制
                 )
                 logger.info(f"使用自定义Vision API: {config.VISION_API_BASE}")
                 return client
             else:
                 # 使用默认OpenAI配置
-                client = openai.OpenAI(api_key=config.VISION_API_KEY)
+                client = openai.AsyncOpenAI(
+                    api_key=config.VISION_API_KEY,
+                    http_client=http_client,
+                    max_retries=0  # 重试由 VisionService 统一控制
+                )
                 logger.info("使用OpenAI Vision API")
                 return client
     except Exception as e:
@@ -120,81 +97,284 @@ def init_vision_client():
 # 配置Vision客户端
 vision_client = init_vision_client()
 
-async def call_vision_api_with_retry(base64_image: str, prompt: str) -> str:
+async def close_vision_client():
+    """关闭视觉API客户端，释放连接池"""
+    if vision_client is not None:
+        await vision_client.close()
+        logger.info("Vision API客户端已关闭")
+
+# 图片文件解析使用的提示词
+IMAGE_DESCRIPTION_PROMPT = ("Please provide a detailed description of this image, including: "
+                            "1. Overall accurate description of the image; "
+                            "2. Main elements and structure of the image; "
+                            "3. If there are tables, charts, etc., please describe their content and layout in detail. "
+                            "Please only return the description content, do not include OCR text extraction.")
+
+# 文档内嵌图片使用的提示词
+DOCUMENT_IMAGE_PROMPT = ("Please provide a detailed description of this image, including: "
+                         "1. Overall accurate description of the image; "
+                         "2. Main elements and structure of the image; "
+                         "3. If there are tables, charts, etc., please describe their content and layout in detail.")
+
+
+class VisionService:
     """
-    带重试机制的视觉API调用
+    视觉模型服务
     
-    Args:
-        base64_image: base64编码的图片
-        prompt: 提示词
-        
-    Returns:
-        API响应内容
-        
-    Raises:
-        VisionAPIError: API调用失败
+    所有解析器的视觉调用统一经过此服务，提供：
+    - 带指数退避的重试
+    - 全局在途请求数限制（所有并发转换共享）
+    - 全局令牌桶限速，收到429时按 Retry-After 全局暂停发送，避免重试风暴
     """
-    if not vision_client:
-        raise VisionAPIError("Vision client未初始化")
     
-    last_exception = None
-    delay = config.VISION_RETRY_DELAY
+    def __init__(self, client, max_inflight: int, rate_limit: float, burst: int):
+        self.client = client
+        self.max_inflight = max_inflight
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self._semaphore = asyncio.Semaphore(max_inflight)
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._bucket_lock = asyncio.Lock()
+        self._paused_until = 0.0
+        self._inflight = 0
+        self._rate_limited_count = 0
+        self._images_prepared = 0
+        self._bytes_original = 0
+        self._bytes_sent = 0
     
-    for attempt in range(config.VISION_MAX_RETRIES):
-        try:
-            logger.info(f"Vision API调用尝试 {attempt + 1}/{config.VISION_MAX_RETRIES}")
+    @property
+    def enabled(self) -> bool:
+        """是否已配置视觉模型"""
+        return self.client is not None
+    
+    async def _acquire_slot(self) -> None:
+        """等待全局暂停结束并从令牌桶取得一个令牌"""
+        async with self._bucket_lock:
+            while True:
+                now = time.monotonic()
+                
+                # 速率限制触发的全局暂停
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                
+                if self.rate_limit <= 0:
+                    return
+                
+                # 按时间补充令牌
+                self._tokens = min(float(self.burst), self._tokens + (now - self._last_refill) * self.rate_limit)
+                self._last_refill = now
+                
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                
+                await asyncio.sleep((1 - self._tokens) / self.rate_limit)
+    
+    def _pause_for_rate_limit(self, error: Exception, delay: float) -> float:
+        """收到429后暂停所有视觉请求，优先使用服务端返回的 Retry-After"""
+        pause = delay
+        response = getattr(error, "response", None)
+        if response is not None:
+            try:
+                pause = max(pause, float(response.headers.get("retry-after", 0)))
+            except (TypeError, ValueError):
+                pass
+        
+        self._rate_limited_count += 1
+        self._paused_until = max(self._paused_until, time.monotonic() + pause)
+        return pause
+    
+    async def describe(self, base64_image: str, prompt: str, mime_type: str = "image/png") -> str:
+        """
+        带重试机制的视觉API调用
+        
+        Args:
+            base64_image: base64编码的图片
+            prompt: 提示词
+            mime_type: 图片的MIME类型
+            
+        Returns:
+            API响应内容
             
-            response = vision_client.chat.completions.create(
-                model=config.VISION_MODEL,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/png;base64,{base64_image}"
+        Raises:
+            VisionAPIError: API调用失败
+        """
+        if not self.client:
+            raise VisionAPIError("Vision client未初始化")
+        
+        last_exception = None
+        delay = config.VISION_RETRY_DELAY
+        
+        for attempt in range(config.VISION_MAX_RETRIES):
+            wait_time = delay
+            try:
+                logger.info(f"Vision API调用尝试 {attempt + 1}/{config.VISION_MAX_RETRIES}")
+                
+                await self._acquire_slot()
+                async with self._semaphore:
+                    self._inflight += 1
+                    try:
+                        response = await self.client.chat.completions.create(
+                            model=config.VISION_MODEL,
+                            messages=[
+                                {
+                                    "role": "user",
+                                    "content": [
+                                        {
+                                            "type": "image_url",
+                                            "image_url": {
+                                                "url": f"data:{mime_type};base64,{base64_image}"
+                                            }
+                                        },
+                                        {
+                                            "type": "text", 
+                                            "text": prompt
+                                        }
+                                    ]
                                 }
-                            },
-                            {
-                                "type": "text", 
-                                "text": prompt
-                            }
-                        ]
-                    }
-                ],
-                max_tokens=1000
-            )
+                            ],
+                            max_tokens=1000
+                        )
+                    finally:
+                        self._inflight -= 1
+                
+                content = response.choices[0].message.content
+                logger.info(f"Vision API调用成功，使用模型: {config.VISION_MODEL}")
+                return content or "视觉模型返回空内容"
+                
+            except openai.RateLimitError as e:
+                last_exception = VisionAPIRateLimitError(f"速率限制: {e}")
+                wait_time = self._pause_for_rate_limit(e, delay)
+                logger.warning(f"Vision API速率限制，全局暂停 {wait_time:.1f} 秒，尝试 {attempt + 1}/{config.VISION_MAX_RETRIES}: {e}")
+                
+            except (openai.APIConnectionError, httpx.ConnectError) as e:
+                last_exception = VisionAPIConnectionError(f"连接错误: {e}")
+                logger.warning(f"Vision API连接失败，尝试 {attempt + 1}/{config.VISION_MAX_RETRIES}: {e}")
+                
+            except openai.APIError as e:
+                last_exception = VisionAPIError(f"API错误: {e}")
+                logger.error(f"Vision API错误，尝试 {attempt + 1}/{config.VISION_MAX_RETRIES}: {e}")
+                
+            except Exception as e:
+                last_exception = VisionAPIError(f"未知错误: {e}")
+                logger.error(f"Vision API未知错误，尝试 {attempt + 1}/{config.VISION_MAX_RETRIES}: {e}")
             
-            content = response.choices[0].message.content
-            logger.info(f"Vision API调用成功，使用模型: {config.VISION_MODEL}")
-            return content or "视觉模型返回空内容"
+            # 如果不是最后一次尝试，等待后重试（加入随机抖动，避免并发请求同时重试）
+            if attempt < config.VISION_MAX_RETRIES - 1:
+                wait_time *= 1 + random.uniform(0, 0.25)
+                logger.info(f"等待 {wait_time:.1f} 秒后重试...")
+                await asyncio.sleep(wait_time)
+                delay *= config.VISION_BACKOFF_FACTOR  # 指数退避
+        
+        # 所有重试都失败了
+        logger.error(f"Vision API调用失败，已重试 {config.VISION_MAX_RETRIES} 次")
+        raise last_exception or VisionAPIError("所有重试都失败了")
+    
+    def _prepare_payload(self, image: PreparedImage) -> VisionPayload:
+        """按配置缩小并重新编码图片（同步，在线程中执行）"""
+        if not config.VISION_IMAGE_OPTIMIZE:
+            data = image.encoded()
+            return VisionPayload(data=data, mime_type=detect_mime_type(data) or "image/png", original_size=len(data))
+        return prepare_vision_payload(
+            image, config.VISION_IMAGE_MAX_SIDE, config.VISION_IMAGE_FORMAT, config.VISION_IMAGE_QUALITY
+        )
+    
+    async def describe_image_data(self, image: Union[ImageInput, PreparedImage], prompt: str) -> str:
+        """
+        预处理图片后调用视觉API
+        
+        Args:
+            image: 图片字节、PIL图片、RGB数组或已解码的图片
+            prompt: 提示词
             
-        except openai.RateLimitError as e:
-            last_exception = VisionAPIRateLimitError(f"速率限制: {e}")
-            logger.warning(f"Vision API速率限制，尝试 {attempt + 1}/{config.VISION_MAX_RETRIES}: {e}")
+        Returns:
+            API响应内容
             
-        except (openai.APIConnectionError, httpx.ConnectError) as e:
-            last_exception = VisionAPIConnectionError(f"连接错误: {e}")
-            logger.warning(f"Vision API连接失败，尝试 {attempt + 1}/{config.VISION_MAX_RETRIES}: {e}")
+        Raises:
+            VisionAPIError: API调用失败
+        """
+        if not isinstance(image, PreparedImage):
+            image = PreparedImage(image)
+        
+        try:
+            payload = await asyncio.to_thread(self._prepare_payload, image)
+        except Exception as e:
+            # 无法解码的图片按原样发送，由视觉模型自行判断
+            logger.warning(f"视觉图片预处理失败，使用原图: {e}")
+            data = image.encoded()
+            payload = VisionPayload(data=data, mime_type=detect_mime_type(data) or "image/png", original_size=len(data))
+        
+        self._images_prepared += 1
+        self._bytes_original += payload.original_size
+        self._bytes_sent += len(payload.data)
+        if payload.bytes_saved:
+            logger.debug(f"视觉图片预处理: {payload.original_size} -> {len(payload.data)} bytes ({payload.mime_type})")
+        
+        return await self.describe(payload.to_base64(), prompt, payload.mime_type)
+    
+    async def describe_image(self, image_path: str, prompt: str = DOCUMENT_IMAGE_PROMPT) -> str:
+        """
+        获取图片文件的视觉描述，失败时返回降级文本而不是抛出异常
+        
+        Args:
+            image_path: 图片文件路径
+            prompt: 提示词
             
-        except openai.APIError as e:
-            last_exception = VisionAPIError(f"API错误: {e}")
-            logger.error(f"Vision API错误，尝试 {attempt + 1}/{config.VISION_MAX_RETRIES}: {e}")
+        Returns:
+            视觉描述或降级文本
+        """
+        if not self.enabled:
+            return "视觉模型未配置"
+        
+        try:
+            async with aiofiles.open(image_path, "rb") as image_file:
+                image_data = await image_file.read()
             
+            return await self.describe_image_data(image_data, prompt)
         except Exception as e:
-            last_exception = VisionAPIError(f"未知错误: {e}")
-            logger.error(f"Vision API未知错误，尝试 {attempt + 1}/{config.VISION_MAX_RETRIES}: {e}")
-        
-        # 如果不是最后一次尝试，等待后重试
-        if attempt < config.VISION_MAX_RETRIES - 1:
-            logger.info(f"等待 {delay:.1f} 秒后重试...")
-            await asyncio.sleep(delay)
-            delay *= config.VISION_BACKOFF_FACTOR  # 指数退避
-    
-    # 所有重试都失败了
-    logger.error(f"Vision API调用失败，已重试 {config.VISION_MAX_RETRIES} 次")
-    raise last_exception or VisionAPIError("所有重试都失败了")
+            logger.warning(f"Vision API调用失败: {e}")
+            return "视觉模型识别失败"
+    
+    def get_stats(self) -> dict:
+        """获取视觉服务的并发与限速状态"""
+        return {
+            "max_inflight": self.max_inflight,
+            "inflight": self._inflight,
+            "rate_limit": self.rate_limit,
+            "rate_limited_count": self._rate_limited_count,
+            "paused": time.monotonic() < self._paused_until,
+            "images_prepared": self._images_prepared,
+            "bytes_original": self._bytes_original,
+            "bytes_sent": self._bytes_sent,
+            "bytes_saved": max(self._bytes_original - self._bytes_sent, 0)
+        }
+
+
+# 全局视觉服务实例，所有并发转换共享同一并发与限速配额
+vision_service = VisionService(
+    vision_client,
+    max_inflight=config.VISION_MAX_INFLIGHT,
+    rate_limit=config.VISION_RATE_LIMIT,
+    burst=config.VISION_RATE_BURST
+)
+
+async def call_vision_api_with_retry(base64_image: str, prompt: str) -> str:
+    """
+    带重试机制的视觉API调用（兼容接口，委托给 vision_service）
+    
+    Args:
+        base64_image: base64编码的图片
+        prompt: 提示词
+        
+    Returns:
+        API响应内容
+        
+    Raises:
+        VisionAPIError: API调用失败
+    """
+    return await vision_service.describe(base64_image, prompt)
 
 async def image_to_markdown(image_path: str) -> str:
     """
@@ -215,15 +395,15 @@ async def image_to_markdown(image_path: str) -> str:
         if not os.path.exists(image_path):
             raise FileNotFoundError(f"图片文件不存在: {image_path}")
         
-        # 异步读取图片并转换为base64
+        # 异步读取图片，只读取和解码一次，OCR与视觉识别共享
         async with aiofiles.open(image_path, "rb") as image_file:
-            image_data = await image_file.read()
-            base64_image = base64.b64encode(image_data).decode('utf-8')
+            image = PreparedImage(await image_file.read())
         
         # 尝试获取OCR结果，但允许失败
         ocr_text = ""
         try:
-            ocr_text = await get_ocr_text(image_path)
+            await asyncio.to_thread(image.decode)
+            ocr_text = await get_ocr_text(image.to_array())
             logger.info(f"OCR成功: {image_path}")
         except OCRError as e:
             logger.warning(f"OCR处理失败，但继续进行视觉分析: {e}")
@@ -234,17 +414,11 @@ async def image_to_markdown(image_path: str) -> str:
         
         # 如果配置了Vision API，使用Vision API获取描述
         vision_description = ""
-        logger.info(f"Vision client状态: {vision_client is not None}")
+        logger.info(f"Vision client状态: {vision_service.enabled}")
         
-        if vision_client:
+        if vision_service.enabled:
             try:
-                prompt = ("Please provide a detailed description of this image, including: "
-                         "1. Overall accurate description of the image; "
-                         "2. Main elements and structure of the image; "
-                         "3. If there are tables, charts, etc., please describe their content and layout in detail. "
-                         "Please only return the description content, do not include OCR text extraction.")
-                
-                vision_description = await call_vision_api_with_retry(base64_image, prompt)
+                vision_description = await vision_service.describe_image_data(image, IMAGE_DESCRIPTION_PROMPT)
                 logger.info(f"视觉分析成功: {image_path}")
                 
             except VisionAPIError as e:
@@ -274,12 +448,14 @@ async def image_to_markdown(image_path: str) -> str:
         logger.error(f"图片处理失败: {e}")
         raise Exception(f"图片处理失败: {str(e)}")
 
-async def get_ocr_text(image_path: str) -> str:
+async def get_ocr_text(image: ImageInput) -> str:
     """
     使用PaddleOCR提取图片中的文字
     
+    识别在OCR工作池中执行，不会阻塞事件循环
+    
     Args:
-        image_path: 图片文件路径
+        image: 图片文件路径、图片字节、PIL图片或RGB数组
         
     Returns:
         提取的文字内容
@@ -288,90 +464,21 @@ async def get_ocr_text(image_path: str) -> str:
         OCRError: OCR处理失败
     """
     try:
-        # 获取 PaddleOCR 引擎
-        ocr_engine = get_ocr_engine()
-        if ocr_engine is None:
-            raise OCRError("PaddleOCR 引擎未初始化")
-        
         # 验证图片文件存在
-        if not os.path.exists(image_path):
-            raise OCRError(f"图片文件不存在: {image_path}")
+        if isinstance(image, str) and not os.path.exists(image):
+            raise OCRError(f"图片文件不存在: {image}")
         
-        # 图片预处理 - 为了兼容性，检查图片格式
-        processed_image_path = image_path
-        temp_converted_path = None
+        # 提交到OCR工作池并等待结果
+        ocr_text_list = await ocr_pool.run(recognize_image, image)
         
-        try:
-            with Image.open(image_path) as image:
-                # 如果图片有多个帧（如动态GIF），只处理第一帧
-                if hasattr(image, 'n_frames') and image.n_frames > 1:  # type: ignore
-                    image.seek(0)
-                
-                # 确保图片格式兼容 PaddleOCR
-                if image.mode not in ('RGB', 'L'):
-                    if image.mode == 'RGBA':
-                        # RGBA转RGB，使用白色背景
-                        background = Image.new('RGB', image.size, (255, 255, 255))
-                        background.paste(image, mask=image.split()[-1])
-                        # 保存转换后的图片
-                        temp_converted_path = image_path + "_converted.png"
-                        background.save(temp_converted_path, 'PNG')
-                        processed_image_path = temp_converted_path
-                    elif image.mode in ('P', 'CMYK', '1'):
-                        # 其他格式转RGB
-                        rgb_image = image.convert('RGB')
-                        temp_converted_path = image_path + "_converted.png"
-                        rgb_image.save(temp_converted_path, 'PNG')
-                        processed_image_path = temp_converted_path
-                        
-        except (IOError, OSError) as e:
-            logger.warning(f"图片格式检查失败，直接使用原图: {e}")
-        
-        # 使用 PaddleOCR 进行文字识别
-        try:
-            logger.debug(f"使用 PaddleOCR 处理图片: {processed_image_path}")
-            
-            # PaddleOCR 识别
-            result = ocr_engine.ocr(processed_image_path, cls=True)
-            
-            # 解析 PaddleOCR 结果
-            ocr_text_list = []
-            if result and result[0]:  # result是一个列表，包含每页的结果
-                for line in result[0]:  # 遍历每一行文字
-                    if line and len(line) >= 2:
-                        text = line[1][0]  # 获取识别的文字
-                        confidence = line[1][1]  # 获取置信度
-                        # 只保留置信度较高的文字
-                        if confidence > 0.5:  # 置信度阈值
-                            ocr_text_list.append(text)
-            
-            # 合并识别结果
-            if ocr_text_list:
-                ocr_text = '\n'.join(ocr_text_list)
-                logger.info(f"PaddleOCR 成功提取文字: {len(ocr_text_list)} 行文字")
-                return ocr_text.strip()
-            else:
-                logger.warning(f"PaddleOCR 未能提取到文字: {image_path}")
-                return "未检测到文字内容"
-                
-        except Exception as ocr_error:
-            logger.error(f"PaddleOCR 处理失败 {image_path}: {ocr_error}")
-            
-            # 检查是否是模型加载问题
-            if "No module named" in str(ocr_error) or "ImportError" in str(ocr_error):
-                raise OCRError(f"PaddleOCR 依赖缺失: {str(ocr_error)}")
-            elif "download" in str(ocr_error).lower():
-                raise OCRError(f"PaddleOCR 模型下载失败，请检查网络连接: {str(ocr_error)}")
-            else:
-                raise OCRError(f"PaddleOCR 识别失败: {str(ocr_error)}")
-        
-        finally:
-            # 清理临时转换的图片文件
-            if temp_converted_path and os.path.exists(temp_converted_path):
-                try:
-                    os.unlink(temp_converted_path)
-                except:
-                    pass
+        # 合并识别结果
+        if ocr_text_list:
+            ocr_text = '\n'.join(ocr_text_list)
+            logger.info(f"PaddleOCR 成功提取文字: {len(ocr_text_list)} 行文字")
+            return ocr_text.strip()
+        else:
+            logger.warning("PaddleOCR 未能提取到文字")
+            return "未检测到文字内容"
             
     except OCRError:
         # 重新抛出OCR错误
@@ -380,6 +487,271 @@ async def get_ocr_text(image_path: str) -> str:
         logger.error(f"OCR处理失败: {e}")
         raise OCRError(f"OCR处理错误: {str(e)}")
 
+async def get_ocr_texts(images: List[ImageInput],
+                        return_exceptions: bool = False) -> List[Union[str, OCRError]]:
+    """
+    批量使用PaddleOCR提取多张图片中的文字
+    
+    图片按 OCR_BATCH_SIZE 分组提交到OCR工作池，每组内所有文字行合并为一次识别推理，
+    多个分组可由不同的工作进程并行处理。
+    
+    Args:
+        images: 图片列表（文件路径、图片字节、PIL图片或RGB数组）
+        return_exceptions: 为True时单张图片的失败以 OCRError 实例返回在对应位置，
+            否则遇到失败直接抛出
+        
+    Returns:
+        与输入顺序一致的文字内容列表
+        
+    Raises:
+        OCRError: OCR处理失败（仅当 return_exceptions 为False）
+    """
+    results: List[Union[str, OCRError, None]] = [None] * len(images)
+    
+    valid_indices = []
+    for idx, image in enumerate(images):
+        if isinstance(image, str) and not os.path.exists(image):
+            results[idx] = OCRError(f"图片文件不存在: {image}")
+        else:
+            valid_indices.append(idx)
+    
+    batch_size = config.OCR_BATCH_SIZE
+    batches = [valid_indices[i:i + batch_size] for i in range(0, len(valid_indices), batch_size)]
+    batch_results = await asyncio.gather(
+        *(ocr_pool.run(recognize_images, [images[idx] for idx in batch]) for batch in batches),
+        return_exceptions=True
+    )
+    
+    for batch, batch_result in zip(batches, batch_results):
+        if isinstance(batch_result, BaseException):
+            error = batch_result if isinstance(batch_result, OCRError) else OCRError(f"OCR处理错误: {str(batch_result)}")
+            logger.error(f"批量OCR处理失败: {error}")
+            for idx in batch:
+                results[idx] = error
+            continue
+        
+        for idx, ocr_text_list in zip(batch, batch_result):
+            if ocr_text_list is None:
+                results[idx] = OCRError(f"PaddleOCR 识别失败: 图片{idx + 1}")
+            elif ocr_text_list:
+                results[idx] = '\n'.join(ocr_text_list).strip()
+            else:
+                results[idx] = "未检测到文字内容"
+    
+    if not return_exceptions:
+        for result in results:
+            if isinstance(result, OCRError):
+                raise result
+    
+    logger.info(f"PaddleOCR 批量识别完成: {len(images)} 张图片, {len(batches)} 个批次")
+    return results  # type: ignore
+
+def ocr_cache_identity() -> str:
+    """OCR结果缓存标识，识别引擎或置信度阈值变化时缓存自动失效"""
+    return f"paddleocr-ch-{OCR_CONFIDENCE_THRESHOLD}"
+
+def vision_cache_identity(prompt: str) -> str:
+    """视觉结果缓存标识，由模型名、提示词和图片预处理参数共同决定"""
+    preprocess = (
+        f"{config.VISION_IMAGE_MAX_SIDE}:{config.VISION_IMAGE_FORMAT}:{config.VISION_IMAGE_QUALITY}"
+        if config.VISION_IMAGE_OPTIMIZE else "original"
+    )
+    prompt_digest = hashlib.sha1(f"{prompt}\n{preprocess}".encode('utf-8')).hexdigest()[:12]
+    return f"{config.VISION_MODEL}-{prompt_digest}"
+
+@dataclass
+class _ImageJob:
+    """批量图片识别中单张图片的处理状态"""
+    image: PreparedImage
+    ocr_text: Optional[str] = None
+    vision_description: Optional[str] = None
+    fingerprint: Optional[ImageFingerprint] = None
+    # 同一批次内的相同/近似图片只识别一次，其余图片复用 leader 的结果
+    leader: Optional["_ImageJob"] = None
+    registered: bool = False
+    new_results: Dict[Tuple[str, str], str] = field(default_factory=dict)
+    
+    @property
+    def image_hash(self) -> str:
+        return self.image.content_hash
+
+def _decode_for_analysis(image: PreparedImage) -> bool:
+    """解码图片供感知哈希和OCR共享，无法解码时返回False"""
+    try:
+        image.decode()
+        return True
+    except Exception as e:
+        logger.warning(f"图片解码失败: {e}")
+        return False
+
+async def analyze_images(images: List[ImageInput], use_vision: bool = True,
+                         prompt: str = DOCUMENT_IMAGE_PROMPT) -> List[Tuple[str, str]]:
+    """
+    批量对文档内嵌图片执行OCR和视觉识别，优先复用已有结果
+    
+    查找顺序：按图片内容寻址的缓存 -> 感知哈希近似图片（批次内/进程内/Redis）-> 实际识别。
+    所有需要OCR的图片通过 get_ocr_texts 批量识别，视觉模型请求并发执行；
+    只有成功的识别结果才会写入缓存。每张图片最多解码一次，
+    解码结果在感知哈希与OCR之间共享，全程不落盘。
+    
+    Args:
+        images: 图片列表（图片字节、PIL图片或RGB数组）
+        use_vision: 是否调用视觉模型
+        prompt: 视觉模型提示词
+        
+    Returns:
+        与输入顺序一致的 (OCR文本, 视觉描述) 列表，未启用视觉识别时视觉描述为空字符串
+    """
+    ocr_identity = ocr_cache_identity()
+    vision_identity = vision_cache_identity(prompt)
+    need_vision = use_vision and vision_service.enabled
+    
+    def prepare_all() -> List[PreparedImage]:
+        prepared = [PreparedImage(image) for image in images]
+        for image in prepared:
+            image.content_hash  # 预先计算内容哈希
+        return prepared
+    
+    jobs = [_ImageJob(image=image) for image in await asyncio.to_thread(prepare_all)]
+    
+    def is_complete(job: _ImageJob) -> bool:
+        return job.ocr_text is not None and (not need_vision or job.vision_description is not None)
+    
+    # 先查询缓存
+    async def load_cached(job: _ImageJob):
+        job.ocr_text = await cache_manager.get_image_result("ocr", ocr_identity, job.image_hash)
+        if need_vision:
+            job.vision_description = await cache_manager.get_image_result("vision", vision_identity, job.image_hash)
+        # 未配置视觉模型时的占位描述
+        if use_vision and not vision_service.enabled:
+            job.vision_description = "视觉模型未配置"
+    
+    await asyncio.gather(*(load_cached(job) for job in jobs))
+    pending_jobs = [job for job in jobs if not is_complete(job)]
+    if len(pending_jobs) < len(jobs):
+        logger.info(f"图片识别结果来自缓存: {len(jobs) - len(pending_jobs)}/{len(jobs)} 张")
+    
+    # 需要识别的图片解码一次，供感知哈希和OCR共享
+    decodable = await asyncio.gather(
+        *(asyncio.to_thread(_decode_for_analysis, job.image) for job in pending_jobs)
+    )
+    
+    decoded_jobs = [job for job, ok in zip(pending_jobs, decodable) if ok]
+    
+    # 近似重复检测：复用重新编码/缩放过的相同图片的识别结果
+    if config.IMAGE_PHASH_ENABLED and decoded_jobs:
+        fingerprints = await asyncio.gather(
+            *(near_duplicate_detector.fingerprint(job.image.decode()) for job in decoded_jobs)
+        )
+        for job, fingerprint in zip(decoded_jobs, fingerprints):
+            job.fingerprint = fingerprint
+    
+    leaders: List[_ImageJob] = []
+    leaders_by_hash: Dict[str, _ImageJob] = {}
+    for job in pending_jobs:
+        # 批次内字节相同或近似的图片直接跟随先出现的图片
+        leader = leaders_by_hash.get(job.image_hash)
+        if leader is None and job.fingerprint is not None:
+            leader = next(
+                (other for other in leaders if other.fingerprint is not None
+                 and near_duplicate_detector.is_similar(other.fingerprint, job.fingerprint)),
+                None
+            )
+        if leader is not None:
+            job.leader = leader
+            continue
+        
+        if job.fingerprint is not None:
+            similar_hash = await near_duplicate_detector.find_similar(job.fingerprint)
+            if similar_hash:
+                if job.ocr_text is None:
+                    job.ocr_text = await near_duplicate_detector.get_result(similar_hash, "ocr", ocr_identity)
+                if need_vision and job.vision_description is None:
+                    job.vision_description = await near_duplicate_detector.get_result(
+                        similar_hash, "vision", vision_identity
+                    )
+                if is_complete(job):
+                    near_duplicate_detector.hit_count += 1
+                    logger.info(f"复用近似图片的识别结果: {job.image_hash[:8]}... -> {similar_hash[:8]}...")
+                    continue
+        
+        leaders.append(job)
+        leaders_by_hash[job.image_hash] = job
+    
+    # 登记放在所有查找之后，保证等待中的近似图片都已进入识别阶段，不会相互等待
+    for job in leaders:
+        if job.fingerprint is not None:
+            job.registered = near_duplicate_detector.begin(job.fingerprint, job.image_hash)
+    
+    async def run_ocr(ocr_jobs: List[_ImageJob]):
+        if not ocr_jobs:
+            return
+        try:
+            # 已解码的图片直接传递像素数组，无法解码的图片交给OCR工作池报告错误
+            texts = await get_ocr_texts(
+                [job.image.to_array() if job.image.decoded else job.image.encoded() for job in ocr_jobs],
+                return_exceptions=True
+            )
+            for job, text in zip(ocr_jobs, texts):
+                if isinstance(text, Exception):
+                    logger.warning(f"OCR处理失败: {text}")
+                    job.ocr_text = "OCR处理失败"
+                    continue
+                await cache_manager.cache_image_result("ocr", ocr_identity, job.image_hash, text)
+                job.new_results[("ocr", ocr_identity)] = text
+                job.ocr_text = text
+        except Exception as e:
+            logger.warning(f"OCR处理失败: {e}")
+    
+    async def run_vision(job: _ImageJob):
+        try:
+            description = await vision_service.describe_image_data(job.image, prompt)
+            await cache_manager.cache_image_result("vision", vision_identity, job.image_hash, description)
+            job.new_results[("vision", vision_identity)] = description
+            job.vision_description = description
+        except Exception as e:
+            logger.warning(f"Vision API调用失败: {e}")
+            job.vision_description = "视觉模型识别失败"
+    
+    try:
+        await asyncio.gather(
+            run_ocr([job for job in leaders if job.ocr_text is None]),
+            *(run_vision(job) for job in leaders if need_vision and job.vision_description is None)
+        )
+    finally:
+        for job in leaders:
+            if job.registered and job.fingerprint is not None:
+                if job.new_results:
+                    await near_duplicate_detector.complete(job.fingerprint, job.image_hash, job.new_results)
+                else:
+                    near_duplicate_detector.abort(job.image_hash)
+    
+    results = []
+    for job in jobs:
+        if job.leader is not None:
+            if job.ocr_text is None:
+                job.ocr_text = job.leader.ocr_text
+            if job.vision_description is None:
+                job.vision_description = job.leader.vision_description
+        results.append((job.ocr_text or "OCR处理失败", job.vision_description or ""))
+    return results
+
+async def analyze_image(image: ImageInput, use_vision: bool = True,
+                        prompt: str = DOCUMENT_IMAGE_PROMPT) -> Tuple[str, str]:
+    """
+    对单张文档内嵌图片执行OCR和视觉识别，优先复用已有结果（见 analyze_images）
+    
+    Args:
+        image: 图片字节、PIL图片或RGB数组
+        use_vision: 是否调用视觉模型
+        prompt: 视觉模型提示词
+        
+    Returns:
+        (OCR文本, 视觉描述)，未启用视觉识别时视觉描述为空字符串
+    """
+    results = await analyze_images([image], use_vision=use_vision, prompt=prompt)
+    return results[0]
+
 def format_image_result(ocr_text: str, vision_description: str) -> str:
     """
     格式化图片处理结果，按照要求的markdown格式
@@ -0,0 +1,4 @@
+import os
+
+# 配置在导入时校验，测试环境不依赖 .env
+os.environ.setdefault("API_KEY", "test-api-key")
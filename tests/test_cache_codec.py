@@ -0,0 +1,61 @@
+import zlib
+
+import pytest
+
+pytest.importorskip("redis")
+
+from app.cache import CacheValueCodec  # noqa: E402
+
+TEXT = "<table><tr><td>单元格</td></tr></table>\n" * 200
+
+
+def test_short_values_are_stored_raw():
+    codec = CacheValueCodec("zlib", min_size=1024, level=6)
+    assert codec.encode("短文本") == "短文本".encode("utf-8")
+    assert codec.ratio is None
+
+
+def test_zlib_round_trip():
+    codec = CacheValueCodec("zlib", min_size=16, level=6)
+    encoded = codec.encode(TEXT)
+    assert encoded[:2] == b"\xff\x03"
+    assert len(encoded) < len(TEXT.encode("utf-8"))
+    assert codec.decode(encoded) == TEXT
+    assert 0 < codec.ratio < 1
+
+
+def test_zstd_round_trip():
+    pytest.importorskip("zstandard")
+    codec = CacheValueCodec("zstd", min_size=16, level=3)
+    encoded = codec.encode(TEXT)
+    assert encoded[:2] == b"\xff\x01"
+    assert codec.decode(encoded) == TEXT
+
+
+def test_incompressible_values_are_stored_raw():
+    codec = CacheValueCodec("zlib", min_size=1, level=6)
+    text = "0123456789abcdef"
+    assert codec.encode(text) == text.encode("utf-8")
+
+
+def test_uncompressed_legacy_values_decode_as_utf8():
+    codec = CacheValueCodec("zlib", min_size=16, level=6)
+    assert codec.decode('{"content": "旧缓存"}'.encode("utf-8")) == '{"content": "旧缓存"}'
+
+
+def test_any_codec_decodes_zlib_values():
+    encoded = b"\xff\x03" + zlib.compress(TEXT.encode("utf-8"))
+    assert CacheValueCodec("none", min_size=16, level=6).decode(encoded) == TEXT
+
+
+def test_unknown_codec_is_rejected():
+    codec = CacheValueCodec("zlib", min_size=16, level=6)
+    with pytest.raises(ValueError):
+        codec.decode(b"\xff\x09payload")
+
+
+def test_dictionary_values_need_the_dictionary():
+    pytest.importorskip("zstandard")
+    codec = CacheValueCodec("zstd", min_size=16, level=3)
+    with pytest.raises(ValueError):
+        codec.decode(b"\xff\x02payload")
@@ -0,0 +1,62 @@
+import asyncio
+import hashlib
+import json
+
+import pytest
+
+pytest.importorskip("redis")
+
+from app.cache import CacheManager  # noqa: E402
+from app.cache_backends import SQLiteCacheBackend  # noqa: E402
+from app.config import config  # noqa: E402
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "CACHE_LEGACY_LOOKUP", True)
+    manager = CacheManager()
+    manager.local_cache.max_size = 0
+    manager.backend = SQLiteCacheBackend(str(tmp_path / "cache.sqlite3"), max_size=1024 * 1024)
+    yield manager
+    asyncio.run(manager.backend.close())
+
+
+def _store_legacy(manager, content):
+    legacy_key = f"file2md:cache:{hashlib.md5(content).hexdigest()}"
+    value = json.dumps({"content": "legacy"}).encode("utf-8")
+    asyncio.run(manager.backend.set(legacy_key, value, 60))
+
+
+def test_legacy_entry_is_migrated_for_recorded_namespace(manager):
+    content = b"document"
+    _store_legacy(manager, content)
+
+    async def scenario():
+        first = await manager.get_cached_result(content, namespace="pdf.v2.aaaaaa")
+        migrated = await manager.backend.get(manager._get_cache_key(
+            manager._resolve_file_hash(content, None), "", "pdf.v2.aaaaaa"
+        ))
+        return first, migrated
+
+    first, migrated = asyncio.run(scenario())
+    assert first["content"] == "legacy"
+    assert migrated is not None
+
+
+def test_legacy_entry_is_ignored_after_settings_change(manager):
+    content = b"document"
+    _store_legacy(manager, content)
+
+    async def scenario():
+        await manager.get_cached_result(b"other", namespace="pdf.v2.aaaaaa")
+        return await manager.get_cached_result(content, namespace="pdf.v2.bbbbbb")
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_legacy_entry_is_ignored_for_non_default_variant(manager):
+    content = b"document"
+    _store_legacy(manager, content)
+
+    result = asyncio.run(manager.get_cached_result(content, variant="pages=1", namespace="pdf.v2.aaaaaa"))
+    assert result is None
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("PIL")
+
+from app import ocr_pool  # noqa: E402
+from app.exceptions import OCRError  # noqa: E402
+
+
+class FakeEngine:
+    """按 PaddleOCR 2.x 的 ocr() 约定返回结果：外层列表的每个元素对应一页"""
+
+    def __init__(self, boxes_per_image):
+        self.boxes_per_image = list(boxes_per_image)
+        self.detections = 0
+        self.recognitions = []
+
+    def ocr(self, img, det=True, rec=True, cls=False):
+        if det:
+            self.detections += 1
+            count = self.boxes_per_image.pop(0)
+            return [[[[0, row * 20], [50, row * 20], [50, row * 20 + 10], [0, row * 20 + 10]] for row in range(count)]]
+        self.recognitions.append(img)
+        return [[(f"line{i}", 0.9) for i in range(len(page))] for page in img]
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    def install(boxes_per_image):
+        fake = FakeEngine(boxes_per_image)
+        monkeypatch.setattr(ocr_pool, "get_ocr_engine", lambda: fake)
+        monkeypatch.setattr(ocr_pool, "_crop_text_region", lambda image, box: image[:10, :50])
+        return fake
+    return install
+
+
+def _image():
+    return np.zeros((100, 100, 3), dtype=np.uint8)
+
+
+def test_crops_are_recognized_in_one_batch(engine):
+    fake = engine([3, 0, 2])
+
+    results = ocr_pool.recognize_images([_image(), _image(), _image()])
+
+    assert results == [["line0", "line1", "line2"], [], ["line3", "line4"]]
+    assert fake.detections == 3
+    assert len(fake.recognitions) == 1
+    assert len(fake.recognitions[0]) == 1 and len(fake.recognitions[0][0]) == 5
+
+
+def test_mismatched_recognition_is_an_error(engine, monkeypatch):
+    fake = engine([2])
+    monkeypatch.setattr(fake, "ocr", lambda img, det=True, rec=True, cls=False:
+                        [[[[0, 0], [50, 0], [50, 10], [0, 10]]] * 2] if det else [[("line0", 0.9)]])
+    monkeypatch.setattr(ocr_pool, "recognize_image", lambda source: pytest.fail("不应回退到逐张识别"))
+
+    with pytest.raises(OCRError):
+        ocr_pool.recognize_images([_image()])
+
+
+def test_unsupported_staged_api_falls_back_to_single_images(engine, monkeypatch):
+    fake = engine([1])
+
+    def ocr(img, **kwargs):
+        raise TypeError("ocr() got an unexpected keyword argument 'det'")
+
+    monkeypatch.setattr(fake, "ocr", ocr)
+    monkeypatch.setattr(ocr_pool, "recognize_image", lambda source: ["whole"])
+
+    assert ocr_pool.recognize_images([_image(), _image()]) == [["whole"], ["whole"]]
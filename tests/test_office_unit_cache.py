@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("redis")
+openpyxl = pytest.importorskip("openpyxl")
+pytest.importorskip("pandas")
+pytest.importorskip("tabulate")
+
+from app.cache import cache_manager  # noqa: E402
+from app.cache_backends import SQLiteCacheBackend  # noqa: E402
+from app.config import config  # noqa: E402
+from app.parsers import excel  # noqa: E402
+from app.parsers.excel import ExcelParser, _xlsx_sheet_hashes  # noqa: E402
+
+
+def _write_workbook(path, sheets):
+    workbook = openpyxl.Workbook()
+    workbook.remove(workbook.active)
+    for name, rows in sheets.items():
+        worksheet = workbook.create_sheet(name)
+        for row in rows:
+            worksheet.append(row)
+    workbook.save(path)
+
+
+SHEETS = {
+    "汇总": [["名称", "数量"], ["苹果", 3], ["香蕉", 5]],
+    "明细": [["编号", "备注"], [1, "第一行"], [2, "第二行"]],
+}
+
+
+def test_editing_one_sheet_keeps_the_other_hash(tmp_path):
+    original = tmp_path / "original.xlsx"
+    edited = tmp_path / "edited.xlsx"
+    _write_workbook(original, SHEETS)
+    _write_workbook(edited, {**SHEETS, "明细": [["编号", "备注"], [1, "第一行"], [2, "已修改"]]})
+
+    before = dict(_xlsx_sheet_hashes(str(original)))
+    after = dict(_xlsx_sheet_hashes(str(edited)))
+    assert list(before) == ["汇总", "明细"]
+    assert before["汇总"] == after["汇总"]
+    assert before["明细"] != after["明细"]
+
+
+def test_changed_shared_string_changes_the_hash(tmp_path):
+    original = tmp_path / "original.xlsx"
+    edited = tmp_path / "edited.xlsx"
+    _write_workbook(original, SHEETS)
+    _write_workbook(edited, {**SHEETS, "汇总": [["名称", "数量"], ["橙子", 3], ["香蕉", 5]]})
+
+    assert dict(_xlsx_sheet_hashes(str(original)))["汇总"] != dict(_xlsx_sheet_hashes(str(edited)))["汇总"]
+
+
+def test_cached_sheets_skip_reading_the_workbook(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "UNIT_CACHE_ENABLED", True)
+    backend = SQLiteCacheBackend(str(tmp_path / "cache.sqlite3"), max_size=1024 * 1024)
+    monkeypatch.setattr(cache_manager, "backend", backend)
+    path = tmp_path / "book.xlsx"
+    _write_workbook(path, SHEETS)
+
+    async def parse():
+        return [(chunk.kind, chunk.index, chunk.text) async for chunk in ExcelParser().iter_parse(str(path))]
+
+    try:
+        first = asyncio.run(parse())
+
+        def fail(*args, **kwargs):
+            raise AssertionError("工作表全部命中时不应读取工作簿")
+
+        monkeypatch.setattr(excel.pd, "ExcelFile", fail)
+        monkeypatch.setattr(excel.openpyxl, "load_workbook", fail)
+        second = asyncio.run(parse())
+    finally:
+        asyncio.run(backend.close())
+
+    assert [(kind, index) for kind, index, _ in first] == [("sheet", 1), ("sheet", 2)]
+    assert second == first
@@ -0,0 +1,87 @@
+import pytest
+
+pytest.importorskip("redis")
+pytest.importorskip("aiofiles")
+
+from app.parsers.base import PageSelector, ParseOptions  # noqa: E402
+
+
+def test_single_pages_and_ranges():
+    selector = PageSelector("8, 1-3")
+    assert selector.select(10) == [1, 2, 3, 8]
+    assert selector.last == 8
+    assert str(selector) == "1-3,8"
+
+
+def test_open_range_runs_to_the_end():
+    selector = PageSelector("2,10-")
+    assert selector.select(12) == [2, 10, 11, 12]
+    assert 1000 in selector
+    assert selector.last is None
+    assert str(selector) == "2,10-"
+
+
+@pytest.mark.parametrize("spec", ["", " , ", "0", "5-3", "a", "1-2-3", "-4"])
+def test_invalid_specs_are_rejected(spec):
+    with pytest.raises(ValueError):
+        PageSelector(spec)
+
+
+def test_cache_variant_is_empty_for_default_options():
+    assert ParseOptions.from_request(pages=" ", sheets="").cache_variant() == ""
+    assert ParseOptions().is_default
+
+
+def test_cache_variant_normalises_the_selection():
+    options = ParseOptions.from_request(pages="3, 1-2", sheets="汇总, 2")
+    assert options.cache_variant() == "pages=1-2,3;sheets=汇总,2"
+    assert options.select_sheet("汇总", 1)
+    assert options.select_sheet("其他", 2)
+    assert not options.select_sheet("其他", 3)
+
+
+class TestDocxPageAssignment:
+    @pytest.fixture(autouse=True)
+    def _imports(self):
+        docx = pytest.importorskip("docx")
+        pytest.importorskip("markdownify")
+        from docx.enum.text import WD_BREAK
+        from docx.oxml import OxmlElement
+        from app.parsers.docx import DocxParser
+        self.docx = docx
+        self.WD_BREAK = WD_BREAK
+        self.OxmlElement = OxmlElement
+        self.parser = DocxParser()
+
+    def test_explicit_breaks_without_rendered_markers(self):
+        doc = self.docx.Document()
+        doc.add_paragraph("第一页")
+        doc.add_paragraph("分页").add_run().add_break(self.WD_BREAK.PAGE)
+        doc.add_table(rows=1, cols=1)
+        doc.add_paragraph("段前分页").paragraph_format.page_break_before = True
+
+        paragraph_pages, table_pages = self.parser._assign_pages(doc)
+        assert paragraph_pages == [1, 1, 3]
+        assert table_pages == [2]
+
+    def test_rendered_markers_take_precedence(self):
+        doc = self.docx.Document()
+        doc.add_paragraph("第一页")
+        second = doc.add_paragraph("第二页")
+        second.runs[0]._r.insert(0, self.OxmlElement("w:lastRenderedPageBreak"))
+        # 存在渲染分页标记时忽略段前分页，避免重复计数
+        second.paragraph_format.page_break_before = True
+        doc.add_paragraph("仍在第二页")
+
+        paragraph_pages, table_pages = self.parser._assign_pages(doc)
+        assert paragraph_pages == [1, 2, 2]
+        assert table_pages == []
+
+    def test_rendered_marker_inside_a_paragraph_moves_later_content(self):
+        doc = self.docx.Document()
+        spanning = doc.add_paragraph("跨页段落的前半部分")
+        spanning.add_run("后半部分")._r.insert(0, self.OxmlElement("w:lastRenderedPageBreak"))
+        doc.add_paragraph("第二页")
+
+        paragraph_pages, _ = self.parser._assign_pages(doc)
+        assert paragraph_pages == [1, 2]
@@ -0,0 +1,65 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("pdfplumber")
+
+from app.config import config  # noqa: E402
+from app.parsers.pdf import PAGE_BOTH, PAGE_OCR, PAGE_TEXT, PdfPageResult, PdfImage, PdfParser, classify_page  # noqa: E402
+
+
+def _page(images=(), rects=(), curves=(), width=600, height=800):
+    return SimpleNamespace(width=width, height=height, images=list(images), rects=list(rects), curves=list(curves))
+
+
+def _image(x0, top, x1, bottom):
+    return {"x0": x0, "top": top, "x1": x1, "bottom": bottom}
+
+
+@pytest.fixture(autouse=True)
+def _auto_strategy(monkeypatch):
+    monkeypatch.setattr(config, "PDF_OCR_STRATEGY", "auto")
+    monkeypatch.setattr(config, "PDF_TEXT_MIN_CHARS", 50)
+    monkeypatch.setattr(config, "PDF_SCAN_COVERAGE", 0.8)
+    monkeypatch.setattr(config, "PDF_FIGURE_COVERAGE", 0.2)
+
+
+def test_text_page():
+    assert classify_page(_page(), "正文" * 50) == PAGE_TEXT
+
+
+def test_short_text_page_with_rules_is_not_a_scan():
+    page = _page(rects=[{}] * 12, curves=[{}] * 3)
+    assert classify_page(page, "封面标题") == PAGE_TEXT
+
+
+def test_full_page_image_without_text_is_a_scan():
+    assert classify_page(_page(images=[_image(0, 0, 600, 800)]), "") == PAGE_OCR
+
+
+def test_full_page_image_with_text_layer_is_not_reocred():
+    assert classify_page(_page(images=[_image(0, 0, 600, 800)]), "文字" * 50) == PAGE_TEXT
+
+
+def test_figure_is_ocred_with_text():
+    figure = _image(0, 0, 600, 300)
+    assert classify_page(_page(images=[figure]), "文字" * 50) == PAGE_BOTH
+    assert classify_page(_page(images=[figure]), "图1") == PAGE_BOTH
+
+
+def test_unmapped_glyphs_do_not_count():
+    assert classify_page(_page(images=[_image(0, 0, 600, 800)]), "(cid:12)" * 60) == PAGE_OCR
+
+
+def test_image_outside_page_is_clipped():
+    assert classify_page(_page(images=[_image(500, 700, 1600, 1800)]), "") == PAGE_TEXT
+
+
+def test_scan_keeps_text_layer_when_ocr_fails():
+    result = PdfPageResult(
+        page_num=3, strategy=PAGE_OCR, text="第三章",
+        raster=PdfImage(name="doc_page3.png", page_num=3, img_idx=-1, image=b"")
+    )
+    parser = PdfParser()
+    assert parser._format_page(result, {}) == ["## 第 3 页\n\n第三章"]
+    assert parser._format_page(result, {"doc_page3.png": "识别文本"}) == ["## 第 3 页\n\n识别文本"]
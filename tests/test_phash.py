@@ -0,0 +1,70 @@
+import itertools
+import random
+
+import numpy as np
+import pytest
+
+from app.phash import split_bands
+
+
+def _to_hex(bits: np.ndarray) -> str:
+    return np.packbits(bits).tobytes().hex()
+
+
+def _alternating_bits(count: int) -> np.ndarray:
+    # 0101...：任何分段都不会退化为全0或全1
+    return np.arange(count) % 2 == 1
+
+
+def _share_band(first: list, second: list) -> bool:
+    return any(a is not None and a == b for a, b in zip(first, second))
+
+
+@pytest.mark.parametrize("max_distance", [0, 1, 4, 6, 10, 63])
+def test_band_count_is_max_distance_plus_one(max_distance):
+    assert len(split_bands("5" * 64, max_distance)) == max_distance + 1
+
+
+def test_band_count_cannot_exceed_bits():
+    with pytest.raises(ValueError):
+        split_bands("5" * 4, 16)
+
+
+@pytest.mark.parametrize("max_distance", range(1, 8))
+def test_every_flip_combination_keeps_a_shared_band(max_distance):
+    base = _alternating_bits(16)
+    base_bands = split_bands(_to_hex(base), max_distance)
+    for distance in range(max_distance + 1):
+        for positions in itertools.combinations(range(16), distance):
+            flipped = base.copy()
+            flipped[list(positions)] ^= True
+            assert _share_band(base_bands, split_bands(_to_hex(flipped), max_distance)), positions
+
+
+def test_worst_case_one_flip_per_band_at_default_size():
+    # 默认 16x16 指纹、最大距离 6：在 7 段中任选 6 段各翻转 1 位
+    max_distance = 6
+    base = _alternating_bits(256)
+    base_bands = split_bands(_to_hex(base), max_distance)
+    segments = np.array_split(np.arange(256), max_distance + 1)
+    rng = random.Random(0)
+    for hit in itertools.combinations(range(max_distance + 1), max_distance):
+        for _ in range(20):
+            flipped = base.copy()
+            for band_idx in hit:
+                flipped[rng.choice(list(segments[band_idx]))] ^= True
+            assert _share_band(base_bands, split_bands(_to_hex(flipped), max_distance))
+
+
+def test_bands_beyond_distance_can_all_differ():
+    base = _alternating_bits(16)
+    flipped = base.copy()
+    flipped[[0, 4, 7, 10, 13]] ^= True
+    assert not _share_band(split_bands(_to_hex(base), 4), split_bands(_to_hex(flipped), 4))
+
+
+def test_degenerate_bands_are_skipped():
+    assert split_bands("00" * 32, 6) == [None] * 7
+    assert split_bands("ff" * 32, 6) == [None] * 7
+    mixed = split_bands("00" * 16 + "5" * 32, 1)
+    assert mixed[0] is None and mixed[1] is not None
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("redis")
+
+from app.cache import cache_manager  # noqa: E402
+from app.singleflight import SingleFlight  # noqa: E402
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight(lock_ttl=30, wait_timeout=5)
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def scenario():
+        return await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+
+    results = asyncio.run(scenario())
+    assert calls == 1
+    assert [result for result, _ in results] == ["result"] * 5
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert flight.inflight == 0
+
+
+def test_waiters_receive_the_executor_exception():
+    flight = SingleFlight(lock_ttl=30, wait_timeout=5)
+
+    async def work():
+        await asyncio.sleep(0.05)
+        raise ValueError("boom")
+
+    async def scenario():
+        return await asyncio.gather(*(flight.do("key", work) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flight.inflight == 0
+
+
+def test_waiter_takes_over_when_executor_is_cancelled():
+    flight = SingleFlight(lock_ttl=30, wait_timeout=5)
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return calls
+
+    async def scenario():
+        executor = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0.01)
+        executor.cancel()
+        return await waiter
+
+    result, shared = asyncio.run(scenario())
+    assert (result, shared) == (2, False)
+    assert flight.inflight == 0
+
+
+def test_polling_lookup_does_not_count_misses(monkeypatch):
+    monkeypatch.setattr(cache_manager, "backend", None)
+    monkeypatch.setattr(cache_manager.local_cache, "max_size", 1024)
+    monkeypatch.setattr(cache_manager, "stats", {"l1_hits": 0, "l2_hits": 0, "misses": 0})
+
+    async def scenario():
+        await cache_manager.get_cached_result(file_hash="0" * 32, namespace="pdf.v2.aaaaaa", count_stats=False)
+        await cache_manager.get_cached_result(file_hash="0" * 32, namespace="pdf.v2.aaaaaa")
+
+    asyncio.run(scenario())
+    assert cache_manager.stats["misses"] == 1
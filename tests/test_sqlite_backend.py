@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("redis")
+
+from app.cache_backends import SQLiteCacheBackend  # noqa: E402
+
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = SQLiteCacheBackend(str(tmp_path / "cache.sqlite3"), max_size=10 * 1024)
+    yield backend
+    asyncio.run(backend.close())
+
+
+def test_replacing_a_key_does_not_grow_totals(backend):
+    async def scenario():
+        for _ in range(50):
+            await backend.set("file2md:cache:a", b"x" * 100, 60, indexed=True)
+        await backend.set("file2md:img:b", b"y" * 30, 60)
+        return await backend.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["cache_count"] == 1
+    assert stats["cache_bytes"] == 100
+    assert backend._total_size() == 130
+
+
+def test_eviction_keeps_total_under_limit(backend):
+    async def scenario():
+        for i in range(40):
+            await backend.set(f"file2md:cache:{i}", b"x" * 1024, 60, indexed=True)
+        return await backend.get("file2md:cache:39"), await backend.stats()
+
+    latest, stats = asyncio.run(scenario())
+    assert latest == b"x" * 1024
+    assert backend._total_size() <= backend.max_size
+    assert stats["cache_bytes"] == backend._total_size()
+
+
+def test_clear_and_expiry_update_totals(backend):
+    async def scenario():
+        await backend.set("file2md:unit:a", b"1", 60)
+        await backend.set("file2md:cache:b", b"22", 60, indexed=True)
+        await backend.set("file2md:cache:c", b"333", -1, indexed=True)
+        cleared = await backend.clear("file2md:unit:*")
+        return cleared, await backend.get_many(["file2md:unit:a", "file2md:cache:b"]), await backend.stats()
+
+    cleared, values, stats = asyncio.run(scenario())
+    assert cleared == 1
+    assert values == [None, b"22"]
+    assert (stats["cache_count"], stats["cache_bytes"]) == (1, 2)
+
+
+def test_totals_initialised_from_existing_database(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    first = SQLiteCacheBackend(path, max_size=1024 * 1024)
+    asyncio.run(first.set("file2md:cache:a", b"abc", 60, indexed=True))
+    asyncio.run(first.close())
+
+    reopened = SQLiteCacheBackend(path, max_size=1024 * 1024)
+    try:
+        assert asyncio.run(reopened.stats())["cache_count"] == 1
+    finally:
+        asyncio.run(reopened.close())